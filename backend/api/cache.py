@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import cache
+from pathlib import Path
+
+from langchain_community.graphs.graph_document import GraphDocument
+from langchain_core.documents import Document
+
+from api.common import MODEL, logger
+
+# Bump whenever the extraction prompt or transformer settings change, so
+# that stale extractions are never served from the cache.
+PROMPT_VERSION = os.environ.get("EXTRACTION_PROMPT_VERSION", "1")
+CACHE_PATH = os.environ.get(
+    "EXTRACTION_CACHE_PATH", ".cache/fastctx/extractions.sqlite3"
+)
+CACHE_MAX_ENTRIES = int(os.environ.get("EXTRACTION_CACHE_MAX_ENTRIES", "50000"))
+CACHE_MAX_BYTES = int(
+    os.environ.get("EXTRACTION_CACHE_MAX_BYTES", str(512 * 1024 * 1024))
+)
+
+
+def content_hash(contents: str) -> str:
+    """
+    Hashes the contents of a file. Used to detect unchanged files.
+    """
+    return hashlib.sha256(contents.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """
+    A persistent, size-bounded LRU cache of graph extractions.
+
+    Entries are keyed by the content hash of a document, the model name and
+    the prompt version. Only the nodes and relationships are stored; the
+    source document is re-attached on a hit.
+    """
+
+    def __init__(
+        self,
+        path: os.PathLike | str,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        max_bytes: int = CACHE_MAX_BYTES,
+    ):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            "key TEXT PRIMARY KEY, "
+            "payload TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS extractions_last_used "
+            "ON extractions (last_used)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(
+        contents: str, model: str = MODEL, prompt_version: str = PROMPT_VERSION
+    ) -> str:
+        """
+        Builds the cache key for a document's contents.
+        """
+        return f"{content_hash(contents)}:{model}:{prompt_version}"
+
+    def get(self, key: str, source: Document) -> GraphDocument | None:
+        """
+        Looks up an extraction, re-attaching `source` on a hit.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM extractions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE extractions SET last_used = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self._conn.commit()
+        return GraphDocument(**json.loads(row[0]), source=source)
+
+    def put(self, key: str, graph_document: GraphDocument):
+        """
+        Stores an extraction and evicts the least recently used entries if
+        the cache is over its bounds.
+        """
+        payload = json.dumps(graph_document.model_dump(exclude={"source"}))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions "
+                "(key, payload, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count, total_size = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions"
+        ).fetchone()
+        if count <= self.max_entries and total_size <= self.max_bytes:
+            return
+        # Walk from the least recently used entry, dropping until in bounds
+        evicted: list[str] = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM extractions ORDER BY last_used ASC"
+        ):
+            if count <= self.max_entries and total_size <= self.max_bytes:
+                break
+            evicted.append(key)
+            count -= 1
+            total_size -= size
+        self._conn.executemany(
+            "DELETE FROM extractions WHERE key = ?", [(k,) for k in evicted]
+        )
+        logger.debug("Evicted extractions from cache.", evicted=len(evicted))
+
+    async def aget(self, key: str, source: Document) -> GraphDocument | None:
+        return await asyncio.to_thread(self.get, key, source)
+
+    async def aput(self, key: str, graph_document: GraphDocument):
+        await asyncio.to_thread(self.put, key, graph_document)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+@cache
+def get_extraction_cache() -> ExtractionCache:
+    """
+    Opens the extraction cache shared by all ingestion runs.
+    """
+    extraction_cache = ExtractionCache(CACHE_PATH)
+    logger.info("Opened extraction cache at %s", CACHE_PATH)
+    return extraction_cache
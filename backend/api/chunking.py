@@ -0,0 +1,147 @@
+import os
+from pathlib import PurePosixPath
+
+from langchain_community.graphs.graph_document import GraphDocument
+from langchain_core.documents import Document
+from langchain_text_splitters import Language, RecursiveCharacterTextSplitter
+
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", "2000"))
+# Rough, but close enough for a budget and far cheaper than tokenizing
+CHARS_PER_TOKEN = 4
+
+LANGUAGES = {
+    ".py": Language.PYTHON,
+    ".js": Language.JS,
+    ".jsx": Language.JS,
+    ".mjs": Language.JS,
+    ".ts": Language.TS,
+    ".tsx": Language.TS,
+    ".java": Language.JAVA,
+    ".kt": Language.KOTLIN,
+    ".scala": Language.SCALA,
+    ".go": Language.GO,
+    ".rs": Language.RUST,
+    ".c": Language.C,
+    ".h": Language.C,
+    ".cpp": Language.CPP,
+    ".cc": Language.CPP,
+    ".hpp": Language.CPP,
+    ".cs": Language.CSHARP,
+    ".rb": Language.RUBY,
+    ".php": Language.PHP,
+    ".swift": Language.SWIFT,
+    ".lua": Language.LUA,
+    ".md": Language.MARKDOWN,
+    ".rst": Language.RST,
+    ".html": Language.HTML,
+}
+
+# Langchain's Python separators only know tab indented methods
+PYTHON_SEPARATORS = [
+    "\nclass ",
+    "\ndef ",
+    "\nasync def ",
+    "\n    def ",
+    "\n    async def ",
+    "\n\tdef ",
+    "\n\n",
+    "\n",
+    " ",
+    "",
+]
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _splitter(filename: str, max_tokens: int) -> RecursiveCharacterTextSplitter:
+    language = LANGUAGES.get(PurePosixPath(filename).suffix.lower())
+    if language is Language.PYTHON:
+        separators = PYTHON_SEPARATORS
+    elif language is not None:
+        separators = RecursiveCharacterTextSplitter.get_separators_for_language(
+            language
+        )
+    else:
+        separators = None
+    return RecursiveCharacterTextSplitter(
+        separators=separators,
+        chunk_size=max_tokens,
+        chunk_overlap=0,
+        length_function=estimate_tokens,
+        keep_separator="start",
+        strip_whitespace=False,
+    )
+
+
+def split_document(
+    document: Document, max_tokens: int = CHUNK_MAX_TOKENS
+) -> list[Document]:
+    """
+    Splits a document into chunks of at most `max_tokens`, on function and
+    class boundaries where the language is known.
+
+    Documents within the budget are returned as they are. Chunks keep the
+    document's metadata, plus their index and the line they start on.
+    """
+    if estimate_tokens(document.page_content) <= max_tokens:
+        return [document]
+    filename = document.metadata.get("filename", "")
+    texts = _splitter(filename, max_tokens).split_text(document.page_content)
+
+    chunks = []
+    offset = 0
+    for index, text in enumerate(texts):
+        # Chunks come out in order, so each is found after the previous one
+        offset = document.page_content.find(text, offset)
+        # Chunks start with the newline before their first line
+        leading = len(text) - len(text.lstrip("\n"))
+        start_line = document.page_content.count("\n", 0, offset + leading) + 1
+        chunks.append(
+            Document(
+                page_content=text,
+                metadata={
+                    **document.metadata,
+                    "chunk": index,
+                    "chunks": len(texts),
+                    "start_line": start_line,
+                },
+            )
+        )
+    return chunks
+
+
+def merge_chunks(
+    document: Document, graph_documents: list[GraphDocument]
+) -> GraphDocument:
+    """
+    Merges the graphs extracted from a document's chunks into one graph for
+    the whole document.
+
+    Nodes found in several chunks are merged, with later properties taking
+    precedence. Relationships are deduplicated by their endpoints and type.
+    """
+    nodes = {}
+    relationships = {}
+    for graph_document in graph_documents:
+        for node in graph_document.nodes:
+            key = (node.id, node.type)
+            if key in nodes:
+                nodes[key].properties.update(node.properties)
+            else:
+                nodes[key] = node.model_copy(deep=True)
+        for rel in graph_document.relationships:
+            key = (
+                rel.source.id,
+                rel.source.type,
+                rel.type,
+                rel.target.id,
+                rel.target.type,
+            )
+            relationships.setdefault(key, rel)
+    return GraphDocument(
+        nodes=list(nodes.values()),
+        relationships=list(relationships.values()),
+        source=document,
+    )
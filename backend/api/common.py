@@ -1,43 +1,258 @@
+import asyncio
+import importlib.util
 import os
+from collections.abc import Callable
 from functools import cache
+from typing import Any
 
+import httpx
 import speedbeaver
+from langchain_core.language_models import BaseChatModel
 from langchain_experimental.graph_transformers import LLMGraphTransformer
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_neo4j import Neo4jGraph
+from langchain_openai import ChatOpenAI
+from neo4j import AsyncDriver, AsyncGraphDatabase, RoutingControl
 
 LOGGER_NAME = "fastctx-api"
 MODEL = os.environ.get("LLM_MODEL", "gemini-2.0-flash")
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "gemini")
+NEO4J_DATABASE = os.environ.get("NEO4J_DATABASE", "neo4j")
 
 logger = speedbeaver.get_logger(LOGGER_NAME)
 
 
+# Connection pool settings, shared by every API and MCP client
+NEO4J_MAX_POOL_SIZE = int(os.environ.get("NEO4J_MAX_POOL_SIZE", "50"))
+NEO4J_ACQUISITION_TIMEOUT = float(
+    os.environ.get("NEO4J_ACQUISITION_TIMEOUT", "30")
+)
+NEO4J_MAX_CONNECTION_LIFETIME = float(
+    os.environ.get("NEO4J_MAX_CONNECTION_LIFETIME", "3600")
+)
+NEO4J_LIVENESS_CHECK_TIMEOUT = float(
+    os.environ.get("NEO4J_LIVENESS_CHECK_TIMEOUT", "60")
+)
+
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "30"))
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+
+class AsyncNeo4jGraph:
+    """
+    Non-blocking access to a Neo4j database.
+
+    Queries run on a pooled AsyncDriver. Schema introspection is only
+    implemented on the sync driver by Langchain, so it runs in a worker
+    thread instead of on the event loop.
+    """
+
+    def __init__(
+        self,
+        driver: AsyncDriver,
+        schema_graph: Neo4jGraph,
+        database: str = NEO4J_DATABASE,
+    ):
+        self.driver = driver
+        self.database = database
+        self._schema_graph = schema_graph
+
+    async def query(
+        self,
+        query: str,
+        params: dict[str, Any] | None = None,
+        routing: RoutingControl = RoutingControl.WRITE,
+    ) -> list[dict[str, Any]]:
+        """
+        Runs a Cypher query and returns its records as dicts.
+        """
+        records, _, _ = await self.driver.execute_query(
+            query,
+            params or {},
+            database_=self.database,
+            routing_=routing,
+        )
+        return [record.data() for record in records]
+
+    async def refresh_schema(self):
+        await asyncio.to_thread(self._schema_graph.refresh_schema)
+
+    @property
+    def structured_schema(self) -> dict[str, Any]:
+        return self._schema_graph.structured_schema
+
+    @property
+    def schema(self) -> str:
+        return self._schema_graph.schema
+
+    async def close(self):
+        await self.driver.close()
+        await asyncio.to_thread(self._schema_graph.close)
+
+
 @cache
-def get_neo4j_graph() -> Neo4jGraph:
+def get_neo4j_driver() -> AsyncDriver:
+    """
+    Sets up an async Neo4j driver, shared across the app.
+    """
+    uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+    auth = (
+        os.getenv("NEO4J_USERNAME", "neo4j"),
+        os.getenv("NEO4J_PASSWORD", ""),
+    )
+    driver = AsyncGraphDatabase.driver(
+        uri,
+        auth=auth,
+        max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+        connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+        max_connection_lifetime=NEO4J_MAX_CONNECTION_LIFETIME,
+        liveness_check_timeout=NEO4J_LIVENESS_CHECK_TIMEOUT,
+        keep_alive=True,
+    )
+    logger.info(
+        "Set up async Neo4J driver for %s",
+        uri,
+        max_pool_size=NEO4J_MAX_POOL_SIZE,
+    )
+    return driver
+
+
+@cache
+def get_neo4j_graph() -> AsyncNeo4jGraph:
     """
     Connects to Neo4j and sets up a graph context.
     """
     uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-    graph = Neo4jGraph(url=uri, refresh_schema=True)
+    # Only used for schema introspection, so it needs few connections
+    schema_graph = Neo4jGraph(
+        url=uri,
+        database=NEO4J_DATABASE,
+        refresh_schema=False,
+        driver_config={"max_connection_pool_size": 2},
+    )
+    graph = AsyncNeo4jGraph(get_neo4j_driver(), schema_graph)
     logger.info("Connected to Neo4J database at %s", uri)
     return graph
 
 
-def setup_llm_transformer() -> LLMGraphTransformer:
+def _pooled_http_client(**kwargs: Any) -> httpx.AsyncClient:
     """
-    Sets up a graph transformer with an LLM.
+    Sets up an HTTP client that keeps connections alive between requests,
+    and multiplexes them over HTTP/2 when the optional `h2` package is
+    installed.
     """
+    http2 = importlib.util.find_spec("h2") is not None
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+        ),
+        **kwargs,
+    )
+
+
+@cache
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Sets up a pooled HTTP client, shared across the app.
+    """
+    client = _pooled_http_client(timeout=HTTP_TIMEOUT, follow_redirects=True)
+    logger.info("Set up HTTP client.")
+    return client
+
+
+def _gemini_llm(registry: "ProviderRegistry", model: str) -> BaseChatModel:
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("GEMINI_API_KEY environment variable is required")
-    llm = ChatGoogleGenerativeAI(
-        model=MODEL,
+    # The Gemini SDK pools its own connections, per client
+    return ChatGoogleGenerativeAI(
+        model=model,
         google_api_key=api_key,
         temperature=0,
     )
 
-    llm_transformer = LLMGraphTransformer(llm=llm)
 
-    logger.info("LLM set up.")
+def _openrouter_llm(registry: "ProviderRegistry", model: str) -> BaseChatModel:
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key:
+        raise ValueError("OPENROUTER_API_KEY environment variable is required")
+    return ChatOpenAI(
+        model=model,
+        api_key=api_key,
+        base_url=OPENROUTER_BASE_URL,
+        temperature=0,
+        default_headers={
+            "HTTP-Referer": "http://localhost",
+            "X-Title": "FastCTX",
+        },
+        # Timeouts are set per request by the OpenAI SDK
+        http_async_client=registry.http_client(),
+    )
+
+
+PROVIDERS: dict[str, Callable[["ProviderRegistry", str], BaseChatModel]] = {
+    "gemini": _gemini_llm,
+    "openrouter": _openrouter_llm,
+}
+
+
+class ProviderRegistry:
+    """
+    LLM provider clients, created once and shared across the app.
+
+    Each provider and model gets a single chat model, over a pooled HTTP
+    client where its SDK takes one, so requests reuse connections instead
+    of setting up new ones.
+    """
+
+    def __init__(self):
+        self._llms: dict[tuple[str, str], BaseChatModel] = {}
+        self._http_clients: list[httpx.AsyncClient] = []
 
-    return llm_transformer
+    def llm(
+        self, provider: str = LLM_PROVIDER, model: str = MODEL
+    ) -> BaseChatModel:
+        key = (provider, model)
+        if key not in self._llms:
+            if provider not in PROVIDERS:
+                raise ValueError(f"Unknown LLM provider: {provider}.")
+            self._llms[key] = PROVIDERS[provider](self, model)
+            logger.info("LLM set up.", provider=provider, model=model)
+        return self._llms[key]
+
+    def http_client(self) -> httpx.AsyncClient:
+        client = _pooled_http_client()
+        self._http_clients.append(client)
+        return client
+
+    async def aclose(self):
+        for client in self._http_clients:
+            await client.aclose()
+        self._http_clients.clear()
+        self._llms.clear()
+
+
+@cache
+def get_provider_registry() -> ProviderRegistry:
+    return ProviderRegistry()
+
+
+def get_llm() -> BaseChatModel:
+    """
+    Gets the configured LLM.
+    """
+    return get_provider_registry().llm()
+
+
+@cache
+def get_llm_transformer() -> LLMGraphTransformer:
+    """
+    Sets up a graph transformer with the configured LLM, shared across the
+    app.
+    """
+    return LLMGraphTransformer(llm=get_llm())
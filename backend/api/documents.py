@@ -1,9 +1,9 @@
 import asyncio
+import errno
 import os
-import shutil
-import tempfile
-from pathlib import Path
-from typing import Annotated  # pyright: ignore
+import zipfile
+from collections.abc import AsyncIterator, Coroutine, Iterator
+from typing import TYPE_CHECKING, Annotated, Any  # pyright: ignore
 
 import aiofiles
 import httpx
@@ -12,28 +12,82 @@ from fastapi.exceptions import HTTPException
 from fastapi.params import Depends
 from langchain_core.documents import Document
 from langchain_experimental.graph_transformers.llm import LLMGraphTransformer
-from langchain_neo4j.graphs.neo4j_graph import Neo4jGraph
 
-from api.common import get_neo4j_graph, logger, setup_llm_transformer
+from api.cache import ExtractionCache, content_hash, get_extraction_cache
+from api.common import (
+    AsyncNeo4jGraph,
+    get_http_client,
+    get_llm_transformer,
+    get_neo4j_graph,
+    logger,
+)
+from api.embeddings import EmbeddingIndexer
+from api.extractors import CodeExtractor, ModuleIndex, get_code_extractor
+from api.filters import FileFilter, no_follow, within
+from api.graph_writer import DOCUMENT_LABEL, GraphWriter, get_graph_writer
+from api.incremental import (
+    ProjectSync,
+    document_id,
+    ensure_indexes,
+    get_indexed_hashes,
+    remove_documents,
+)
+from api.pipeline import IngestionPipeline, PipelineStats
 
+if TYPE_CHECKING:
+    from api.sources import Source
 
-async def load_document(filename: str, **kwargs) -> Document | None:
+READ_CONCURRENCY = int(os.environ.get("PIPELINE_READ_CONCURRENCY", "16"))
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+async def load_document(path: str, **kwargs) -> Document | None:
     """
     Loads in file from the filesystem async. Converts it to a Langchain Document
 
-    kwargs specify metadata to be added to the document.
+    kwargs specify metadata to be added to the document. The filename defaults
+    to `path` and the content hash is always recorded.
     """
 
     contents: str
     try:
-        async with aiofiles.open(filename) as f:
+        async with aiofiles.open(path, opener=no_follow) as f:
             contents = await f.read()
     except UnicodeDecodeError:
-        await logger.awarning("Couldn't decode %s to unicode.", filename)
+        await logger.awarning("Couldn't decode %s to unicode.", path)
         return None
+    except OSError as exc:
+        if exc.errno != errno.ELOOP:
+            raise
+        await logger.awarning("Not following symlink %s.", path)
+        return None
+
+    return await _to_document(contents, **{"filename": path, **kwargs})
 
-    # TODO: Set up more metadata
-    document = Document(page_content=contents, metadata={"filename": filename})
+
+async def load_archive_member(
+    archive: zipfile.ZipFile, name: str, **kwargs
+) -> Document | None:
+    """
+    Reads a file straight out of a zip archive, without extracting it to
+    disk. Converts it to a Langchain Document
+
+    kwargs specify metadata to be added to the document, as for
+    `load_document`.
+    """
+    data = await asyncio.to_thread(archive.read, name)
+    try:
+        contents = data.decode("utf-8")
+    except UnicodeDecodeError:
+        await logger.awarning("Couldn't decode %s to unicode.", name)
+        return None
+
+    return await _to_document(contents, **{"filename": name, **kwargs})
+
+
+async def _to_document(contents: str, **kwargs) -> Document:
+    metadata = {**kwargs, "content_hash": content_hash(contents)}
+    document = Document(page_content=contents, metadata=metadata)
 
     await logger.ainfo(
         "Got document.", size=len(document.page_content), **document.metadata
@@ -41,122 +95,254 @@ async def load_document(filename: str, **kwargs) -> Document | None:
     return document
 
 
-async def load_documents(root_dir: os.PathLike, **metadata) -> list[Document]:
+async def list_files(
+    root_dir: os.PathLike, file_filter: FileFilter | None = None
+) -> list[str]:
     """
-    Converts a tree of files at a given `root_dir` into Langchain documents.
+    Lists the files worth ingesting in a tree, relative to `root_dir`.
 
-    metadata specifies metadata to add to each document.
+    Files are only sniffed, not read, and the tree is walked in a worker
+    thread.
     """
-    if not os.path.exists(root_dir):
-        await logger.awarning("%s is nonexistent.", root_dir)
-        return []
-    document_tasks: list[asyncio.Task[Document | None]] = []
-    async with asyncio.TaskGroup() as file_tg:
-        # Walk the /demo directory and add load_file tasks
-        for root, _, files in os.walk(root_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                document_task = file_tg.create_task(
-                    load_document(file_path, **metadata)
-                )
-                document_tasks.append(document_task)
-                await logger.adebug("Added load_file task for %s", file_path)
+    file_filter = file_filter or FileFilter()
+    paths = await asyncio.to_thread(list, file_filter.walk(root_dir))
+    await _log_filtered(file_filter, paths)
+    return paths
 
-    # Extract loaded documents
 
-    documents: list[Document] = [
-        doc
-        for doc in [document.result() for document in document_tasks]
-        if doc is not None
-    ]
+def strip_archive_root(name: str) -> str:
+    """
+    Leaves the top-level directory out of an archive member's name, as
+    GitHub archives put everything under a `<repo>-<ref>/` directory.
+    """
+    return name.split("/", 1)[-1]
 
-    await logger.adebug("Documents loaded.", num_documents=len(documents))
 
-    return documents
+async def list_archive_files(
+    archive: zipfile.ZipFile, file_filter: FileFilter | None = None
+) -> list[str]:
+    """
+    Lists the members worth ingesting in a zip archive.
+    """
+    file_filter = file_filter or FileFilter()
+    names = await asyncio.to_thread(list, file_filter.walk_archive(archive))
+    await _log_filtered(file_filter, names)
+    return names
 
 
-async def insert_documents(
-    documents: list[Document],  # pyright: ignore
-    llm_transformer: Annotated[
-        LLMGraphTransformer, Depends(setup_llm_transformer)
-    ],
-    graph: Annotated[Neo4jGraph, Depends(get_neo4j_graph)],
-):
-    graph_documents = await llm_transformer.aconvert_to_graph_documents(
-        documents
+async def _log_filtered(file_filter: FileFilter, paths: list[str]):
+    await logger.ainfo(
+        "Filtered files.",
+        included=len(paths),
+        **{reason.value: count for reason, count in file_filter.counts.items()},
+    )
+
+
+async def _read_bounded(
+    loads: Iterator[Coroutine[Any, Any, Document | None]], concurrency: int
+) -> AsyncIterator[Document]:
+    # Loads are only started as others finish, so at most `concurrency`
+    # files are held at once
+    pending: set[asyncio.Task[Document | None]] = set()
+    try:
+        for load in loads:
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if (document := task.result()) is not None:
+                        yield document
+            pending.add(asyncio.create_task(load))
+        for task in asyncio.as_completed(pending):
+            if (document := await task) is not None:
+                yield document
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def iter_documents(
+    root_dir: os.PathLike,
+    concurrency: int = READ_CONCURRENCY,
+    paths: list[str] | None = None,
+    **metadata,
+) -> AsyncIterator[Document]:
+    """
+    Streams a tree of files at a given `root_dir` as Langchain documents.
+
+    At most `concurrency` files are read at once, so memory use doesn't grow
+    with the size of the tree. metadata specifies metadata to add to each
+    document. Filenames are recorded relative to `root_dir`, so they are
+    stable between loads. Only `paths` are read if given, otherwise the
+    files that pass the default filter. Paths that resolve outside
+    `root_dir` are never read.
+    """
+    if not os.path.exists(root_dir):
+        await logger.awarning("%s is nonexistent.", root_dir)
+        return
+    if paths is None:
+        paths = await list_files(root_dir)
+    outside = {path for path in paths if not within(root_dir, path)}
+    if outside:
+        await logger.awarning(
+            "Skipped paths outside the project.", paths=sorted(outside)
+        )
+        paths = [path for path in paths if path not in outside]
+    loads = (
+        load_document(os.path.join(root_dir, path), **metadata, filename=path)
+        for path in paths
     )
+    async for document in _read_bounded(loads, concurrency):
+        yield document
 
-    await logger.adebug("Documents converted to graph.")
 
-    # Why the hell are these guys using `List` and not `list`
-    graph.add_graph_documents(graph_documents, include_source=True)  # pyright: ignore
+async def iter_archive_documents(
+    archive: zipfile.ZipFile,
+    concurrency: int = READ_CONCURRENCY,
+    names: list[str] | None = None,
+    strip_root: bool = False,
+    **metadata,
+) -> AsyncIterator[Document]:
+    """
+    Streams the files of a zip archive as Langchain documents, reading them
+    straight out of the archive.
 
-    await logger.adebug("Documents inserted.")
+    As with `iter_documents`, at most `concurrency` files are read at once.
+    Filenames are the members' names in the archive. With `strip_root`,
+    the top-level directory is left out of them, see `strip_archive_root`.
+    """
+    if names is None:
+        names = await list_archive_files(archive)
+    loads = (
+        load_archive_member(
+            archive,
+            name,
+            **metadata,
+            filename=strip_archive_root(name) if strip_root else name,
+        )
+        for name in names
+    )
+    async for document in _read_bounded(loads, concurrency):
+        yield document
 
 
-async def _download_file(url: str, out_filename: os.PathLike):
+async def _download_file(
+    url: str,
+    out_filename: os.PathLike,
+    http_client: httpx.AsyncClient | None = None,
+):
     """
     Downloads a file at a given URL using HTTP.
+
+    The response is streamed to disk in chunks, so it is never held in
+    memory as a whole.
     """
+    http_client = http_client or get_http_client()
     async with (
-        httpx.AsyncClient() as http_client,
+        http_client.stream("GET", url) as res,
         aiofiles.open(out_filename, mode="wb+") as out_file,
     ):
-        res = await http_client.get(url)
         if res.status_code >= 400:
             raise HTTPException(
                 status_code=res.status_code,
                 detail=f"Failed to download file at: {url}",
             )
-        await out_file.write(res.content)
+        async for chunk in res.aiter_bytes(DOWNLOAD_CHUNK_BYTES):
+            await out_file.write(chunk)
         await logger.adebug(
             "Downloaded file at %s successfully.",
             url,
             out_filename=out_filename,
+            size=res.num_bytes_downloaded,
         )
 
 
 async def download_github_project(
-    url: str, dest_directory: os.PathLike, branch: str = "main"
+    url: str, dest_file: os.PathLike, ref: str | None = None
 ):
     """
-    Downloads a GitHub repository as a zip file and extracts it 
-    to the specified directory.
+    Downloads a GitHub repository as a zip file to `dest_file`.
+
+    `ref` can be a branch, a tag or a commit, and defaults to the default
+    branch. The archive isn't extracted, its files are read straight out of
+    it.
     """
-    # Create a temporary directory
     if not url.startswith("https://github.com"):
         raise ValueError("Invalid Github URL.")
 
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        # Define paths
-        clone_destination = Path(tmpdirname) / "repo.zip"
+    archive = f"{ref}.zip" if ref else "HEAD.zip"
+    await _download_file(f"{url}/archive/{archive}", dest_file)
 
-        await _download_file(
-            f"{url}/archive/refs/heads/{branch}.zip", clone_destination
-        )
-        # Extract the zip file to the destination directory
-        shutil.unpack_archive(str(clone_destination), dest_directory)
+    await logger.adebug("Downloaded repository from %s to %s", url, dest_file)
 
-    await logger.adebug(
-        "Downloaded and extracted repository from %s to %s", url, dest_directory
-    )
 
+async def _with_document_ids(
+    project: str, documents: AsyncIterator[Document]
+) -> AsyncIterator[Document]:
+    async for document in documents:
+        document.metadata["id"] = document_id(
+            project, document.metadata["filename"]
+        )
+        yield document
 
-async def load_github_project(
-    url: str,
+
+async def load_project(
+    source: "Source",
     llm_transformer: Annotated[
-        LLMGraphTransformer, Depends(setup_llm_transformer)
+        LLMGraphTransformer, Depends(get_llm_transformer)
     ],
-    graph: Annotated[Neo4jGraph, Depends(get_neo4j_graph)],
+    graph: Annotated[AsyncNeo4jGraph, Depends(get_neo4j_graph)],
+    extraction_cache: Annotated[ExtractionCache, Depends(get_extraction_cache)],
+    writer: Annotated[GraphWriter, Depends(get_graph_writer)],
+    code_extractor: Annotated[CodeExtractor, Depends(get_code_extractor)],
+    incremental: bool = False,
+    stats: PipelineStats | None = None,
+    embedding_indexer: EmbeddingIndexer | None = None,
 ):
     """
-    Loads a project from Github into Neo4j
+    Loads a project from a source into Neo4j
+
+    With `incremental`, only files that were added or modified since the last
+    load are extracted. Otherwise, the project is rebuilt from scratch.
+    Progress is recorded in `stats` as the load goes. With an
+    `embedding_indexer`, chunks and symbols are embedded as they're written.
     """
-    structlog.contextvars.bind_contextvars(github_url=url)
-    if not url.startswith("https://github.com"):
-        raise ValueError(f"Invalid Github URL: {url}.")
-    with tempfile.TemporaryDirectory() as project_src_directory:
-        project_src_location = Path(project_src_directory)
-        await download_github_project(url, project_src_location)
-        documents = await load_documents(project_src_location)
-        await insert_documents(documents, llm_transformer, graph)
+    project = source.project
+    structlog.contextvars.bind_contextvars(project=project)
+    source.check()
+    await writer.ensure_constraints([DOCUMENT_LABEL])
+    await ensure_indexes(graph)
+    if embedding_indexer is not None:
+        await embedding_indexer.ensure_indexes(graph)
+    indexed_hashes = await get_indexed_hashes(graph, project)
+    sync = ProjectSync(indexed_hashes) if incremental else None
+
+    async with source.open() as project_files:
+        if sync is None:
+            await remove_documents(graph, project, list(indexed_hashes))
+        pipeline = IngestionPipeline(
+            llm_transformer,
+            graph,
+            extraction_cache,
+            writer,
+            project=project,
+            sync=sync,
+            code_extractor=code_extractor,
+            modules=ModuleIndex(project_files.filenames),
+            embedding_indexer=embedding_indexer,
+            stats=stats,
+        )
+        pipeline.stats.total = len(project_files.names)
+        await pipeline.run(
+            _with_document_ids(project, project_files.read(project=project))
+        )
+
+    if sync is not None:
+        # Only now has every file been seen
+        await remove_documents(graph, project, sync.deleted)
+        await logger.ainfo(
+            "Synced project.",
+            **{status.value: count for status, count in sync.counts.items()},
+            deleted=len(sync.deleted),
+        )
@@ -0,0 +1,408 @@
+import hashlib
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from collections.abc import Callable
+from functools import cache, lru_cache
+
+from langchain_community.graphs.graph_document import GraphDocument
+from langchain_core.embeddings import Embeddings
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain_openai import OpenAIEmbeddings
+
+from api.chunking import CHARS_PER_TOKEN, split_document
+from api.common import (
+    OPENROUTER_BASE_URL,
+    AsyncNeo4jGraph,
+    ProviderRegistry,
+    get_provider_registry,
+    logger,
+)
+from api.extractors import CLASS, FUNCTION
+from api.graph_writer import (
+    DOCUMENT_LABEL,
+    GraphWriter,
+    escape_name,
+    get_graph_writer,
+)
+
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "hashing")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL")
+# Only used by the hashing backend, other models have a fixed size
+EMBEDDING_DIMENSIONS = int(os.environ.get("EMBEDDING_DIMENSIONS", "384"))
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CHUNK_TOKENS = int(os.environ.get("EMBEDDING_CHUNK_TOKENS", "512"))
+EMBEDDING_SYMBOL_TOKENS = int(os.environ.get("EMBEDDING_SYMBOL_TOKENS", "512"))
+
+DEFAULT_EMBEDDING_MODELS = {
+    "gemini": "models/text-embedding-004",
+    "openrouter": "openai/text-embedding-3-small",
+}
+
+CHUNK_LABEL = "Chunk"
+SYMBOL_LABEL = "Symbol"
+HAS_CHUNK = "HAS_CHUNK"
+EMBEDDING_PROPERTY = "embedding"
+SYMBOL_TYPES = (CLASS, FUNCTION)
+VECTOR_INDEXES = {
+    CHUNK_LABEL: "chunk_embeddings",
+    SYMBOL_LABEL: "symbol_embeddings",
+}
+# Index names and the properties they cover. The simple analyzer splits
+# on anything that isn't a letter, so qualified and snake_case names are
+# searchable by their parts.
+FULLTEXT_INDEXES = {
+    CHUNK_LABEL: ("chunk_text", ("text", "filename")),
+    SYMBOL_LABEL: ("symbol_text", ("name", "docstring")),
+}
+
+# Symbols are looked up by id when expanding search results. It can't be
+# a uniqueness constraint, as a class and a function may share a name.
+SYMBOL_ID_INDEX = (
+    f"CREATE INDEX symbol_id IF NOT EXISTS FOR (n:{SYMBOL_LABEL}) ON (n.id)"
+)
+
+# Chunks hang off the document they were split from. Vectors are stored
+# with setNodeVectorProperty, as floats rather than a list of doubles.
+CHUNKS_QUERY = (
+    "UNWIND $rows AS row "
+    f"MATCH (d:{DOCUMENT_LABEL} {{id: row.document}}) "
+    f"MERGE (c:{CHUNK_LABEL} {{id: row.id}}) "
+    "SET c += row.properties "
+    f"MERGE (d)-[:{HAS_CHUNK}]->(c) "
+    "WITH c, row "
+    f"CALL db.create.setNodeVectorProperty(c, '{EMBEDDING_PROPERTY}', "
+    "row.embedding)"
+)
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+# Words of camelCase, PascalCase and snake_case identifiers
+WORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+# Too common in code to tell anything apart
+STOPWORDS = {
+    "a",
+    "an",
+    "and",
+    "as",
+    "class",
+    "const",
+    "def",
+    "else",
+    "for",
+    "from",
+    "function",
+    "if",
+    "import",
+    "in",
+    "is",
+    "let",
+    "none",
+    "not",
+    "of",
+    "or",
+    "return",
+    "self",
+    "the",
+    "this",
+    "to",
+    "var",
+}
+# Trigrams match words by their parts, e.g. "parse" and "parser"
+TRIGRAM_WEIGHT = 0.25
+
+
+def _features(text: str) -> Counter[str]:
+    features: Counter[str] = Counter()
+    for identifier in IDENTIFIER.findall(text):
+        words = [word.lower() for word in WORD.findall(identifier)]
+        if len(words) > 1:
+            features[identifier.lower()] += 1
+        for word in words:
+            if word in STOPWORDS:
+                continue
+            features[word] += 1
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                features[f"#{padded[i : i + 3]}"] += TRIGRAM_WEIGHT
+    return features
+
+
+@lru_cache(maxsize=65536)
+def _bucket(feature: str, dimensions: int) -> tuple[int, float]:
+    # A stable hash, unlike hash(), so vectors are the same across processes
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % dimensions, 1.0 if value >> 63 else -1.0
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic embeddings computed locally, without a model.
+
+    Words of identifiers, whole identifiers and character trigrams are
+    hashed into a fixed number of signed buckets, weighted by the log of
+    their count so repetition doesn't drown out the rest. Texts sharing
+    vocabulary end up close, which is enough to retrieve code by the names
+    it uses, and the same text always gets the same vector, offline.
+    """
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimensions
+        for feature, count in _features(text).items():
+            index, sign = _bucket(feature, self.dimensions)
+            vector[index] += sign * math.log1p(count)
+        norm = math.sqrt(sum(value * value for value in vector))
+        if not norm:
+            return vector
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def _hashing_embeddings(registry: ProviderRegistry, model: str) -> Embeddings:
+    return HashingEmbeddings()
+
+
+def _gemini_embeddings(registry: ProviderRegistry, model: str) -> Embeddings:
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY environment variable is required")
+    return GoogleGenerativeAIEmbeddings(model=model, google_api_key=api_key)
+
+
+def _openrouter_embeddings(
+    registry: ProviderRegistry, model: str
+) -> Embeddings:
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key:
+        raise ValueError("OPENROUTER_API_KEY environment variable is required")
+    return OpenAIEmbeddings(
+        model=model,
+        api_key=api_key,
+        base_url=OPENROUTER_BASE_URL,
+        # Only OpenAI's own models can be tokenized with tiktoken
+        check_embedding_ctx_length=False,
+        http_async_client=registry.http_client(),
+    )
+
+
+EMBEDDERS: dict[str, Callable[[ProviderRegistry, str], Embeddings]] = {
+    "hashing": _hashing_embeddings,
+    "gemini": _gemini_embeddings,
+    "openrouter": _openrouter_embeddings,
+}
+
+
+@cache
+def get_embeddings() -> Embeddings:
+    """
+    Sets up the configured embedding backend, shared across the app.
+    """
+    if EMBEDDING_BACKEND not in EMBEDDERS:
+        raise ValueError(f"Unknown embedding backend: {EMBEDDING_BACKEND}.")
+    model = EMBEDDING_MODEL or DEFAULT_EMBEDDING_MODELS.get(
+        EMBEDDING_BACKEND, ""
+    )
+    embeddings = EMBEDDERS[EMBEDDING_BACKEND](get_provider_registry(), model)
+    logger.info("Embeddings set up.", backend=EMBEDDING_BACKEND, model=model)
+    return embeddings
+
+
+class EmbeddingIndexer:
+    """
+    Embeds the chunks and symbols of written documents, and stores them in
+    Neo4j vector indexes.
+
+    Documents are split into `Chunk` nodes of at most `chunk_tokens`, linked
+    from their `Document` by `HAS_CHUNK`. Classes and functions get the
+    `Symbol` label, and are embedded from their name, docstring and source.
+    Texts are sent to the embedding backend `batch_size` at a time.
+    """
+
+    def __init__(
+        self,
+        writer: GraphWriter,
+        embeddings: Embeddings,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        chunk_tokens: int = EMBEDDING_CHUNK_TOKENS,
+        symbol_tokens: int = EMBEDDING_SYMBOL_TOKENS,
+    ):
+        self.writer = writer
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.chunk_tokens = chunk_tokens
+        self.symbol_tokens = symbol_tokens
+        self._dimensions: int | None = None
+        self._indexed = False
+
+    async def dimensions(self) -> int:
+        """
+        Gets the size of the backend's vectors, embedding a probe once if it
+        isn't known up front.
+        """
+        if self._dimensions is None:
+            if isinstance(self.embeddings, HashingEmbeddings):
+                self._dimensions = self.embeddings.dimensions
+            else:
+                probe = await self.embeddings.aembed_query("dimensions")
+                self._dimensions = len(probe)
+        return self._dimensions
+
+    async def ensure_indexes(self, graph: AsyncNeo4jGraph):
+        """
+        Creates the vector and full-text indexes on chunks and symbols, once.
+        """
+        if self._indexed:
+            return
+        dimensions = await self.dimensions()
+        await self.writer.ensure_constraints([CHUNK_LABEL])
+        await graph.query(SYMBOL_ID_INDEX)
+        for label, name in VECTOR_INDEXES.items():
+            await graph.query(
+                f"CREATE VECTOR INDEX {name} IF NOT EXISTS "
+                f"FOR (n:{label}) ON n.{EMBEDDING_PROPERTY} "
+                "OPTIONS {indexConfig: {"
+                f"`vector.dimensions`: {dimensions}, "
+                "`vector.similarity_function`: 'cosine'}}"
+            )
+        for label, (name, properties) in FULLTEXT_INDEXES.items():
+            fields = ", ".join(f"n.{field}" for field in properties)
+            await graph.query(
+                f"CREATE FULLTEXT INDEX {name} IF NOT EXISTS "
+                f"FOR (n:{label}) ON EACH [{fields}] "
+                "OPTIONS {indexConfig: {`fulltext.analyzer`: 'simple'}}"
+            )
+        self._indexed = True
+
+    def chunk_rows(self, graph_document: GraphDocument) -> list[dict]:
+        source = graph_document.source
+        document_id = source.metadata.get("id")
+        if document_id is None:
+            return []
+        filename = source.metadata.get("filename", "")
+        rows = []
+        for chunk in split_document(source, self.chunk_tokens):
+            text = chunk.page_content
+            if not text.strip():
+                continue
+            index = chunk.metadata.get("chunk", 0)
+            start_line = chunk.metadata.get("start_line", 1)
+            rows.append(
+                {
+                    "document": document_id,
+                    "id": f"{document_id}#{index}",
+                    # The path says a lot about what a chunk is about
+                    "text": f"{filename}\n{text}",
+                    "properties": {
+                        "project": source.metadata.get("project"),
+                        "filename": filename,
+                        "chunk": index,
+                        "start_line": start_line,
+                        "end_line": start_line + text.strip("\n").count("\n"),
+                        "text": text,
+                    },
+                }
+            )
+        return rows
+
+    def symbol_rows(self, graph_document: GraphDocument) -> list[dict]:
+        lines: list[str] | None = None
+        rows = []
+        for node in graph_document.nodes:
+            if node.type not in SYMBOL_TYPES:
+                continue
+            properties = node.properties
+            parts = [f"{node.type.lower()} {properties.get('name', node.id)}"]
+            if docstring := properties.get("docstring"):
+                parts.append(docstring)
+            lineno = properties.get("lineno")
+            end_lineno = properties.get("end_lineno")
+            if lineno and end_lineno:
+                if lines is None:
+                    lines = graph_document.source.page_content.splitlines()
+                parts.append("\n".join(lines[lineno - 1 : end_lineno]))
+            text = "\n".join(parts)[: self.symbol_tokens * CHARS_PER_TOKEN]
+            rows.append({"id": node.id, "label": node.type, "text": text})
+        return rows
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        vectors: list[list[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(
+                await self.embeddings.aembed_documents(
+                    texts[start : start + self.batch_size]
+                )
+            )
+        return vectors
+
+    async def index(self, graph_documents: list[GraphDocument]) -> int:
+        """
+        Embeds and stores the chunks and symbols of graph documents that
+        were already written. Returns how many were embedded.
+
+        Embedding failures are logged rather than raised, so they don't fail
+        the load, which leaves those documents out of semantic search.
+        """
+        chunks = [
+            row
+            for graph_document in graph_documents
+            for row in self.chunk_rows(graph_document)
+        ]
+        symbols = [
+            row
+            for graph_document in graph_documents
+            for row in self.symbol_rows(graph_document)
+        ]
+        rows = chunks + symbols
+        if not rows:
+            return 0
+        try:
+            vectors = await self.embed([row.pop("text") for row in rows])
+        except Exception as exc:
+            await logger.aerror(
+                "Embedding failed.", rows=len(rows), error=str(exc)
+            )
+            return 0
+        for row, vector in zip(rows, vectors, strict=True):
+            row["embedding"] = vector
+        # Zero vectors, from texts without a word, can't be compared
+        rows = [row for row in rows if any(row["embedding"])]
+
+        symbols_by_label: defaultdict[str, list[dict]] = defaultdict(list)
+        for row in rows:
+            if "label" in row:
+                symbols_by_label[row["label"]].append(row)
+        await self.writer.run_batched(
+            CHUNKS_QUERY, [row for row in rows if "document" in row]
+        )
+        for label, label_rows in symbols_by_label.items():
+            await self.writer.run_batched(
+                "UNWIND $rows AS row "
+                f"MATCH (n:{escape_name(label)} {{id: row.id}}) "
+                f"SET n:{SYMBOL_LABEL} "
+                "WITH n, row "
+                f"CALL db.create.setNodeVectorProperty(n, "
+                f"'{EMBEDDING_PROPERTY}', row.embedding)",
+                label_rows,
+            )
+
+        await logger.adebug(
+            "Embedded documents.",
+            documents=len(graph_documents),
+            chunks=len(chunks),
+            symbols=len(symbols),
+        )
+        return len(rows)
+
+
+@cache
+def get_embedding_indexer() -> EmbeddingIndexer:
+    """
+    Sets up the embedding indexer shared by all loads and searches.
+    """
+    return EmbeddingIndexer(get_graph_writer(), get_embeddings())
@@ -0,0 +1,414 @@
+import ast
+import asyncio
+import multiprocessing
+import os
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import cache
+from pathlib import PurePosixPath
+from typing import Any
+
+from langchain_community.graphs.graph_document import (
+    GraphDocument,
+    Node,
+    Relationship,
+)
+from langchain_core.documents import Document
+
+from api.common import logger
+
+EXTRACTOR_PROCESSES = int(
+    os.environ.get("EXTRACTOR_PROCESSES", str(os.cpu_count() or 1))
+)
+# Also send files that were parsed locally to the LLM, for the semantic
+# entities a parse tree doesn't have
+LLM_ENRICHMENT = os.environ.get("EXTRACTION_LLM_ENRICHMENT", "false") == "true"
+
+FILE = "File"
+MODULE = "Module"
+CLASS = "Class"
+FUNCTION = "Function"
+IMPORTS = "IMPORTS"
+DEFINES = "DEFINES"
+CALLS = "CALLS"
+
+# (id, type, properties)
+NodeRow = tuple[str, str, dict[str, Any]]
+# (source id, source type, relationship type, target id, target type)
+RelationshipRow = tuple[str, str, str, str, str]
+ExtractedRows = tuple[list[NodeRow], list[RelationshipRow]]
+
+
+def module_name(filename: str) -> tuple[str, bool]:
+    """
+    Gets the dotted module name of a Python file, and whether it's a package.
+    """
+    parts = list(
+        PurePosixPath(filename.replace(os.sep, "/")).with_suffix("").parts
+    )
+    is_package = parts[-1] == "__init__"
+    if is_package and len(parts) > 1:
+        parts = parts[:-1]
+    return ".".join(parts), is_package
+
+
+def qualified_id(name: str, prefix: str) -> str:
+    return f"{prefix}:{name}" if prefix else name
+
+
+class ModuleIndex:
+    """
+    The Python modules of a project, to resolve absolute imports against.
+
+    Absolute imports are written relative to a source root, which needn't be
+    the project root, so modules are also found by every dotted suffix of
+    their name: `api.common` resolves to `backend.api.common`.
+    """
+
+    def __init__(self, filenames: Iterable[str]):
+        self.suffixes: defaultdict[str, list[str]] = defaultdict(list)
+        for filename in filenames:
+            if PurePosixPath(filename).suffix != ".py":
+                continue
+            parts = module_name(filename)[0].split(".")
+            for i in range(len(parts)):
+                self.suffixes[".".join(parts[i:])].append(".".join(parts))
+
+    def resolve(self, name: str, importer: str) -> str | None:
+        """
+        Finds the module an absolute import of `name` in module `importer`
+        refers to, if it's in the project.
+
+        Of modules sharing a suffix, the one sharing the most packages with
+        the importer wins. If that's a tie, the import is left unresolved.
+        """
+        candidates = [
+            module
+            for module in self.suffixes.get(name, ())
+            if module != importer
+        ]
+        if name in candidates:
+            return name
+        if len(candidates) <= 1:
+            return candidates[0] if candidates else None
+
+        package = importer.split(".")[:-1]
+
+        def closeness(module: str) -> int:
+            return len(os.path.commonprefix([module.split(".")[:-1], package]))
+
+        ranked = sorted(candidates, key=closeness, reverse=True)
+        if closeness(ranked[0]) > closeness(ranked[1]):
+            return ranked[0]
+        return None
+
+
+class _PythonVisitor(ast.NodeVisitor):
+    def __init__(self, module: str, is_package: bool, prefix: str):
+        self.module = module
+        self.package = (
+            module.split(".") if is_package else module.split(".")[:-1]
+        )
+        self.prefix = prefix
+        self.nodes: dict[str, NodeRow] = {}
+        self.relationships: list[RelationshipRow] = []
+        # Innermost definition last, as (id, type, name)
+        self.scopes: list[tuple[str, str, str]] = [
+            (self.node_id(module), MODULE, module)
+        ]
+        self.class_methods: dict[str, set[str]] = {}
+        self.calls: list[tuple[str, str, ast.expr, str | None]] = []
+
+    def node_id(self, name: str) -> str:
+        return qualified_id(name, self.prefix)
+
+    def add_node(self, name: str, node_type: str, **properties) -> str:
+        node_id = self.node_id(name)
+        self.nodes.setdefault(
+            node_id, (node_id, node_type, {"name": name, **properties})
+        )
+        return node_id
+
+    def add_relationship(
+        self, source: tuple[str, str], rel_type: str, target: tuple[str, str]
+    ):
+        self.relationships.append((*source, rel_type, *target))
+
+    def resolve_import(self, module: str | None, level: int) -> str:
+        if not level:
+            return module or ""
+        # Each level past the first goes up one package
+        base = self.package[: max(0, len(self.package) - (level - 1))]
+        return ".".join([*base, *([module] if module else [])])
+
+    def visit_Import(self, node: ast.Import):
+        scope_id, scope_type, _ = self.scopes[0]
+        for alias in node.names:
+            target = self.add_node(alias.name, MODULE)
+            self.add_relationship(
+                (scope_id, scope_type), IMPORTS, (target, MODULE)
+            )
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        imported = self.resolve_import(node.module, node.level)
+        # `from . import name` imports submodules of the package
+        modules = (
+            [imported]
+            if node.module
+            else [
+                f"{imported}.{alias.name}".lstrip(".") for alias in node.names
+            ]
+        )
+        scope_id, scope_type, _ = self.scopes[0]
+        for module in modules:
+            target = self.add_node(module, MODULE)
+            self.add_relationship(
+                (scope_id, scope_type), IMPORTS, (target, MODULE)
+            )
+
+    def _visit_definition(
+        self,
+        node: ast.ClassDef | ast.FunctionDef | ast.AsyncFunctionDef,
+        node_type: str,
+        **properties,
+    ):
+        parent_id, parent_type, parent_name = self.scopes[-1]
+        name = f"{parent_name}.{node.name}"
+        docstring = ast.get_docstring(node)
+        if docstring:
+            properties["docstring"] = docstring
+        node_id = self.add_node(
+            name,
+            node_type,
+            lineno=node.lineno,
+            end_lineno=node.end_lineno,
+            **properties,
+        )
+        self.add_relationship(
+            (parent_id, parent_type), DEFINES, (node_id, node_type)
+        )
+        if parent_type == CLASS and node_type == FUNCTION:
+            self.class_methods.setdefault(parent_name, set()).add(node.name)
+        self.scopes.append((node_id, node_type, name))
+        self.generic_visit(node)
+        self.scopes.pop()
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self._visit_definition(node, CLASS)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self._visit_definition(node, FUNCTION, is_async=False)
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
+        self._visit_definition(node, FUNCTION, is_async=True)
+
+    def visit_Call(self, node: ast.Call):
+        caller_id, caller_type, _ = self.scopes[-1]
+        enclosing_class = next(
+            (name for _, kind, name in reversed(self.scopes) if kind == CLASS),
+            None,
+        )
+        self.calls.append((caller_id, caller_type, node.func, enclosing_class))
+        self.generic_visit(node)
+
+    def resolve_calls(self):
+        """
+        Links calls to what they call, for calls to definitions in the same
+        file. Anything else can't be resolved from a single parse tree.
+        """
+        for caller_id, caller_type, func, enclosing_class in self.calls:
+            callee: str | None = None
+            if isinstance(func, ast.Name):
+                callee = f"{self.module}.{func.id}"
+            elif (
+                isinstance(func, ast.Attribute)
+                and isinstance(func.value, ast.Name)
+                and func.value.id in ("self", "cls")
+                and enclosing_class is not None
+                and func.attr in self.class_methods.get(enclosing_class, ())
+            ):
+                callee = f"{enclosing_class}.{func.attr}"
+            target = self.nodes.get(self.node_id(callee)) if callee else None
+            if target is None or target[1] not in (CLASS, FUNCTION):
+                continue
+            self.add_relationship(
+                (caller_id, caller_type), CALLS, (target[0], target[1])
+            )
+
+
+def extract_python(
+    filename: str, contents: str, prefix: str = ""
+) -> ExtractedRows | None:
+    """
+    Extracts the structure of a Python file from its parse tree.
+
+    Node ids are qualified names, prefixed with `prefix` so projects don't
+    share nodes. Returns None if the file doesn't parse.
+    """
+    try:
+        tree = ast.parse(contents, filename=filename)
+    except (SyntaxError, ValueError):
+        return None
+    module, is_package = module_name(filename)
+    visitor = _PythonVisitor(module, is_package, prefix)
+    docstring = ast.get_docstring(tree)
+    module_id = visitor.add_node(
+        module, MODULE, **({"docstring": docstring} if docstring else {})
+    )
+    file_id = visitor.add_node(filename, FILE, path=filename, language="python")
+    visitor.add_relationship((file_id, FILE), DEFINES, (module_id, MODULE))
+    visitor.visit(tree)
+    visitor.resolve_calls()
+    # A definition may call the same thing more than once
+    return list(visitor.nodes.values()), list(
+        dict.fromkeys(visitor.relationships)
+    )
+
+
+def resolve_imports(
+    rows: ExtractedRows, filename: str, modules: ModuleIndex, prefix: str = ""
+) -> ExtractedRows:
+    """
+    Points the imports extracted from a file at the project's modules they
+    refer to, as a single file can't tell which source root its absolute
+    imports are relative to. Imports of modules outside the project are
+    left as they are.
+    """
+    importer, _ = module_name(filename)
+    node_rows, relationship_rows = rows
+    renamed: dict[str, str] = {}
+    nodes: dict[str, NodeRow] = {}
+    for node_id, node_type, properties in node_rows:
+        name = properties["name"]
+        if node_type == MODULE and name != importer:
+            resolved = modules.resolve(name, importer)
+            if resolved is not None and resolved != name:
+                renamed[node_id] = qualified_id(resolved, prefix)
+                node_id = renamed[node_id]
+                properties = {**properties, "name": resolved}
+        nodes.setdefault(node_id, (node_id, node_type, properties))
+    relationships = [
+        (
+            renamed.get(source_id, source_id),
+            source_type,
+            rel_type,
+            renamed.get(target_id, target_id),
+            target_type,
+        )
+        for source_id, source_type, rel_type, target_id, target_type in (
+            relationship_rows
+        )
+    ]
+    # Imports written differently may resolve to the same module
+    return list(nodes.values()), list(dict.fromkeys(relationships))
+
+
+# Extractors by file extension. They run in worker processes, so they must
+# be picklable top level functions.
+EXTRACTORS: dict[str, Callable[[str, str, str], ExtractedRows | None]] = {
+    ".py": extract_python,
+}
+
+
+def merge_graph_documents(
+    graph_document: GraphDocument, *others: GraphDocument
+) -> GraphDocument:
+    """
+    Combines graph documents extracted from the same source document.
+    """
+    nodes = list(graph_document.nodes)
+    relationships = list(graph_document.relationships)
+    for other in others:
+        nodes.extend(other.nodes)
+        relationships.extend(other.relationships)
+    return GraphDocument(
+        nodes=nodes, relationships=relationships, source=graph_document.source
+    )
+
+
+def _to_graph_document(
+    rows: ExtractedRows, document: Document
+) -> GraphDocument:
+    node_rows, relationship_rows = rows
+    nodes = {
+        node_id: Node(id=node_id, type=node_type, properties=properties)
+        for node_id, node_type, properties in node_rows
+    }
+    relationships = [
+        Relationship(
+            source=nodes.get(source_id) or Node(id=source_id, type=source_type),
+            target=nodes.get(target_id) or Node(id=target_id, type=target_type),
+            type=rel_type,
+        )
+        for source_id, source_type, rel_type, target_id, target_type in (
+            relationship_rows
+        )
+    ]
+    return GraphDocument(
+        nodes=list(nodes.values()), relationships=relationships, source=document
+    )
+
+
+class CodeExtractor:
+    """
+    Extracts code structure from source files without an LLM.
+
+    Files in a language with an extractor get File/Module/Class/Function
+    nodes and IMPORTS/DEFINES/CALLS relationships straight from their parse
+    tree. Parsing is CPU bound, so it runs on a process pool rather than on
+    the event loop.
+    """
+
+    def __init__(
+        self,
+        pool: Executor,
+        extractors: dict[
+            str, Callable[[str, str, str], ExtractedRows | None]
+        ] = EXTRACTORS,
+    ):
+        self.pool = pool
+        self.extractors = extractors
+
+    def supports(self, filename: str) -> bool:
+        return PurePosixPath(filename).suffix in self.extractors
+
+    async def extract(
+        self, document: Document, modules: ModuleIndex | None = None
+    ) -> GraphDocument | None:
+        """
+        Extracts a graph document, or returns None if the document's language
+        isn't supported or it doesn't parse.
+
+        Imports are resolved against the project's `modules` when given.
+        """
+        filename = document.metadata.get("filename", "")
+        extractor = self.extractors.get(PurePosixPath(filename).suffix)
+        if extractor is None:
+            return None
+        prefix = document.metadata.get("project", "")
+        rows = await asyncio.get_running_loop().run_in_executor(
+            self.pool, extractor, filename, document.page_content, prefix
+        )
+        if rows is None:
+            await logger.adebug("Couldn't parse file.", filename=filename)
+            return None
+        if modules is not None:
+            rows = resolve_imports(rows, filename, modules, prefix)
+        return _to_graph_document(rows, document)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+@cache
+def get_code_extractor() -> CodeExtractor:
+    """
+    Sets up the code extractor and its process pool, shared by all loads.
+    """
+    # Forking a process with a running event loop and driver threads isn't
+    # safe, so workers are spawned fresh
+    pool = ProcessPoolExecutor(
+        EXTRACTOR_PROCESSES, mp_context=multiprocessing.get_context("spawn")
+    )
+    return CodeExtractor(pool)
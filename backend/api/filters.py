@@ -0,0 +1,353 @@
+import os
+import posixpath
+import re
+import zipfile
+from collections import Counter
+from collections.abc import Iterator
+from dataclasses import dataclass
+from enum import StrEnum
+
+FILTER_MAX_FILE_BYTES = int(
+    os.environ.get("FILTER_MAX_FILE_BYTES", str(1024 * 1024))
+)
+FILTER_SKIP_GENERATED = (
+    os.environ.get("FILTER_SKIP_GENERATED", "true") == "true"
+)
+
+# Read with .gitignore syntax, in every directory of the project
+IGNORE_FILES = (".gitignore", ".fastctxignore")
+SNIFF_BYTES = 8192
+# Average line length past which a file is taken to be minified
+MINIFIED_LINE_LENGTH = 500
+GENERATED_MARKERS = (
+    b"@generated",
+    b"do not edit",
+    b"code generated by",
+    b"auto-generated",
+    b"autogenerated",
+)
+
+# Vendored, built and generated files, ignored unless FILTER_SKIP_GENERATED
+# is turned off
+GENERATED_PATTERNS = """
+.hg/
+.svn/
+node_modules/
+bower_components/
+vendor/
+.venv/
+venv/
+__pycache__/
+.mypy_cache/
+.pytest_cache/
+.ruff_cache/
+.tox/
+.next/
+.nuxt/
+dist/
+build/
+target/
+coverage/
+*.min.js
+*.min.css
+*.map
+*.pyc
+*_pb2.py
+*_pb2_grpc.py
+*.pb.go
+package-lock.json
+yarn.lock
+pnpm-lock.yaml
+npm-shrinkwrap.json
+uv.lock
+poetry.lock
+Pipfile.lock
+Cargo.lock
+Gemfile.lock
+composer.lock
+go.sum
+"""
+
+
+class SkipReason(StrEnum):
+    IGNORED = "ignored"
+    TOO_LARGE = "too_large"
+    BINARY = "binary"
+    GENERATED = "generated"
+    SYMLINK = "symlink"
+
+
+def no_follow(path: str, flags: int) -> int:
+    """
+    An `opener` for `open` that refuses symlinks, so a link swapped in for a
+    file after it was listed can't be read through.
+    """
+    return os.open(path, flags | os.O_NOFOLLOW)
+
+
+def within(root_dir: os.PathLike | str, path: str) -> bool:
+    """
+    Whether a path, relative to `root_dir`, resolves to a file inside it.
+    """
+    root = os.path.realpath(root_dir)
+    resolved = os.path.realpath(os.path.join(root, path))
+    return os.path.commonpath([resolved, root]) == root
+
+
+def _translate(pattern: str) -> str:
+    """
+    Translates a gitignore glob into a regex over `/` separated paths.
+    """
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+            continue
+        char = pattern[i]
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        elif char == "[" and (end := pattern.find("]", i + 1)) != -1:
+            char_class = pattern[i + 1 : end]
+            if char_class.startswith("!"):
+                char_class = "^" + char_class[1:]
+            regex += f"[{char_class}]"
+            i = end
+        else:
+            regex += re.escape(char)
+        i += 1
+    return regex
+
+
+@dataclass
+class _Rule:
+    base: str
+    regex: re.Pattern
+    negate: bool
+    dir_only: bool
+
+
+class IgnoreRules:
+    """
+    Matches paths against gitignore rules, gathered from any number of ignore
+    files. As with git, the last matching rule wins.
+    """
+
+    def __init__(self):
+        self.rules: list[_Rule] = []
+
+    def add(self, text: str, base: str = ""):
+        """
+        Adds the rules of an ignore file in directory `base`, relative to the
+        project root.
+        """
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            # A slash anywhere but the end anchors the pattern to `base`
+            regex = _translate(line.lstrip("/"))
+            if "/" not in line:
+                regex = "(?:.*/)?" + regex
+            self.rules.append(_Rule(base, re.compile(regex), negate, dir_only))
+
+    def match(self, path: str, is_dir: bool = False) -> bool:
+        """
+        Whether a path is ignored, assuming its parent directories are not.
+        """
+        ignored = False
+        for rule in self.rules:
+            if rule.dir_only and not is_dir:
+                continue
+            relative = path
+            if rule.base:
+                if not path.startswith(rule.base + "/"):
+                    continue
+                relative = path[len(rule.base) + 1 :]
+            if rule.regex.fullmatch(relative):
+                ignored = not rule.negate
+        return ignored
+
+    def ignores(self, path: str, is_dir: bool = False) -> bool:
+        """
+        Whether a path or any of its parent directories is ignored.
+        """
+        parts = path.split("/")
+        return any(
+            self.match("/".join(parts[:depth]), is_dir=True)
+            for depth in range(1, len(parts))
+        ) or self.match(path, is_dir)
+
+
+def looks_generated(head: bytes) -> bool:
+    if any(marker in head[:512].lower() for marker in GENERATED_MARKERS):
+        return True
+    return len(head) / (head.count(b"\n") + 1) > MINIFIED_LINE_LENGTH
+
+
+class FileFilter:
+    """
+    Decides which files of a project are worth ingesting.
+
+    Files are skipped if they are ignored by a `.gitignore` or
+    `.fastctxignore`, over the size limit, binary, or generated. Binary and
+    generated files are detected from their first bytes, so skipped files
+    are never read in full.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = FILTER_MAX_FILE_BYTES,
+        skip_generated: bool = FILTER_SKIP_GENERATED,
+    ):
+        self.max_bytes = max_bytes
+        self.skip_generated = skip_generated
+        self.rules = IgnoreRules()
+        # Repository metadata is never worth ingesting
+        self.rules.add(".git/")
+        if skip_generated:
+            self.rules.add(GENERATED_PATTERNS)
+        self.counts: Counter[SkipReason] = Counter()
+
+    def check(self, size: int, head: bytes) -> SkipReason | None:
+        """
+        Checks a file that isn't ignored, from its size and first bytes.
+        """
+        if size > self.max_bytes:
+            return SkipReason.TOO_LARGE
+        if b"\0" in head:
+            return SkipReason.BINARY
+        if self.skip_generated and looks_generated(head):
+            return SkipReason.GENERATED
+        return None
+
+    def _check_path(
+        self, full_path: str, path: str, is_dir: bool = False
+    ) -> SkipReason | None:
+        if os.path.islink(full_path):
+            return SkipReason.SYMLINK
+        if self.rules.match(path, is_dir):
+            return SkipReason.IGNORED
+        return None
+
+    def _skip(self, reason: SkipReason | None) -> bool:
+        if reason is not None:
+            self.counts[reason] += 1
+        return reason is not None
+
+    def walk(self, root_dir: os.PathLike | str) -> Iterator[str]:
+        """
+        Yields the paths, relative to `root_dir`, of the files to ingest.
+
+        Ignored directories are pruned rather than walked. Symlinks are
+        skipped, so nothing outside `root_dir` is read through them.
+        """
+        for root, dirs, files in os.walk(root_dir):
+            relative_root = os.path.relpath(root, root_dir).replace(os.sep, "/")
+            relative_root = "" if relative_root == "." else relative_root
+            for ignore_file in IGNORE_FILES:
+                if ignore_file in files:
+                    try:
+                        with open(
+                            os.path.join(root, ignore_file),
+                            errors="replace",
+                            opener=no_follow,
+                        ) as f:
+                            self.rules.add(f.read(), relative_root)
+                    except OSError:
+                        continue
+
+            dirs[:] = [
+                directory
+                for directory in dirs
+                if not self._skip(
+                    self._check_path(
+                        os.path.join(root, directory),
+                        f"{relative_root}/{directory}".lstrip("/"),
+                        is_dir=True,
+                    )
+                )
+            ]
+            for file in files:
+                path = f"{relative_root}/{file}".lstrip("/")
+                full_path = os.path.join(root, file)
+                if self._skip(self._check_path(full_path, path)):
+                    continue
+                try:
+                    size = os.path.getsize(full_path)
+                    if size > self.max_bytes:
+                        self._skip(SkipReason.TOO_LARGE)
+                        continue
+                    with open(full_path, "rb", opener=no_follow) as f:
+                        head = f.read(SNIFF_BYTES)
+                except OSError:
+                    continue
+                if not self._skip(self.check(size, head)):
+                    yield path
+
+    def walk_archive(self, archive: zipfile.ZipFile) -> Iterator[str]:
+        """
+        Yields the names of the members of a zip archive to ingest.
+
+        Only the start of each member is decompressed to sniff it.
+        """
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        # Rules of parent directories come first, as when walking a tree
+        ignore_files = sorted(
+            (
+                info
+                for info in members
+                if posixpath.basename(info.filename) in IGNORE_FILES
+            ),
+            key=lambda info: info.filename.count("/"),
+        )
+        for info in ignore_files:
+            self.rules.add(
+                archive.read(info).decode(errors="replace"),
+                posixpath.dirname(info.filename),
+            )
+
+        ignored_directories: dict[str, bool] = {}
+
+        def directory_ignored(directory: str) -> bool:
+            if not directory:
+                return False
+            if directory not in ignored_directories:
+                ignored_directories[directory] = directory_ignored(
+                    posixpath.dirname(directory)
+                ) or self.rules.match(directory, is_dir=True)
+            return ignored_directories[directory]
+
+        for info in members:
+            path = info.filename
+            if self._skip(
+                SkipReason.IGNORED
+                if directory_ignored(posixpath.dirname(path))
+                or self.rules.match(path)
+                else None
+            ):
+                continue
+            if info.file_size > self.max_bytes:
+                self._skip(SkipReason.TOO_LARGE)
+                continue
+            with archive.open(info) as f:
+                head = f.read(SNIFF_BYTES)
+            if not self._skip(self.check(info.file_size, head)):
+                yield path
@@ -0,0 +1,203 @@
+import os
+from collections import defaultdict
+from collections.abc import Iterable
+from functools import cache
+from typing import Any
+
+from langchain_community.graphs.graph_document import GraphDocument
+from neo4j import AsyncDriver, AsyncManagedTransaction
+
+from api.common import NEO4J_DATABASE, get_neo4j_driver, logger
+
+WRITE_BATCH_ROWS = int(os.environ.get("GRAPH_WRITE_BATCH_ROWS", "1000"))
+
+DOCUMENT_LABEL = "Document"
+MENTIONS = "MENTIONS"
+DEFAULT_NODE_LABEL = "Node"
+
+DOCUMENTS_QUERY = (
+    "UNWIND $rows AS row "
+    f"MERGE (d:{DOCUMENT_LABEL} {{id: row.id}}) "
+    "SET d.text = row.text, d += row.metadata"
+)
+
+# Each relationship records the documents that asserted it, so it can be
+# removed once none of them remain
+RELATIONSHIP_SOURCES = (
+    "r.document_ids = CASE "
+    "WHEN row.document_id IS NULL "
+    "OR row.document_id IN coalesce(r.document_ids, []) "
+    "THEN r.document_ids "
+    "ELSE coalesce(r.document_ids, []) + row.document_id END"
+)
+
+
+def escape_name(name: str) -> str:
+    """
+    Quotes a label or relationship type for use in Cypher.
+    """
+    return "`" + name.replace("`", "``") + "`"
+
+
+def relationship_type(name: str) -> str:
+    return name.replace(" ", "_").upper()
+
+
+def _batches(rows: list[dict], size: int) -> Iterable[list[dict]]:
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
+
+
+class GraphWriter:
+    """
+    Writes graph documents to Neo4j with batched, parameterized UNWIND/MERGE
+    statements.
+
+    Nodes are grouped by label and relationships by type and endpoint
+    labels, so each statement has a fixed shape and can use the uniqueness
+    constraint on `id` for every label it merges.
+    """
+
+    def __init__(
+        self,
+        driver: AsyncDriver,
+        database: str = NEO4J_DATABASE,
+        batch_rows: int = WRITE_BATCH_ROWS,
+    ):
+        self.driver = driver
+        self.database = database
+        self.batch_rows = batch_rows
+        self._constrained_labels: set[str] = set()
+
+    async def ensure_constraints(self, labels: Iterable[str]):
+        """
+        Creates the uniqueness constraints on `id` that MERGE relies on.
+        """
+        missing = set(labels) - self._constrained_labels
+        if not missing:
+            return
+        async with self.driver.session(database=self.database) as session:
+            for label in sorted(missing):
+                result = await session.run(
+                    "CREATE CONSTRAINT IF NOT EXISTS "
+                    f"FOR (n:{escape_name(label)}) REQUIRE n.id IS UNIQUE"
+                )
+                await result.consume()
+        self._constrained_labels |= missing
+        await logger.adebug("Ensured constraints.", labels=sorted(missing))
+
+    async def write(self, graph_documents: list[GraphDocument]):
+        """
+        Writes graph documents, along with their source documents and the
+        MENTIONS relationships linking the two.
+        """
+        documents: list[dict[str, Any]] = []
+        nodes: defaultdict[str, dict[Any, dict]] = defaultdict(dict)
+        mentions: defaultdict[str, list[dict]] = defaultdict(list)
+        relationships: defaultdict[tuple[str, str, str], list[dict]] = (
+            defaultdict(list)
+        )
+
+        for graph_document in graph_documents:
+            source = graph_document.source
+            document_id = source.metadata.get("id")
+            if document_id is not None:
+                documents.append(
+                    {
+                        "id": document_id,
+                        "text": source.page_content,
+                        "metadata": source.metadata,
+                    }
+                )
+            for node in graph_document.nodes:
+                label = node.type or DEFAULT_NODE_LABEL
+                row = nodes[label].setdefault(
+                    node.id, {"id": node.id, "properties": {}}
+                )
+                row["properties"].update(node.properties)
+                if document_id is not None:
+                    mentions[label].append(
+                        {"document": document_id, "id": node.id}
+                    )
+            for rel in graph_document.relationships:
+                key = (
+                    rel.source.type or DEFAULT_NODE_LABEL,
+                    relationship_type(rel.type),
+                    rel.target.type or DEFAULT_NODE_LABEL,
+                )
+                relationships[key].append(
+                    {
+                        "source": rel.source.id,
+                        "target": rel.target.id,
+                        "properties": rel.properties,
+                        "document_id": document_id,
+                    }
+                )
+
+        labels = {DOCUMENT_LABEL, *nodes}
+        for source_label, _, target_label in relationships:
+            labels |= {source_label, target_label}
+        await self.ensure_constraints(labels)
+
+        async with self.driver.session(database=self.database) as session:
+            await self._run_batched(session, DOCUMENTS_QUERY, documents)
+            for label, rows in nodes.items():
+                await self._run_batched(
+                    session,
+                    f"UNWIND $rows AS row "
+                    f"MERGE (n:{escape_name(label)} {{id: row.id}}) "
+                    "SET n += row.properties",
+                    list(rows.values()),
+                )
+            for label, rows in mentions.items():
+                await self._run_batched(
+                    session,
+                    "UNWIND $rows AS row "
+                    f"MATCH (d:{DOCUMENT_LABEL} {{id: row.document}}) "
+                    f"MATCH (n:{escape_name(label)} {{id: row.id}}) "
+                    f"MERGE (d)-[:{MENTIONS}]->(n)",
+                    rows,
+                )
+            for key, rows in relationships.items():
+                source_label, rel_type, target_label = key
+                await self._run_batched(
+                    session,
+                    "UNWIND $rows AS row "
+                    f"MERGE (s:{escape_name(source_label)} {{id: row.source}}) "
+                    f"MERGE (t:{escape_name(target_label)} {{id: row.target}}) "
+                    f"MERGE (s)-[r:{escape_name(rel_type)}]->(t) "
+                    f"SET r += row.properties, {RELATIONSHIP_SOURCES}",
+                    rows,
+                )
+
+        await logger.adebug(
+            "Graph documents written.",
+            documents=len(documents),
+            labels=len(nodes),
+            relationship_types=len(relationships),
+        )
+
+    async def run_batched(self, query: str, rows: list[dict]):
+        """
+        Runs an `UNWIND $rows` statement over rows, a batch at a time.
+        """
+        async with self.driver.session(database=self.database) as session:
+            await self._run_batched(session, query, rows)
+
+    async def _run_batched(self, session, query: str, rows: list[dict]):
+        # One transaction per batch keeps transaction state bounded
+        for batch in _batches(rows, self.batch_rows):
+            await session.execute_write(_run_write, query, batch)
+
+
+async def _run_write(tx: AsyncManagedTransaction, query: str, rows: list[dict]):
+    result = await tx.run(query, rows=rows)
+    await result.consume()
+
+
+@cache
+def get_graph_writer() -> GraphWriter:
+    """
+    Sets up the graph writer shared by all ingestion runs.
+    """
+    return GraphWriter(get_neo4j_driver())
@@ -0,0 +1,140 @@
+from enum import Enum
+
+from langchain_core.documents import Document
+from neo4j import RoutingControl
+
+from api.common import AsyncNeo4jGraph, logger
+from api.schema_cache import get_schema_cache
+
+INDEXED_HASHES_QUERY = (
+    "MATCH (d:Document {project: $project}) "
+    "RETURN d.filename AS filename, d.content_hash AS content_hash"
+)
+
+# Document ids are covered by the uniqueness constraint of the graph writer
+INDEX_QUERIES = [
+    "CREATE INDEX document_project IF NOT EXISTS "
+    "FOR (d:Document) ON (d.project)",
+]
+
+# Relationships record the documents that asserted them, and always connect
+# entities those documents mention. They are deleted once no asserting
+# document remains.
+REMOVE_RELATIONSHIPS_QUERY = (
+    "MATCH (d:Document)-[:MENTIONS]->()-[r]-() "
+    "WHERE d.id IN $ids AND r.document_ids IS NOT NULL "
+    "WITH DISTINCT r "
+    "SET r.document_ids = [id IN r.document_ids WHERE NOT id IN $ids] "
+    "WITH r WHERE size(r.document_ids) = 0 "
+    "DELETE r"
+)
+
+# Chunks only belong to the document they were split from
+REMOVE_CHUNKS_QUERY = (
+    "MATCH (d:Document)-[:HAS_CHUNK]->(c:Chunk) "
+    "WHERE d.id IN $ids "
+    "DETACH DELETE c"
+)
+
+# Entities are only removed once no remaining document mentions them.
+REMOVE_DOCUMENTS_QUERY = (
+    "MATCH (d:Document) WHERE d.id IN $ids "
+    "OPTIONAL MATCH (d)-[:MENTIONS]->(e) "
+    "WHERE NOT EXISTS { "
+    "  MATCH (other:Document)-[:MENTIONS]->(e) WHERE NOT other.id IN $ids "
+    "} "
+    "WITH collect(DISTINCT d) AS documents, collect(DISTINCT e) AS orphans "
+    "FOREACH (e IN orphans | DETACH DELETE e) "
+    "FOREACH (d IN documents | DETACH DELETE d)"
+)
+
+
+def document_id(project: str, filename: str) -> str:
+    """
+    Builds a stable id for the Document node of a file in a project.
+    """
+    return f"{project}:{filename}"
+
+
+class FileStatus(Enum):
+    ADDED = "added"
+    MODIFIED = "modified"
+    UNCHANGED = "unchanged"
+
+
+class ProjectSync:
+    """
+    Diffs the files of a project against the hashes stored in the graph as
+    they are loaded, so the whole project never has to be held in memory.
+    """
+
+    def __init__(self, indexed_hashes: dict[str, str]):
+        self.indexed_hashes = indexed_hashes
+        self.counts = dict.fromkeys(FileStatus, 0)
+        self._seen: set[str] = set()
+
+    def classify(self, document: Document) -> FileStatus:
+        filename = document.metadata["filename"]
+        self._seen.add(filename)
+        indexed_hash = self.indexed_hashes.get(filename)
+        if indexed_hash is None:
+            status = FileStatus.ADDED
+        elif indexed_hash != document.metadata["content_hash"]:
+            status = FileStatus.MODIFIED
+        else:
+            status = FileStatus.UNCHANGED
+        self.counts[status] += 1
+        return status
+
+    @property
+    def deleted(self) -> list[str]:
+        """
+        Indexed files that were not seen. Only complete once every file of
+        the project has been classified.
+        """
+        return [
+            filename
+            for filename in self.indexed_hashes
+            if filename not in self._seen
+        ]
+
+
+async def ensure_indexes(graph: AsyncNeo4jGraph):
+    """
+    Creates the indexes used to look up the Document nodes of a project.
+    """
+    for query in INDEX_QUERIES:
+        await graph.query(query)
+
+
+async def get_indexed_hashes(
+    graph: AsyncNeo4jGraph, project: str
+) -> dict[str, str]:
+    """
+    Gets the content hash of every file of a project currently in the graph.
+    """
+    records = await graph.query(
+        INDEXED_HASHES_QUERY, {"project": project}, routing=RoutingControl.READ
+    )
+    return {
+        record["filename"]: record["content_hash"]
+        for record in records
+        if record["filename"] is not None
+    }
+
+
+async def remove_documents(
+    graph: AsyncNeo4jGraph, project: str, filenames: list[str]
+):
+    """
+    Removes the Document nodes of the given files, their chunks, the
+    relationships they asserted and any entities no other document mentions.
+    """
+    if not filenames:
+        return
+    ids = [document_id(project, filename) for filename in filenames]
+    await graph.query(REMOVE_RELATIONSHIPS_QUERY, {"ids": ids})
+    await graph.query(REMOVE_CHUNKS_QUERY, {"ids": ids})
+    await graph.query(REMOVE_DOCUMENTS_QUERY, {"ids": ids})
+    get_schema_cache().invalidate()
+    await logger.adebug("Removed documents.", num_documents=len(ids))
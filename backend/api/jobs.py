@@ -0,0 +1,196 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable
+from dataclasses import asdict, dataclass, field
+from enum import StrEnum
+from functools import cache
+from typing import Any, Protocol
+
+from api.common import logger
+from api.pipeline import PipelineStats
+
+JOB_WORKERS = int(os.environ.get("LOADER_JOB_WORKERS", "2"))
+# Finished jobs kept around so their final status can still be fetched
+JOB_HISTORY = int(os.environ.get("LOADER_JOB_HISTORY", "100"))
+
+
+class JobRunner(Protocol):
+    """
+    Runs a job, reporting progress through `stats`.
+
+    `stats` is passed by keyword, so a runner can be a partial that binds
+    its other arguments, by position or keyword.
+    """
+
+    def __call__(self, *, stats: PipelineStats) -> Awaitable[None]: ...
+
+
+class JobStatus(StrEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+FINISHED_STATUSES = {JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED}
+
+
+@dataclass
+class Job:
+    """
+    An ingestion job, with progress reported through its pipeline stats.
+    """
+
+    run: JobRunner
+    description: str = ""
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: JobStatus = JobStatus.QUEUED
+    stats: PipelineStats = field(default_factory=PipelineStats)
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    _task: asyncio.Task | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def eta(self) -> float | None:
+        """
+        Estimates the seconds left, once the number of files is known.
+        """
+        if self.started_at is None or self.finished or not self.stats.total:
+            return None
+        processed = self.stats.written + self.stats.failed + self.stats.skipped
+        if not processed:
+            return None
+        rate = processed / (time.time() - self.started_at)
+        return max(0.0, (self.stats.total - processed) / rate)
+
+    def to_dict(self) -> dict[str, Any]:
+        eta = self.eta()
+        return {
+            "job_id": self.id,
+            "description": self.description,
+            "status": self.status,
+            "error": self.error,
+            "progress": {
+                "files_total": self.stats.total,
+                "files_read": self.stats.read,
+                "files_skipped": self.stats.skipped,
+                "files_parsed": self.stats.parsed,
+                "files_extracted": self.stats.extracted,
+                "files_written": self.stats.written,
+                "files_failed": self.stats.failed,
+                "chunks_and_symbols_embedded": self.stats.embedded,
+                "documents_per_second": round(self.stats.throughput, 2),
+                "eta_seconds": round(eta, 1) if eta is not None else None,
+            },
+            "failures": [asdict(failure) for failure in self.stats.failures],
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    An in-process job queue, drained by a fixed number of workers.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, history: int = JOB_HISTORY):
+        self.workers = workers
+        self.history = history
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._queue: asyncio.Queue[Job] = asyncio.Queue()
+        self._worker_tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        self._worker_tasks = [
+            asyncio.create_task(self._work()) for _ in range(self.workers)
+        ]
+        await logger.ainfo("Started job workers.", workers=self.workers)
+
+    async def stop(self):
+        for job in self._jobs.values():
+            if not job.finished:
+                self.cancel(job.id)
+        for worker_task in self._worker_tasks:
+            worker_task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def submit(self, run: JobRunner, description: str = "") -> Job:
+        job = Job(run=run, description=description)
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Job | None:
+        """
+        Cancels a queued or running job. Finished jobs are left as they are.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        if job._task is not None:
+            job._task.cancel()
+        else:
+            # Still queued, the worker that picks it up will skip it
+            job.status = JobStatus.CANCELLED
+            job.finished_at = time.time()
+        return job
+
+    def _prune(self):
+        finished = [
+            job_id for job_id, job in self._jobs.items() if job.finished
+        ]
+        for job_id in finished[: max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            if job.finished:
+                continue
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+            job._task = asyncio.create_task(job.run(stats=job.stats))
+            try:
+                await job._task
+            except asyncio.CancelledError:
+                if not job._task.cancelled():
+                    # The worker itself is being stopped
+                    job._task.cancel()
+                    job.status = JobStatus.CANCELLED
+                    raise
+                job.status = JobStatus.CANCELLED
+            except Exception as exc:
+                job.status = JobStatus.FAILED
+                job.error = str(exc)
+                await logger.aexception("Job failed.", job_id=job.id)
+            else:
+                job.status = JobStatus.SUCCEEDED
+            finally:
+                job.finished_at = time.time()
+                job._task = None
+            await logger.ainfo(
+                "Job finished.", job_id=job.id, status=str(job.status)
+            )
+
+
+@cache
+def get_job_manager() -> JobManager:
+    """
+    Gets the job manager shared by the app.
+    """
+    return JobManager()
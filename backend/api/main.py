@@ -1,23 +1,89 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from functools import partial
 from typing import Annotated, Any
 
 import speedbeaver
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.params import Depends
+from fastapi.responses import Response, StreamingResponse
 from fastapi_mcp import FastApiMCP
+from langchain_core.language_models import BaseChatModel
 from langchain_experimental.graph_transformers.llm import LLMGraphTransformer
-from langchain_neo4j.graphs.neo4j_graph import Neo4jGraph
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from pydantic.functional_validators import model_validator
 
-from api.common import get_neo4j_graph, setup_llm_transformer
-from api.documents import load_github_project
+from api.cache import ExtractionCache, get_extraction_cache
+from api.common import (
+    AsyncNeo4jGraph,
+    get_http_client,
+    get_llm,
+    get_llm_transformer,
+    get_neo4j_driver,
+    get_neo4j_graph,
+    get_provider_registry,
+)
+from api.documents import load_project
+from api.embeddings import EmbeddingIndexer, get_embedding_indexer
+from api.extractors import CodeExtractor, get_code_extractor
+from api.graph_writer import GraphWriter, get_graph_writer
+from api.jobs import JobManager, get_job_manager
+from api.natural import PlanStore, answer_question, get_plan_store
+from api.query import (
+    CYPHER_MAX_ROWS,
+    CYPHER_PAGE_SIZE,
+    PageState,
+    decode_cursor,
+    frame_json,
+    guard_query,
+    iter_ndjson,
+    iter_page,
+    next_cursor,
+)
+from api.retrieval import (
+    RETRIEVAL_MAX_HOPS,
+    RETRIEVAL_MAX_TOKEN_BUDGET,
+    RETRIEVAL_TOKEN_BUDGET,
+    retrieve_context,
+)
+from api.schema_cache import SchemaCache, get_schema_cache
+from api.semantic import (
+    SEMANTIC_DEFAULT_K,
+    SEMANTIC_MAX_K,
+    SearchKind,
+    semantic_search,
+)
+from api.sources import (
+    GithubArchiveSource,
+    GitSource,
+    LocalDirectorySource,
+    Source,
+)
 
 LOGGER_NAME = "fastctx-api"
 
 logger = speedbeaver.get_logger(LOGGER_NAME)
 
-app = FastAPI(title="FastCTX API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    job_manager = get_job_manager()
+    await job_manager.start()
+    try:
+        # Provider clients are set up once, rather than on the first load
+        get_llm_transformer()
+    except ValueError as exc:
+        await logger.awarning("LLM not set up.", error=str(exc))
+    yield
+    await job_manager.stop()
+    get_code_extractor().close()
+    await get_provider_registry().aclose()
+    await get_http_client().aclose()
+    await get_neo4j_driver().close()
+
+
+app = FastAPI(title="FastCTX API", lifespan=lifespan)
 speedbeaver.quick_configure(app, logger_name=LOGGER_NAME)
 
 
@@ -26,6 +92,10 @@ class CypherQuery(BaseModel):
 
     query: str
     parameters: dict[str, Any] | None = None
+    limit: int = Field(default=CYPHER_PAGE_SIZE, ge=1, le=CYPHER_MAX_ROWS)
+    cursor: str | None = None
+    stream: bool = False
+    read_only: bool = True
 
 
 class NaturalLanguageQuery(BaseModel):
@@ -33,100 +103,277 @@ class NaturalLanguageQuery(BaseModel):
 
     question: str
     context: str | None = None
+    limit: int = Field(default=CYPHER_PAGE_SIZE, ge=1, le=CYPHER_MAX_ROWS)
+
+
+class SemanticQuery(BaseModel):
+    """Request model for semantic queries"""
+
+    query: str
+    k: int = Field(default=SEMANTIC_DEFAULT_K, ge=1, le=SEMANTIC_MAX_K)
+    kind: SearchKind | None = None
+    project: str | None = None
+
+
+class HybridQuery(BaseModel):
+    """Request model for hybrid retrieval"""
+
+    query: str
+    k: int = Field(default=SEMANTIC_DEFAULT_K, ge=1, le=SEMANTIC_MAX_K)
+    hops: int = Field(default=1, ge=0, le=RETRIEVAL_MAX_HOPS)
+    token_budget: int = Field(
+        default=RETRIEVAL_TOKEN_BUDGET, ge=1, le=RETRIEVAL_MAX_TOKEN_BUDGET
+    )
+    project: str | None = None
 
 
 class ProjectSource(BaseModel):
     """Request model for the source of a loaded project"""
 
-    github_url: str | None
+    github_url: str | None = None
+    git_url: str | None = None
+    local_path: str | None = None
+    ref: str | None = None
+    sparse_paths: list[str] | None = None
+    incremental: bool = False
 
-    @model_validator(mode="before")
+    @model_validator(mode="after")
     def check_project_source(self):
-        requires_one_of = self.model_dump()
-        if not any(requires_one_of.values()):
+        requires_one_of = self.model_dump(
+            include={"github_url", "git_url", "local_path"}
+        )
+        given = [key for key, value in requires_one_of.items() if value]
+        if not given:
             raise ValueError(
                 f"Missing one of: {', '.join(requires_one_of.keys())}"
             )
+        if len(given) > 1:
+            raise ValueError(f"Only one of: {', '.join(given)}")
+        if self.sparse_paths and not self.git_url:
+            raise ValueError("sparse_paths requires git_url")
+        if self.ref and self.local_path:
+            raise ValueError("ref can't be used with local_path")
         return self
 
+    def to_source(self) -> Source:
+        if self.github_url:
+            return GithubArchiveSource(self.github_url, self.ref)
+        if self.git_url:
+            return GitSource(self.git_url, self.ref, self.sparse_paths)
+        return LocalDirectorySource(self.local_path or "")
 
-@app.post("/loader", status_code=201)
+
+@app.post("/loader", status_code=202)
 async def load_codebase(
     src: ProjectSource,
-    graph: Annotated[Neo4jGraph, Depends(get_neo4j_graph)],
+    graph: Annotated[AsyncNeo4jGraph, Depends(get_neo4j_graph)],
     llm_transformer: Annotated[
-        LLMGraphTransformer, Depends(setup_llm_transformer)
+        LLMGraphTransformer, Depends(get_llm_transformer)
+    ],
+    extraction_cache: Annotated[ExtractionCache, Depends(get_extraction_cache)],
+    writer: Annotated[GraphWriter, Depends(get_graph_writer)],
+    code_extractor: Annotated[CodeExtractor, Depends(get_code_extractor)],
+    embedding_indexer: Annotated[
+        EmbeddingIndexer, Depends(get_embedding_indexer)
     ],
+    job_manager: Annotated[JobManager, Depends(get_job_manager)],
+):
+    """Queue a project to be loaded in the background"""
+    source = src.to_source()
+    try:
+        source.check()
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    job = job_manager.submit(
+        partial(
+            load_project,
+            source,
+            llm_transformer,
+            graph,
+            extraction_cache,
+            writer,
+            code_extractor,
+            incremental=src.incremental,
+            embedding_indexer=embedding_indexer,
+        ),
+        description=f"Load {source.project}"
+        + (f" at {src.ref}" if src.ref else ""),
+    )
+
+    return {"message": "Project load queued.", **job.to_dict()}
+
+
+@app.get("/loader/{job_id}")
+async def get_load_job(
+    job_id: str,
+    job_manager: Annotated[JobManager, Depends(get_job_manager)],
 ):
-    if src.github_url:
-        await load_github_project(src.github_url, llm_transformer, graph)
+    """Get the status and progress of a project load"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}.")
+    return job.to_dict()
+
 
-    return {"message": "Project loaded successfully."}
+@app.delete("/loader/{job_id}")
+async def cancel_load_job(
+    job_id: str,
+    job_manager: Annotated[JobManager, Depends(get_job_manager)],
+):
+    """Cancel a queued or running project load"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}.")
+    return job.to_dict()
 
 
 @app.post("/query/cypher")
 async def query_cypher(
     query_request: CypherQuery,
-    graph: Annotated[Neo4jGraph, Depends(get_neo4j_graph)],
+    graph: Annotated[AsyncNeo4jGraph, Depends(get_neo4j_graph)],
 ):
-    """Execute a Cypher query against the Neo4j database"""
-
-    # Execute the query
-    result = graph.query(
-        query_request.query, params=query_request.parameters or {}
+    """
+    Execute a Cypher query against the Neo4j database.
+
+    Results are paginated: pass `next_cursor` back as `cursor` to get the
+    next page. Pages only line up across calls when the query has an ORDER
+    BY. With `stream`, records are sent as NDJSON as they are fetched,
+    followed by a summary line.
+
+    Queries run read-only with a timeout, and are rejected up front if
+    their plan has a cartesian product or too high a row estimate.
+    """
+    parameters = query_request.parameters or {}
+    offset = (
+        decode_cursor(query_request.cursor, query_request.query, parameters)
+        if query_request.cursor
+        else 0
+    )
+    await guard_query(
+        graph, query_request.query, parameters, query_request.read_only
+    )
+    state = PageState(offset=offset)
+    records = iter_page(
+        graph,
+        query_request.query,
+        parameters,
+        offset,
+        query_request.limit,
+        state,
+        read_only=query_request.read_only,
     )
 
-    return {
+    if query_request.stream:
+        return StreamingResponse(
+            iter_ndjson(records, query_request.query, parameters, state),
+            media_type="application/x-ndjson",
+        )
+
+    # Records are already serialized, so they go into the body as is
+    lines = [line async for line in records]
+    envelope = {
         "query": query_request.query,
         "parameters": query_request.parameters,
-        "results": result,
-        "count": len(result) if isinstance(result, list) else None,
+        "count": state.rows,
+        "next_cursor": next_cursor(query_request.query, parameters, state),
+        "truncated": state.truncated,
     }
+    return Response(
+        content=frame_json(envelope, lines), media_type="application/json"
+    )
 
 
 @app.post("/query/natural")
 async def query_natural_language(
     query_request: NaturalLanguageQuery,
-    graph: Annotated[Neo4jGraph, Depends(get_neo4j_graph)],
+    graph: Annotated[AsyncNeo4jGraph, Depends(get_neo4j_graph)],
+    schema_cache: Annotated[SchemaCache, Depends(get_schema_cache)],
+    plan_store: Annotated[PlanStore, Depends(get_plan_store)],
+    llm: Annotated[BaseChatModel, Depends(get_llm)],
 ):
-    """Process a natural language query and convert it to Cypher"""
-
-    # Use the graph's natural language query capability
-    # This requires the graph to have been set up with an LLM
-    prompt = f"""Based on the following question about the graph database:
-        
-        Question: {query_request.question}
-        
-        Context: {query_request.context or "No additional context provided"}
-        
-        Please provide a relevant Cypher query and execute it to answer the question.
-        """
+    """Answer a natural language question with a generated Cypher query"""
+    # Repeated questions, up to their literal values, reuse a stored query
+    return await answer_question(
+        query_request.question,
+        query_request.context,
+        graph,
+        schema_cache,
+        plan_store,
+        llm,
+        limit=query_request.limit,
+    )
+
 
+@app.post("/query/semantic")
+async def query_semantic(
+    query_request: SemanticQuery,
+    graph: Annotated[AsyncNeo4jGraph, Depends(get_neo4j_graph)],
+    embedding_indexer: Annotated[
+        EmbeddingIndexer, Depends(get_embedding_indexer)
+    ],
+):
+    """
+    Find the code chunks and symbols closest in meaning to a query.
+
+    Results are the `k` best matches by cosine similarity, each with its
+    file, line range and source text. `kind` limits them to `chunk` or
+    `symbol` results, and `project` to one loaded project.
+    """
+    results = await semantic_search(
+        query_request.query,
+        graph,
+        embedding_indexer,
+        k=query_request.k,
+        kind=query_request.kind,
+        project=query_request.project,
+    )
     return {
-        "question": query_request.question,
-        "context": query_request.context,
-        "prompt": prompt,
+        "query": query_request.query,
+        "count": len(results),
+        "results": results,
     }
 
 
+@app.post("/query/hybrid")
+async def query_hybrid(
+    query_request: HybridQuery,
+    graph: Annotated[AsyncNeo4jGraph, Depends(get_neo4j_graph)],
+    embedding_indexer: Annotated[
+        EmbeddingIndexer, Depends(get_embedding_indexer)
+    ],
+):
+    """
+    Get the context for a question about the code in one call.
+
+    Chunks and symbols are found by full-text and vector search at once,
+    with their rankings fused. Then the graph is followed for `hops` along
+    IMPORTS and CALLS, to what they depend on and what depends on them.
+    The results come first in `items`, then their neighbors, nearest
+    first. Each item has its file, line range and source text. Items are
+    included until `token_budget` tokens are used, and `omitted` counts
+    those that didn't fit.
+    """
+    return await retrieve_context(
+        query_request.query,
+        graph,
+        embedding_indexer,
+        k=query_request.k,
+        hops=query_request.hops,
+        token_budget=query_request.token_budget,
+        project=query_request.project,
+    )
+
+
 @app.get("/query/examples")
 async def get_query_examples(
-    graph: Annotated[Neo4jGraph, Depends(get_neo4j_graph)],
+    graph: Annotated[AsyncNeo4jGraph, Depends(get_neo4j_graph)],
+    schema_cache: Annotated[SchemaCache, Depends(get_schema_cache)],
 ):
     """Get example queries for the current database schema"""
     # Get some basic information about the database
-    node_count = graph.query("MATCH (n) RETURN COUNT(n) as count")[0]["count"]
-    relationship_count = graph.query(
-        "MATCH ()-[r]->() RETURN COUNT(r) as count"
-    )[0]["count"]
-
-    # Get node labels
-    labels_result = graph.query("CALL db.labels()")
-    labels = [record["label"] for record in labels_result]
-
-    # Get relationship types
-    rel_types_result = graph.query("CALL db.relationshipTypes()")
-    rel_types = [record["relationshipType"] for record in rel_types_result]
+    stats = await schema_cache.get_stats(graph)
+    labels = stats["labels"]
 
     # Generate example queries
     examples = [
@@ -154,31 +401,19 @@ async def get_query_examples(
         )
 
     return {
-        "database_stats": {
-            "node_count": node_count,
-            "relationship_count": relationship_count,
-            "labels": labels,
-            "relationship_types": rel_types,
-        },
+        "database_stats": stats,
         "example_queries": examples,
     }
 
 
 @app.get("/schema")
 async def get_schema(
-    graph: Annotated[Neo4jGraph, Depends(get_neo4j_graph)],
+    graph: Annotated[AsyncNeo4jGraph, Depends(get_neo4j_graph)],
+    schema_cache: Annotated[SchemaCache, Depends(get_schema_cache)],
 ):
     """Get the current Neo4j database schema"""
-    # Refresh the schema to get the latest information
-    graph.refresh_schema()
-
-    # Get the schema information
-    schema_info = {
-        "structured_schema": graph.structured_schema,
-        "schema": graph.schema,
-    }
-
-    return schema_info
+    # Refreshed once the graph has been written to, or the cache expires
+    return await schema_cache.get_schema(graph)
 
 
 mcp = FastApiMCP(
@@ -0,0 +1,320 @@
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import cache
+from typing import Any
+
+from fastapi.exceptions import HTTPException
+from langchain_core.language_models import BaseChatModel
+
+from api.common import LLM_PROVIDER, MODEL, AsyncNeo4jGraph, logger
+from api.query import CYPHER_PAGE_SIZE, PageState, guard_query, iter_page
+from api.scheduler import get_in_flight_limiter, get_rate_limiter
+from api.schema_cache import SchemaCache
+
+NL_PLAN_CACHE_SIZE = int(os.environ.get("NL_PLAN_CACHE_SIZE", "1024"))
+# Bump whenever the generation prompt changes, so stale plans aren't reused
+NL_PROMPT_VERSION = os.environ.get("NL_PROMPT_VERSION", "1")
+
+# Literal values in a question, which become query parameters
+LITERAL = re.compile(
+    r"`([^`]+)`"
+    r"|\"([^\"]+)\""
+    r"|(?<!\w)'([^']+)'(?!\w)"
+    r"|((?:[\w.-]+/)*[\w-]+\.[A-Za-z]\w*)"
+    r"|\b(\d+)\b"
+)
+PARAMETER = re.compile(r"\$(p\d+)\b")
+CYPHER_BLOCK = re.compile(
+    r"```(?:cypher)?\s*(.*?)```", re.DOTALL | re.IGNORECASE
+)
+
+PROMPT = """You write Cypher queries for a Neo4j graph of a codebase.
+
+Schema:
+{schema}
+
+Only use the node labels, relationship types and properties in the schema.
+The query must only read from the graph. Return the Cypher query alone, with
+no explanation.
+{parameters}
+Question: {question}
+{context}"""
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split()).rstrip("?.! ")
+
+
+def parameterize(question: str) -> tuple[str, dict[str, Any]]:
+    """
+    Replaces the literal values in a question, quoted strings, file paths
+    and numbers, with parameters.
+
+    Returns the question as a template, e.g. "what calls $p0", and the
+    parameter values, so questions that only differ by their values share
+    a query plan.
+    """
+    parameters: dict[str, Any] = {}
+
+    def replace(match: re.Match) -> str:
+        name = f"p{len(parameters)}"
+        value = next(group for group in match.groups() if group is not None)
+        parameters[name] = int(value) if match.group(5) else value
+        return f"${name}"
+
+    return normalize(LITERAL.sub(replace, question)), parameters
+
+
+def extract_cypher(text: str) -> str:
+    block = CYPHER_BLOCK.search(text)
+    return (block.group(1) if block else text).strip().rstrip(";")
+
+
+@dataclass
+class QueryPlan:
+    cypher: str
+    # Whether the query uses every parameter, so it holds for any values
+    reusable: bool
+
+
+class PlanStore:
+    """
+    An LRU cache of generated Cypher, keyed by question template, context,
+    model and schema.
+
+    Only plans that ran successfully and use all their parameters are
+    stored, so a plan can be reused for any values of its parameters.
+    """
+
+    def __init__(self, max_entries: int = NL_PLAN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._plans: OrderedDict[tuple[str, ...], str] = OrderedDict()
+
+    @staticmethod
+    def key(
+        template: str, context: str | None, schema_version: str
+    ) -> tuple[str, ...]:
+        return (
+            template,
+            normalize(context or ""),
+            schema_version,
+            MODEL,
+            NL_PROMPT_VERSION,
+        )
+
+    def get(self, key: tuple[str, ...]) -> str | None:
+        cypher = self._plans.get(key)
+        if cypher is not None:
+            self._plans.move_to_end(key)
+        return cypher
+
+    def put(self, key: tuple[str, ...], cypher: str):
+        self._plans[key] = cypher
+        self._plans.move_to_end(key)
+        while len(self._plans) > self.max_entries:
+            self._plans.popitem(last=False)
+
+    def discard(self, key: tuple[str, ...]):
+        self._plans.pop(key, None)
+
+
+@cache
+def get_plan_store() -> PlanStore:
+    """
+    Gets the query plan store shared by the app.
+    """
+    return PlanStore()
+
+
+def schema_version(schema: dict[str, Any]) -> str:
+    """
+    Fingerprints a schema, so plans survive loads that don't change it.
+    """
+    return hashlib.sha256(schema["schema"].encode("utf-8")).hexdigest()[:16]
+
+
+async def generate_cypher(
+    llm: BaseChatModel,
+    schema: str,
+    template: str,
+    parameters: dict[str, Any],
+    context: str | None = None,
+    error: str | None = None,
+) -> QueryPlan:
+    """
+    Asks the LLM for a Cypher query answering a question template.
+    """
+    parameter_lines = ""
+    if parameters:
+        parameter_lines = (
+            "\nThe question's values are given as parameters. Refer to them "
+            "as $name in the query, never as literals:\n"
+            + "\n".join(
+                f"${name} = {json.dumps(value)}"
+                for name, value in parameters.items()
+            )
+            + "\n"
+        )
+    prompt = PROMPT.format(
+        schema=schema,
+        parameters=parameter_lines,
+        question=template,
+        context=f"Context: {context}\n" if context else "",
+    )
+    if error:
+        prompt += f"\nA previous attempt failed with: {error}\nFix it.\n"
+
+    # Shares the provider's quota with extraction
+    await get_rate_limiter(LLM_PROVIDER).acquire()
+    try:
+        async with get_in_flight_limiter(LLM_PROVIDER):
+            response = await llm.ainvoke(prompt)
+    except Exception as exc:
+        await logger.aerror("Cypher generation failed.", error=str(exc))
+        raise HTTPException(
+            status_code=502, detail="Cypher generation failed."
+        ) from exc
+
+    content = response.content
+    if not isinstance(content, str):
+        content = "".join(
+            part if isinstance(part, str) else part.get("text", "")
+            for part in content
+        )
+    cypher = extract_cypher(content)
+    used = set(PARAMETER.findall(cypher))
+    return QueryPlan(cypher, reusable=used >= parameters.keys())
+
+
+async def run_plan(
+    graph: AsyncNeo4jGraph,
+    cypher: str,
+    parameters: dict[str, Any],
+    limit: int,
+) -> tuple[list[Any], PageState]:
+    """
+    Runs a generated query read-only, after the same checks as
+    /query/cypher.
+    """
+    await guard_query(graph, cypher, parameters)
+    state = PageState(offset=0)
+    records = [
+        json.loads(line)
+        async for line in iter_page(graph, cypher, parameters, 0, limit, state)
+    ]
+    return records, state
+
+
+async def _run_stored_plan(
+    graph: AsyncNeo4jGraph,
+    plan_store: PlanStore,
+    key: tuple[str, ...],
+    parameters: dict[str, Any],
+    limit: int,
+) -> tuple[str, list[Any], PageState] | None:
+    """
+    Runs the stored query for a question, if there is one and it still
+    passes its checks.
+    """
+    cypher = plan_store.get(key)
+    if cypher is None:
+        return None
+    try:
+        records, state = await run_plan(graph, cypher, parameters, limit)
+    except HTTPException as exc:
+        if exc.status_code != 400:
+            raise
+        # The graph changed under the plan, so a new one is needed
+        plan_store.discard(key)
+        return None
+    return cypher, records, state
+
+
+async def _generate_plan(
+    graph: AsyncNeo4jGraph,
+    plan_store: PlanStore,
+    key: tuple[str, ...],
+    llm: BaseChatModel,
+    schema: str,
+    template: str,
+    parameters: dict[str, Any],
+    context: str | None,
+    limit: int,
+) -> tuple[str, list[Any], PageState]:
+    """
+    Generates a query for a question and runs it, storing it if it can be
+    reused. A query that fails its checks is sent back to the LLM once,
+    with the error.
+    """
+    plan = await generate_cypher(llm, schema, template, parameters, context)
+    try:
+        records, state = await run_plan(graph, plan.cypher, parameters, limit)
+    except HTTPException as exc:
+        if exc.status_code != 400:
+            raise
+        plan = await generate_cypher(
+            llm, schema, template, parameters, context, str(exc.detail)
+        )
+        records, state = await run_plan(graph, plan.cypher, parameters, limit)
+    if plan.reusable:
+        plan_store.put(key, plan.cypher)
+    return plan.cypher, records, state
+
+
+async def answer_question(
+    question: str,
+    context: str | None,
+    graph: AsyncNeo4jGraph,
+    schema_cache: SchemaCache,
+    plan_store: PlanStore,
+    llm: BaseChatModel,
+    limit: int = CYPHER_PAGE_SIZE,
+) -> dict[str, Any]:
+    """
+    Answers a question about the graph with a generated Cypher query.
+
+    Questions that were answered before, up to their literal values, reuse
+    the stored query without asking the LLM. A generated query that fails
+    its checks is sent back to the LLM once, with the error.
+    """
+    template, parameters = parameterize(question)
+    schema = await schema_cache.get_schema(graph)
+    key = plan_store.key(template, context, schema_version(schema))
+
+    stored = await _run_stored_plan(graph, plan_store, key, parameters, limit)
+    cached = stored is not None
+    if stored is not None:
+        cypher, records, state = stored
+    else:
+        cypher, records, state = await _generate_plan(
+            graph,
+            plan_store,
+            key,
+            llm,
+            schema["schema"],
+            template,
+            parameters,
+            context,
+            limit,
+        )
+
+    await logger.ainfo(
+        "Answered question.",
+        template=template,
+        cached=cached,
+        rows=state.rows,
+    )
+    return {
+        "question": question,
+        "context": context,
+        "cypher": cypher,
+        "parameters": parameters,
+        "cached": cached,
+        "count": state.rows,
+        "truncated": state.truncated,
+        "results": records,
+    }
@@ -0,0 +1,274 @@
+import asyncio
+import os
+import time
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+
+from langchain_community.graphs.graph_document import GraphDocument
+from langchain_core.documents import Document
+from langchain_experimental.graph_transformers.llm import LLMGraphTransformer
+
+from api.cache import ExtractionCache
+from api.chunking import merge_chunks, split_document
+from api.common import AsyncNeo4jGraph, logger
+from api.embeddings import EmbeddingIndexer
+from api.extractors import (
+    LLM_ENRICHMENT,
+    CodeExtractor,
+    ModuleIndex,
+    merge_graph_documents,
+)
+from api.graph_writer import GraphWriter
+from api.incremental import FileStatus, ProjectSync, remove_documents
+from api.scheduler import MAX_IN_FLIGHT, ExtractionScheduler
+from api.schema_cache import get_schema_cache
+
+READ_QUEUE_SIZE = int(os.environ.get("PIPELINE_READ_QUEUE_SIZE", "64"))
+WRITE_QUEUE_SIZE = int(os.environ.get("PIPELINE_WRITE_QUEUE_SIZE", "64"))
+WRITE_BATCH_SIZE = int(os.environ.get("PIPELINE_WRITE_BATCH_SIZE", "32"))
+# Failures kept with their errors, past which they're only counted
+MAX_RECORDED_FAILURES = int(
+    os.environ.get("PIPELINE_MAX_RECORDED_FAILURES", "100")
+)
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+@dataclass
+class DocumentFailure:
+    filename: str
+    error: str
+
+
+@dataclass
+class PipelineStats:
+    total: int | None = None
+    read: int = 0
+    skipped: int = 0
+    parsed: int = 0
+    extracted: int = 0
+    written: int = 0
+    failed: int = 0
+    embedded: int = 0
+    failures: list[DocumentFailure] = field(default_factory=list)
+    started_at: float | None = None
+
+    def record_failure(self, filename: str, error: str):
+        self.failed += 1
+        if len(self.failures) < MAX_RECORDED_FAILURES:
+            self.failures.append(DocumentFailure(filename, error))
+
+    @property
+    def throughput(self) -> float:
+        """
+        Documents extracted per second since the pipeline started.
+        """
+        if self.started_at is None:
+            return 0.0
+        elapsed = time.monotonic() - self.started_at
+        return self.extracted / elapsed if elapsed else 0.0
+
+
+class IngestionPipeline:
+    """
+    Streams documents through extraction into Neo4j.
+
+    Documents are read, extracted and written in batches by concurrent
+    stages connected by bounded queues. Memory stays flat regardless of the
+    project's size, and the graph fills in as batches are written.
+
+    Files the `code_extractor` can parse get their structure from the parse
+    tree, and only go to the LLM when enrichment is enabled. Their imports
+    are resolved against the project's `modules`. Files over the
+    token budget are sent to the LLM in chunks. Written documents are
+    embedded for semantic search when there is an `embedding_indexer`.
+
+    A document that fails extraction is recorded in the stats, with its
+    error, and the rest carry on.
+    """
+
+    def __init__(
+        self,
+        llm_transformer: LLMGraphTransformer,
+        graph: AsyncNeo4jGraph,
+        extraction_cache: ExtractionCache,
+        writer: GraphWriter,
+        project: str | None = None,
+        sync: ProjectSync | None = None,
+        code_extractor: CodeExtractor | None = None,
+        modules: ModuleIndex | None = None,
+        embedding_indexer: EmbeddingIndexer | None = None,
+        extract_workers: int = MAX_IN_FLIGHT,
+        write_batch_size: int = WRITE_BATCH_SIZE,
+        stats: PipelineStats | None = None,
+    ):
+        self.graph = graph
+        self.extraction_cache = extraction_cache
+        self.writer = writer
+        self.project = project
+        self.sync = sync
+        self.code_extractor = code_extractor
+        self.modules = modules
+        self.embedding_indexer = embedding_indexer
+        self.extract_workers = extract_workers
+        self.write_batch_size = write_batch_size
+        self.scheduler = ExtractionScheduler(llm_transformer)
+        self.stats = stats if stats is not None else PipelineStats()
+
+    async def run(self, documents: AsyncIterator[Document]) -> PipelineStats:
+        """
+        Runs every stage of the pipeline until `documents` is exhausted.
+        """
+        self.stats.started_at = time.monotonic()
+        read_queue: asyncio.Queue = asyncio.Queue(READ_QUEUE_SIZE)
+        write_queue: asyncio.Queue = asyncio.Queue(WRITE_QUEUE_SIZE)
+        async with asyncio.TaskGroup() as stage_tg:
+            stage_tg.create_task(self._read(documents, read_queue))
+            for _ in range(self.extract_workers):
+                stage_tg.create_task(self._extract(read_queue, write_queue))
+            stage_tg.create_task(self._write(write_queue))
+
+        await logger.ainfo(
+            "Pipeline finished.",
+            total=self.stats.total,
+            read=self.stats.read,
+            skipped=self.stats.skipped,
+            parsed=self.stats.parsed,
+            extracted=self.stats.extracted,
+            written=self.stats.written,
+            failed=self.stats.failed,
+            embedded=self.stats.embedded,
+            retries=self.scheduler.stats.retries,
+            documents_per_second=round(self.stats.throughput, 2),
+        )
+        return self.stats
+
+    async def _read(
+        self, documents: AsyncIterator[Document], read_queue: asyncio.Queue
+    ):
+        async for document in documents:
+            self.stats.read += 1
+            if (
+                self.sync is not None
+                and self.sync.classify(document) is FileStatus.UNCHANGED
+            ):
+                self.stats.skipped += 1
+                continue
+            await read_queue.put(document)
+        for _ in range(self.extract_workers):
+            await read_queue.put(_DONE)
+
+    async def _extract(
+        self, read_queue: asyncio.Queue, write_queue: asyncio.Queue
+    ):
+        while (document := await read_queue.get()) is not _DONE:
+            filename = document.metadata.get("filename", "")
+            try:
+                graph_document = await self._extract_document(document)
+            except Exception as exc:
+                await logger.aerror(
+                    "Extraction failed.", filename=filename, error=str(exc)
+                )
+                self.stats.record_failure(filename, str(exc))
+                continue
+            self.stats.extracted += 1
+            await write_queue.put(graph_document)
+        await write_queue.put(_DONE)
+
+    async def _extract_document(self, document: Document) -> GraphDocument:
+        structure = await self._parse_document(document)
+        if structure is None:
+            return await self._extract_with_llm(document)
+        if not LLM_ENRICHMENT:
+            return structure
+
+        try:
+            enrichment = await self._extract_with_llm(document)
+        except Exception as exc:
+            # The structure is still worth writing
+            await logger.awarning(
+                "Enrichment failed.",
+                filename=document.metadata.get("filename"),
+                error=str(exc),
+            )
+            return structure
+        return merge_graph_documents(structure, enrichment)
+
+    async def _parse_document(self, document: Document) -> GraphDocument | None:
+        if self.code_extractor is None:
+            return None
+        try:
+            graph_document = await self.code_extractor.extract(
+                document, self.modules
+            )
+        except Exception as exc:
+            await logger.awarning(
+                "Parsing failed, falling back to the LLM.",
+                filename=document.metadata.get("filename"),
+                error=str(exc),
+            )
+            return None
+        if graph_document is not None:
+            self.stats.parsed += 1
+        return graph_document
+
+    async def _extract_with_llm(self, document: Document) -> GraphDocument:
+        chunks = split_document(document)
+        if len(chunks) == 1:
+            return await self._extract_chunk(chunks[0])
+        # The scheduler bounds how many chunks are sent at once. Every chunk
+        # is waited for, so none is left running when one fails.
+        results = await asyncio.gather(
+            *(self._extract_chunk(chunk) for chunk in chunks),
+            return_exceptions=True,
+        )
+        graph_documents = []
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+            graph_documents.append(result)
+        return merge_chunks(document, graph_documents)
+
+    async def _extract_chunk(self, chunk: Document) -> GraphDocument:
+        # Reuse previous extractions of identical contents, only send misses
+        # to the LLM
+        cache_key = ExtractionCache.key(chunk.page_content)
+        graph_document = await self.extraction_cache.aget(cache_key, chunk)
+        if graph_document is None:
+            graph_document = await self.scheduler.extract(chunk)
+            await self.extraction_cache.aput(cache_key, graph_document)
+        return graph_document
+
+    async def _write(self, write_queue: asyncio.Queue):
+        batch: list[GraphDocument] = []
+        remaining_workers = self.extract_workers
+        while remaining_workers:
+            graph_document = await write_queue.get()
+            if graph_document is _DONE:
+                remaining_workers -= 1
+                continue
+            batch.append(graph_document)
+            if len(batch) >= self.write_batch_size:
+                await self._write_batch(batch)
+                batch = []
+        if batch:
+            await self._write_batch(batch)
+
+    async def _write_batch(self, batch: list[GraphDocument]):
+        if self.project is not None and self.sync is not None:
+            # Clear out what modified files contributed before re-adding them
+            modified = [
+                graph_document.source.metadata["filename"]
+                for graph_document in batch
+                if graph_document.source.metadata["filename"]
+                in self.sync.indexed_hashes
+            ]
+            await remove_documents(self.graph, self.project, modified)
+
+        await self.writer.write(batch)
+        if self.embedding_indexer is not None:
+            self.stats.embedded += await self.embedding_indexer.index(batch)
+        get_schema_cache().invalidate()
+        self.stats.written += len(batch)
+        await logger.adebug("Batch written.", batch_size=len(batch))
@@ -0,0 +1,296 @@
+import base64
+import hashlib
+import json
+import os
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass
+from typing import Any, NoReturn
+
+from fastapi.exceptions import HTTPException
+from neo4j import READ_ACCESS, WRITE_ACCESS, AsyncSession, Query
+from neo4j.exceptions import ClientError, Neo4jError
+
+from api.common import AsyncNeo4jGraph, logger
+from api.schema_cache import get_schema_cache
+
+CYPHER_PAGE_SIZE = int(os.environ.get("CYPHER_PAGE_SIZE", "1000"))
+CYPHER_MAX_ROWS = int(os.environ.get("CYPHER_MAX_ROWS", "10000"))
+CYPHER_MAX_BYTES = int(
+    os.environ.get("CYPHER_MAX_BYTES", str(10 * 1024 * 1024))
+)
+CYPHER_TIMEOUT = float(os.environ.get("CYPHER_TIMEOUT", "30"))
+CYPHER_MAX_ESTIMATED_ROWS = float(
+    os.environ.get("CYPHER_MAX_ESTIMATED_ROWS", "1000000")
+)
+# Queries run read-only unless writes are explicitly allowed server-side
+CYPHER_ALLOW_WRITES = os.environ.get("CYPHER_ALLOW_WRITES", "false") == "true"
+
+REJECTED_OPERATORS = ("CartesianProduct",)
+
+
+def _query_fingerprint(query: str, parameters: dict[str, Any]) -> str:
+    payload = json.dumps([query, parameters], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(query: str, parameters: dict[str, Any], offset: int) -> str:
+    """
+    Builds a continuation token for resuming a query at `offset`.
+    """
+    token = {"q": _query_fingerprint(query, parameters), "o": offset}
+    return base64.urlsafe_b64encode(json.dumps(token).encode()).decode()
+
+
+def decode_cursor(cursor: str, query: str, parameters: dict[str, Any]) -> int:
+    """
+    Gets the offset from a continuation token, checking that it was issued
+    for the same query and parameters.
+    """
+    try:
+        token = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        offset = int(token["o"])
+        fingerprint = token["q"]
+    except (ValueError, KeyError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid cursor.") from exc
+    if fingerprint != _query_fingerprint(query, parameters) or offset < 0:
+        raise HTTPException(
+            status_code=400, detail="Cursor was issued for a different query."
+        )
+    return offset
+
+
+def serialize_record(record: dict[str, Any]) -> str:
+    # Temporal and spatial values aren't JSON serializable
+    return json.dumps(record, default=str)
+
+
+def _iter_plan(plan: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    yield plan
+    for child in plan.get("children", []):
+        yield from _iter_plan(child)
+
+
+def check_plan(
+    plan: dict[str, Any], max_estimated_rows: float = CYPHER_MAX_ESTIMATED_ROWS
+):
+    """
+    Rejects a query plan with a cartesian product, or with an operator
+    estimated to produce too many rows.
+    """
+    for operator in _iter_plan(plan):
+        # Operator types carry a runtime suffix, e.g. "Filter@neo4j"
+        operator_type = operator.get("operatorType", "").split("@")[0]
+        if operator_type in REJECTED_OPERATORS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Query rejected: plan contains {operator_type}.",
+            )
+        arguments = operator.get("args", operator.get("arguments", {}))
+        estimated_rows = arguments.get("EstimatedRows", 0)
+        if estimated_rows > max_estimated_rows:
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"Query rejected: {operator_type} is estimated to "
+                    f"produce {estimated_rows:.0f} rows, over the limit "
+                    f"of {max_estimated_rows:.0f}."
+                ),
+            )
+
+
+def _raise_for_neo4j_error(exc: Neo4jError) -> NoReturn:
+    if exc.code and "TransactionTimedOut" in exc.code:
+        raise HTTPException(
+            status_code=504,
+            detail=f"Query timed out after {CYPHER_TIMEOUT}s.",
+        ) from exc
+    if isinstance(exc, ClientError):
+        raise HTTPException(status_code=400, detail=exc.message) from exc
+    raise exc
+
+
+async def _explain(
+    session: AsyncSession, query: str, parameters: dict[str, Any]
+) -> dict[str, Any] | None:
+    result = await session.run(
+        Query(f"EXPLAIN {query}", timeout=CYPHER_TIMEOUT), parameters
+    )
+    summary = await result.consume()
+    return summary.plan
+
+
+def _session(graph: AsyncNeo4jGraph, read_only: bool) -> AsyncSession:
+    return graph.driver.session(
+        database=graph.database,
+        default_access_mode=READ_ACCESS if read_only else WRITE_ACCESS,
+    )
+
+
+async def guard_query(
+    graph: AsyncNeo4jGraph,
+    query: str,
+    parameters: dict[str, Any],
+    read_only: bool = True,
+):
+    """
+    Checks a query before running it: writes must be allowed, and its
+    EXPLAIN plan must pass `check_plan`. Syntax errors surface here too.
+    """
+    if not read_only and not CYPHER_ALLOW_WRITES:
+        raise HTTPException(
+            status_code=403, detail="Write queries are disabled."
+        )
+    try:
+        async with _session(graph, read_only) as session:
+            plan = await _explain(session, query, parameters)
+    except Neo4jError as exc:
+        _raise_for_neo4j_error(exc)
+    if plan is not None:
+        check_plan(plan)
+
+
+@dataclass
+class PageState:
+    """
+    Where a capped read of a query's results stopped.
+    """
+
+    offset: int
+    rows: int = 0
+    bytes: int = 0
+    truncated: str | None = None
+    exhausted: bool = False
+
+
+def page_query(
+    query: str, parameters: dict[str, Any], offset: int, limit: int
+) -> tuple[str, dict[str, Any]]:
+    """
+    Wraps a query in a subquery that skips `offset` rows server-side, and
+    stops one row past `limit` so the page can tell whether there's more.
+    """
+    query = query.strip().rstrip(";")
+    return (
+        f"CALL {{\n{query}\n}}\nRETURN * SKIP $_page_offset LIMIT $_page_limit",
+        {**parameters, "_page_offset": offset, "_page_limit": limit + 1},
+    )
+
+
+async def iter_page(
+    graph: AsyncNeo4jGraph,
+    query: str,
+    parameters: dict[str, Any],
+    offset: int,
+    limit: int,
+    state: PageState,
+    max_bytes: int = CYPHER_MAX_BYTES,
+    read_only: bool = True,
+) -> AsyncIterator[str]:
+    """
+    Streams the serialized records of a page of a query's results.
+
+    Records are pulled from the driver as they are consumed, so only one is
+    held at a time. Later pages of read-only queries are run through
+    `page_query`, so earlier rows are skipped by the server instead of being
+    sent over and dropped. Write queries would write again if wrapped, so
+    they are still skipped client-side. Pages are only stable across calls
+    when the query has an ORDER BY.
+
+    The whole query is bound by a transaction timeout, and read-only queries
+    run in read access mode so the server refuses any write.
+    """
+    skip = offset
+    if read_only and offset:
+        query, parameters = page_query(query, parameters, offset, limit)
+        skip = 0
+    async with _session(graph, read_only) as session:
+        try:
+            result = await session.run(
+                Query(query, timeout=CYPHER_TIMEOUT), parameters
+            )
+        except Neo4jError as exc:
+            _raise_for_neo4j_error(exc)
+        try:
+            position = 0
+            async for record in result:
+                if position < skip:
+                    position += 1
+                    continue
+                if state.rows >= limit:
+                    state.truncated = "limit"
+                    break
+                line = serialize_record(record.data())
+                if state.rows and state.bytes + len(line) > max_bytes:
+                    state.truncated = "max_bytes"
+                    break
+                state.rows += 1
+                state.bytes += len(line)
+                position += 1
+                yield line
+            else:
+                state.exhausted = True
+        except Neo4jError as exc:
+            _raise_for_neo4j_error(exc)
+        finally:
+            state.offset = offset + state.rows
+            # Discards whatever wasn't read, and tells us if the query wrote
+            try:
+                summary = await result.consume()
+            except Neo4jError:
+                summary = None
+            if summary is not None and summary.counters.contains_updates:
+                get_schema_cache().invalidate()
+
+
+def next_cursor(
+    query: str, parameters: dict[str, Any], state: PageState
+) -> str | None:
+    if state.exhausted:
+        return None
+    return encode_cursor(query, parameters, state.offset)
+
+
+def frame_json(envelope: dict[str, Any], records: list[str]) -> str:
+    """
+    Frames serialized records as the `results` of a JSON object, next to the
+    fields of `envelope`, without parsing them back.
+    """
+    fields = [
+        f"{json.dumps(key)}: {json.dumps(value, default=str)}"
+        for key, value in envelope.items()
+    ]
+    fields.append(f'"results": [{", ".join(records)}]')
+    return "{" + ", ".join(fields) + "}"
+
+
+async def iter_ndjson(
+    records: AsyncIterator[str],
+    query: str,
+    parameters: dict[str, Any],
+    state: PageState,
+) -> AsyncIterator[str]:
+    """
+    Frames a page of records as NDJSON: a `record` line for each, then a
+    `summary` line.
+
+    The response has already started by the time a query fails partway,
+    so the failure ends the stream with an `error` line instead of raising.
+    """
+    try:
+        async for line in records:
+            yield f'{{"record": {line}}}\n'
+    except HTTPException as exc:
+        error = {"status_code": exc.status_code, "detail": exc.detail}
+        yield json.dumps({"error": error}) + "\n"
+        return
+    except Neo4jError as exc:
+        await logger.aexception("Streamed query failed.", code=exc.code)
+        error = {"status_code": 500, "detail": "Query failed."}
+        yield json.dumps({"error": error}) + "\n"
+        return
+    summary = {
+        "count": state.rows,
+        "next_cursor": next_cursor(query, parameters, state),
+        "truncated": state.truncated,
+    }
+    yield json.dumps({"summary": summary}) + "\n"
@@ -0,0 +1,321 @@
+import asyncio
+import os
+from collections import defaultdict
+from typing import Any
+
+from neo4j import RoutingControl
+
+from api.chunking import estimate_tokens
+from api.common import AsyncNeo4jGraph, logger
+from api.embeddings import (
+    CHUNK_LABEL,
+    FULLTEXT_INDEXES,
+    HAS_CHUNK,
+    IDENTIFIER,
+    STOPWORDS,
+    SYMBOL_LABEL,
+    VECTOR_INDEXES,
+    WORD,
+    EmbeddingIndexer,
+)
+from api.extractors import (
+    CALLS,
+    CLASS,
+    DEFINES,
+    FILE,
+    FUNCTION,
+    IMPORTS,
+    MODULE,
+)
+from api.graph_writer import DOCUMENT_LABEL, MENTIONS
+from api.semantic import (
+    KIND_LABELS,
+    SEMANTIC_DEFAULT_K,
+    VECTOR_SEARCH,
+    search_index,
+    source_text,
+    symbol_type,
+)
+
+# Ranks are damped by this much, so no single ranking dominates the fusion
+RETRIEVAL_RRF_K = int(os.environ.get("RETRIEVAL_RRF_K", "60"))
+RETRIEVAL_MAX_HOPS = int(os.environ.get("RETRIEVAL_MAX_HOPS", "3"))
+# Neighbors kept per search result, and in all, when expanding
+RETRIEVAL_NEIGHBORS_PER_SEED = int(
+    os.environ.get("RETRIEVAL_NEIGHBORS_PER_SEED", "10")
+)
+RETRIEVAL_MAX_NEIGHBORS = int(os.environ.get("RETRIEVAL_MAX_NEIGHBORS", "50"))
+RETRIEVAL_TOKEN_BUDGET = int(os.environ.get("RETRIEVAL_TOKEN_BUDGET", "4000"))
+RETRIEVAL_MAX_TOKEN_BUDGET = int(
+    os.environ.get("RETRIEVAL_MAX_TOKEN_BUDGET", "32000")
+)
+# Tokens counted per item on top of its text, for its file and lines
+ITEM_OVERHEAD_TOKENS = 16
+
+EXPANSION_TYPES = (IMPORTS, CALLS)
+
+# Words of a question that would match nearly every docstring
+QUESTION_WORDS = {"how", "does", "do", "what", "where", "which", "why", "who"}
+
+FULLTEXT_SEARCH = (
+    "CALL db.index.fulltext.queryNodes($index, $search, "
+    "{limit: $candidates}) "
+    "YIELD node, score "
+)
+
+# Search results are expanded from the classes and functions they hold,
+# and the modules of their files, since only modules import
+SEEDS_QUERY = (
+    "CALL { "
+    "UNWIND $chunks AS chunk_id "
+    f"MATCH (c:{CHUNK_LABEL} {{id: chunk_id}})<-[:{HAS_CHUNK}]-"
+    f"(d:{DOCUMENT_LABEL})-[:{MENTIONS}]->(seed) "
+    f"WHERE (seed:{FUNCTION} OR seed:{CLASS}) "
+    "AND seed.lineno <= c.end_line AND seed.end_lineno >= c.start_line "
+    "RETURN seed "
+    "UNION "
+    "UNWIND $symbols AS symbol_id "
+    f"MATCH (seed:{SYMBOL_LABEL} {{id: symbol_id}}) "
+    "RETURN seed "
+    "UNION "
+    "UNWIND $chunks AS chunk_id "
+    f"MATCH (:{CHUNK_LABEL} {{id: chunk_id}})<-[:{HAS_CHUNK}]-"
+    f"(d:{DOCUMENT_LABEL})-[:{MENTIONS}]->(:{FILE})-[:{DEFINES}]->(seed) "
+    "RETURN seed "
+    "UNION "
+    "UNWIND $symbols AS symbol_id "
+    f"MATCH (:{SYMBOL_LABEL} {{id: symbol_id}})<-[:{MENTIONS}]-"
+    f"(d:{DOCUMENT_LABEL})-[:{MENTIONS}]->(:{FILE})-[:{DEFINES}]->(seed) "
+    "RETURN seed "
+    "} "
+)
+
+
+def expansion_query(hops: int) -> str:
+    """
+    Builds the query for the neighbors of search results, up to `hops`
+    relationships away along IMPORTS and CALLS, nearest first.
+
+    Paths only go one way, what a seed depends on or what depends on it,
+    so expansion doesn't hop through a module imported everywhere.
+    """
+    relationships = f"[:{'|'.join(EXPANSION_TYPES)}*1..{hops}]"
+    return SEEDS_QUERY + (
+        "WITH DISTINCT seed "
+        "CALL { "
+        "WITH seed "
+        "CALL { "
+        "WITH seed "
+        f"MATCH path = (seed)-{relationships}->(n) "
+        "RETURN n, length(path) AS distance "
+        "UNION ALL "
+        "WITH seed "
+        f"MATCH path = (n)-{relationships}->(seed) "
+        "RETURN n, length(path) AS distance "
+        "} "
+        "WITH seed, n, min(distance) AS distance "
+        "WHERE n <> seed "
+        "RETURN n, distance "
+        "ORDER BY distance LIMIT $per_seed "
+        "} "
+        "WITH n, min(distance) AS distance, "
+        "collect(DISTINCT seed.id) AS via "
+        "WHERE NOT n.id IN $exclude "
+        # A module is defined by one file but mentioned by all its importers
+        f"OPTIONAL MATCH (defining:{DOCUMENT_LABEL})-[:{MENTIONS}]->"
+        f"(:{FILE})-[:{DEFINES}]->(n) "
+        f"OPTIONAL MATCH (mentioning:{DOCUMENT_LABEL})-[:{MENTIONS}]->(n) "
+        f"WHERE NOT n:{MODULE} "
+        "WITH n, distance, via, coalesce(head(collect(defining)), "
+        "head(collect(mentioning))) AS d "
+        "RETURN 'neighbor' AS kind, n.id AS id, n.name AS name, "
+        f"{symbol_type('n')} AS type, "
+        "d.project AS project, d.filename AS filename, "
+        "n.lineno AS start_line, n.end_lineno AS end_line, "
+        f"{source_text('n', 'd')} AS text, distance, via[..3] AS via "
+        "ORDER BY distance, size(via) DESC LIMIT $limit"
+    )
+
+
+def fulltext_query(query: str) -> str | None:
+    """
+    Turns a query into a Lucene query matching any of its words, or whole
+    identifiers. Only letters are kept, as with the simple analyzer, so
+    nothing needs escaping.
+    """
+    terms: dict[str, None] = {}
+    for identifier in IDENTIFIER.findall(query):
+        words = [word.lower() for word in WORD.findall(identifier)]
+        whole = "".join(c for c in identifier.lower() if c.isalpha())
+        for term in [whole, *words]:
+            if (
+                term.isalpha()
+                and term not in STOPWORDS
+                and term not in QUESTION_WORDS
+            ):
+                terms[term] = None
+    return " OR ".join(terms) or None
+
+
+def reciprocal_rank_fusion(
+    rankings: dict[str, list[dict[str, Any]]], k: int = RETRIEVAL_RRF_K
+) -> list[dict[str, Any]]:
+    """
+    Fuses rankings by summing 1 / (k + rank) over the rankings a result is
+    in. Scores of different searches aren't comparable, their ranks are.
+
+    Each result records the rankings that found it in `matched_by`.
+    """
+    results: dict[str, dict[str, Any]] = {}
+    scores: defaultdict[str, float] = defaultdict(float)
+    for name, ranking in rankings.items():
+        for rank, record in enumerate(ranking, start=1):
+            result = results.setdefault(
+                record["id"], {**record, "matched_by": []}
+            )
+            result["matched_by"].append(name)
+            scores[record["id"]] += 1 / (k + rank)
+    for result_id, result in results.items():
+        result["score"] = round(scores[result_id], 6)
+    return sorted(
+        results.values(), key=lambda result: result["score"], reverse=True
+    )
+
+
+def pack_context(
+    items: list[dict[str, Any]], token_budget: int
+) -> tuple[list[dict[str, Any]], int, int]:
+    """
+    Fits items into a token budget, in order, skipping those that don't fit.
+
+    Items whose lines are already covered by a packed item of the same file
+    are left out, so a function isn't sent again inside its chunk. Returns
+    the packed items, the tokens they use and how many were left out for
+    the budget.
+    """
+    packed = []
+    tokens = 0
+    omitted = 0
+    covered: defaultdict[str, list[tuple[int, int]]] = defaultdict(list)
+    for item in items:
+        filename = item.get("filename")
+        start, end = item.get("start_line"), item.get("end_line")
+        lines = (start, end) if start is not None and end is not None else None
+        if lines and any(
+            first <= lines[0] and lines[1] <= last
+            for first, last in covered[filename]
+        ):
+            continue
+        cost = estimate_tokens(item.get("text") or "") + ITEM_OVERHEAD_TOKENS
+        if tokens + cost > token_budget:
+            omitted += 1
+            continue
+        packed.append(item)
+        tokens += cost
+        if lines:
+            covered[filename].append(lines)
+    return packed, tokens, omitted
+
+
+async def hybrid_search(
+    query: str,
+    graph: AsyncNeo4jGraph,
+    indexer: EmbeddingIndexer,
+    k: int = SEMANTIC_DEFAULT_K,
+    project: str | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Runs full-text and vector searches of chunks and symbols at once, and
+    fuses their rankings.
+    """
+    await indexer.ensure_indexes(graph)
+    embedding = await indexer.embeddings.aembed_query(query)
+    search = fulltext_query(query)
+
+    searches = {}
+    for kind, label in KIND_LABELS.items():
+        if any(embedding):
+            searches[f"vector:{kind}"] = search_index(
+                graph,
+                VECTOR_SEARCH,
+                kind,
+                VECTOR_INDEXES[label],
+                k,
+                project,
+                embedding=embedding,
+            )
+        if search is not None:
+            searches[f"fulltext:{kind}"] = search_index(
+                graph,
+                FULLTEXT_SEARCH,
+                kind,
+                FULLTEXT_INDEXES[label][0],
+                k,
+                project,
+                search=search,
+            )
+    rankings = await asyncio.gather(*searches.values())
+    fused = reciprocal_rank_fusion(dict(zip(searches, rankings, strict=True)))
+    return fused[:k]
+
+
+async def expand(
+    graph: AsyncNeo4jGraph,
+    results: list[dict[str, Any]],
+    hops: int,
+) -> list[dict[str, Any]]:
+    """
+    Gets the neighbors of search results along IMPORTS and CALLS, up to
+    `hops` away.
+    """
+    if not hops or not results:
+        return []
+    return await graph.query(
+        expansion_query(hops),
+        {
+            "chunks": [r["id"] for r in results if r["kind"] == "chunk"],
+            "symbols": [r["id"] for r in results if r["kind"] == "symbol"],
+            "exclude": [r["id"] for r in results],
+            "per_seed": RETRIEVAL_NEIGHBORS_PER_SEED,
+            "limit": RETRIEVAL_MAX_NEIGHBORS,
+        },
+        routing=RoutingControl.READ,
+    )
+
+
+async def retrieve_context(
+    query: str,
+    graph: AsyncNeo4jGraph,
+    indexer: EmbeddingIndexer,
+    k: int = SEMANTIC_DEFAULT_K,
+    hops: int = 1,
+    token_budget: int = RETRIEVAL_TOKEN_BUDGET,
+    project: str | None = None,
+) -> dict[str, Any]:
+    """
+    Assembles the context for a query in one call.
+
+    The `k` best chunks and symbols by fused full-text and vector rank come
+    first, then what they import and call, and what imports and calls
+    them, nearest first. Items are packed until `token_budget` is spent.
+    """
+    results = await hybrid_search(query, graph, indexer, k, project)
+    neighbors = await expand(graph, results, hops)
+    items, tokens, omitted = pack_context(results + neighbors, token_budget)
+
+    await logger.ainfo(
+        "Retrieved context.",
+        results=len(results),
+        neighbors=len(neighbors),
+        packed=len(items),
+        tokens=tokens,
+        omitted=omitted,
+    )
+    return {
+        "query": query,
+        "token_budget": token_budget,
+        "tokens": tokens,
+        "count": len(items),
+        "omitted": omitted,
+        "items": items,
+    }
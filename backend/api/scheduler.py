@@ -0,0 +1,175 @@
+import asyncio
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from functools import cache
+
+import httpx
+from langchain_community.graphs.graph_document import GraphDocument
+from langchain_core.documents import Document
+from langchain_experimental.graph_transformers.llm import LLMGraphTransformer
+
+from api.common import LLM_PROVIDER, logger
+
+MAX_IN_FLIGHT = int(os.environ.get("EXTRACTION_MAX_IN_FLIGHT", "8"))
+MAX_RETRIES = int(os.environ.get("EXTRACTION_MAX_RETRIES", "5"))
+BACKOFF_BASE = float(os.environ.get("EXTRACTION_BACKOFF_BASE", "1.0"))
+BACKOFF_MAX = float(os.environ.get("EXTRACTION_BACKOFF_MAX", "60.0"))
+
+# Requests per minute allowed by each provider's quota
+DEFAULT_REQUESTS_PER_MINUTE = {"gemini": 60, "openrouter": 120}
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+RETRYABLE_MESSAGES = ("429", "rate limit", "resource_exhausted", "overloaded")
+
+
+class TokenBucket:
+    """
+    An async token bucket, refilled continuously at `rate` tokens per second
+    up to `capacity` tokens.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """
+        Waits until `tokens` tokens are available and takes them.
+        """
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+@cache
+def get_rate_limiter(provider: str) -> TokenBucket:
+    """
+    Gets the token bucket shared by every extraction for a provider.
+    """
+    requests_per_minute = float(
+        os.environ.get(
+            "LLM_REQUESTS_PER_MINUTE",
+            DEFAULT_REQUESTS_PER_MINUTE.get(provider, 60),
+        )
+    )
+    # Allow short bursts of up to one second's worth of requests
+    rate = requests_per_minute / 60
+    return TokenBucket(rate=rate, capacity=max(1.0, rate))
+
+
+@cache
+def get_in_flight_limiter(provider: str) -> asyncio.Semaphore:
+    """
+    Gets the semaphore bounding in-flight requests to a provider.
+    """
+    return asyncio.Semaphore(MAX_IN_FLIGHT)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Checks whether an LLM call failed because of rate limiting, a server
+    error or a transient network issue.
+    """
+    if isinstance(exc, httpx.TransportError | asyncio.TimeoutError):
+        return True
+    status_code = getattr(exc, "status_code", None) or getattr(
+        exc, "code", None
+    )
+    response = getattr(exc, "response", None)
+    if status_code is None and response is not None:
+        status_code = getattr(response, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    message = str(exc).lower()
+    return any(fragment in message for fragment in RETRYABLE_MESSAGES)
+
+
+@dataclass
+class ExtractionStats:
+    succeeded: int = 0
+    retries: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        """
+        Documents extracted per second.
+        """
+        return self.succeeded / self.elapsed if self.elapsed else 0.0
+
+
+class ExtractionScheduler:
+    """
+    Runs LLM extractions with a bounded number of in-flight requests, a
+    per-provider rate limit and exponential backoff on transient errors.
+
+    A document that still fails after retrying raises, and is left for the
+    caller to record.
+    """
+
+    def __init__(
+        self,
+        llm_transformer: LLMGraphTransformer,
+        provider: str = LLM_PROVIDER,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.llm_transformer = llm_transformer
+        self.provider = provider
+        self.max_retries = max_retries
+        self.rate_limiter = get_rate_limiter(provider)
+        self.in_flight = get_in_flight_limiter(provider)
+        self.stats = ExtractionStats()
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt)
+        # Full jitter, so retries from concurrent requests spread out
+        return random.uniform(0, delay)
+
+    async def extract(self, document: Document) -> GraphDocument:
+        """
+        Extracts a graph from a single document, retrying transient errors.
+        """
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire()
+            try:
+                async with self.in_flight:
+                    graph_document = (
+                        await self.llm_transformer.aprocess_response(document)
+                    )
+            except Exception as exc:
+                if attempt >= self.max_retries or not is_retryable(exc):
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                self.stats.retries += 1
+                await logger.awarning(
+                    "Extraction failed, retrying.",
+                    filename=document.metadata.get("filename"),
+                    attempt=attempt,
+                    delay=round(delay, 2),
+                    error=str(exc),
+                )
+                await asyncio.sleep(delay)
+            else:
+                self.stats.succeeded += 1
+                return graph_document
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+from collections.abc import Awaitable, Callable
+from functools import cache
+from typing import Any
+
+from neo4j import RoutingControl
+
+from api.common import AsyncNeo4jGraph, logger
+
+SCHEMA_CACHE_TTL = float(os.environ.get("SCHEMA_CACHE_TTL", "300"))
+
+# Served from the count store rather than by scanning the graph
+STATS_QUERY = (
+    "CALL apoc.meta.stats() "
+    "YIELD nodeCount, relCount, labels, relTypesCount "
+    "RETURN nodeCount, relCount, labels, relTypesCount"
+)
+
+
+class _Entry:
+    def __init__(self):
+        self.value: Any = None
+        self.version = -1
+        self.fetched_at = 0.0
+        self.lock = asyncio.Lock()
+
+
+class SchemaCache:
+    """
+    Caches the graph schema and statistics until the graph is written to or
+    the TTL expires.
+
+    `version` is bumped on every invalidation, so other caches derived from
+    the schema can tell when they are stale.
+    """
+
+    def __init__(self, ttl: float = SCHEMA_CACHE_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self._schema = _Entry()
+        self._stats = _Entry()
+
+    def invalidate(self):
+        self.version += 1
+
+    async def _get(
+        self, entry: _Entry, fetch: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        def fresh() -> bool:
+            return (
+                entry.version == self.version
+                and time.monotonic() - entry.fetched_at < self.ttl
+            )
+
+        if fresh():
+            return entry.value
+        # Only one request refreshes, concurrent ones wait for its result
+        async with entry.lock:
+            if fresh():
+                return entry.value
+            version = self.version
+            entry.value = await fetch()
+            entry.version = version
+            entry.fetched_at = time.monotonic()
+            return entry.value
+
+    async def get_schema(self, graph: AsyncNeo4jGraph) -> dict[str, Any]:
+        async def fetch() -> dict[str, Any]:
+            await graph.refresh_schema()
+            await logger.adebug("Refreshed schema.", version=self.version)
+            return {
+                "structured_schema": graph.structured_schema,
+                "schema": graph.schema,
+            }
+
+        return await self._get(self._schema, fetch)
+
+    async def get_stats(self, graph: AsyncNeo4jGraph) -> dict[str, Any]:
+        async def fetch() -> dict[str, Any]:
+            records = await graph.query(
+                STATS_QUERY, routing=RoutingControl.READ
+            )
+            stats = records[0]
+            return {
+                "node_count": stats["nodeCount"],
+                "relationship_count": stats["relCount"],
+                # Labels and types stay in the token store once unused
+                "labels": sorted(
+                    label for label, count in stats["labels"].items() if count
+                ),
+                "relationship_types": sorted(
+                    rel_type
+                    for rel_type, count in stats["relTypesCount"].items()
+                    if count
+                ),
+            }
+
+        return await self._get(self._stats, fetch)
+
+
+@cache
+def get_schema_cache() -> SchemaCache:
+    """
+    Gets the schema cache shared by the app.
+    """
+    return SchemaCache()
@@ -0,0 +1,155 @@
+import asyncio
+import os
+from typing import Any, Literal
+
+from neo4j import RoutingControl
+
+from api.common import AsyncNeo4jGraph, logger
+from api.embeddings import (
+    CHUNK_LABEL,
+    SYMBOL_LABEL,
+    VECTOR_INDEXES,
+    EmbeddingIndexer,
+)
+from api.graph_writer import DOCUMENT_LABEL, MENTIONS
+
+SEMANTIC_DEFAULT_K = int(os.environ.get("SEMANTIC_DEFAULT_K", "10"))
+SEMANTIC_MAX_K = int(os.environ.get("SEMANTIC_MAX_K", "100"))
+# Vector indexes can't filter, so filtered searches fetch this many times
+# more candidates and filter those
+SEMANTIC_OVERFETCH = int(os.environ.get("SEMANTIC_OVERFETCH", "4"))
+
+SearchKind = Literal["chunk", "symbol"]
+
+KIND_LABELS: dict[SearchKind, str] = {
+    "chunk": CHUNK_LABEL,
+    "symbol": SYMBOL_LABEL,
+}
+
+# Searches yield `node` and `score`, and are completed by a kind's results
+VECTOR_SEARCH = (
+    "CALL db.index.vector.queryNodes($index, $candidates, $embedding) "
+    "YIELD node, score "
+)
+
+
+def source_text(node: str, document: str) -> str:
+    """
+    Builds a Cypher expression for a symbol's source, cut out of the text
+    of its document by line. Falls back to its docstring.
+    """
+    return (
+        f"CASE WHEN {node}.lineno IS NULL OR {document} IS NULL "
+        f"THEN {node}.docstring "
+        "ELSE apoc.text.join(split("
+        f"{document}.text, '\\n')[{node}.lineno - 1..{node}.end_lineno], "
+        "'\\n') END"
+    )
+
+
+def symbol_type(node: str) -> str:
+    return f"[label IN labels({node}) WHERE label <> '{SYMBOL_LABEL}'][0]"
+
+
+CHUNK_RESULTS = (
+    "WHERE $project IS NULL OR node.project = $project "
+    "RETURN 'chunk' AS kind, node.id AS id, null AS name, null AS type, "
+    "node.project AS project, node.filename AS filename, "
+    "node.start_line AS start_line, node.end_line AS end_line, "
+    "node.text AS text, score "
+    "ORDER BY score DESC LIMIT $k"
+)
+
+# Symbols are found in files through the documents that mention them
+SYMBOL_RESULTS = (
+    f"OPTIONAL MATCH (d:{DOCUMENT_LABEL})-[:{MENTIONS}]->(node) "
+    "WITH node, score, head(collect(d)) AS d "
+    "WHERE $project IS NULL OR d.project = $project "
+    "RETURN 'symbol' AS kind, node.id AS id, node.name AS name, "
+    f"{symbol_type('node')} AS type, "
+    "d.project AS project, d.filename AS filename, "
+    "node.lineno AS start_line, node.end_lineno AS end_line, "
+    f"{source_text('node', 'd')} AS text, score "
+    "ORDER BY score DESC LIMIT $k"
+)
+
+RESULTS: dict[SearchKind, str] = {
+    "chunk": CHUNK_RESULTS,
+    "symbol": SYMBOL_RESULTS,
+}
+
+
+async def search_index(
+    graph: AsyncNeo4jGraph,
+    procedure: str,
+    kind: SearchKind,
+    index: str,
+    k: int,
+    project: str | None = None,
+    **parameters: Any,
+) -> list[dict[str, Any]]:
+    """
+    Runs an index search for one kind of result, best first.
+
+    `procedure` is the Cypher calling the index. It gets the `index`, the
+    number of `candidates` to fetch and any other `parameters`.
+    """
+    return await graph.query(
+        procedure + RESULTS[kind],
+        {
+            **parameters,
+            "index": index,
+            "k": k,
+            "candidates": k * SEMANTIC_OVERFETCH if project else k,
+            "project": project,
+        },
+        routing=RoutingControl.READ,
+    )
+
+
+async def semantic_search(
+    query: str,
+    graph: AsyncNeo4jGraph,
+    indexer: EmbeddingIndexer,
+    k: int = SEMANTIC_DEFAULT_K,
+    kind: SearchKind | None = None,
+    project: str | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Finds the `k` chunks and symbols closest to a query, best first.
+
+    Both vector indexes are searched at once unless `kind` picks one, and
+    scores are cosine similarities from the same model, so they're merged
+    as they are.
+    """
+    # Nothing may have been loaded yet
+    await indexer.ensure_indexes(graph)
+    embedding = await indexer.embeddings.aembed_query(query)
+    if not any(embedding):
+        return []
+
+    kinds: list[SearchKind] = [kind] if kind else list(KIND_LABELS)
+    results = await asyncio.gather(
+        *(
+            search_index(
+                graph,
+                VECTOR_SEARCH,
+                search_kind,
+                VECTOR_INDEXES[KIND_LABELS[search_kind]],
+                k,
+                project,
+                embedding=embedding,
+            )
+            for search_kind in kinds
+        )
+    )
+    records = sorted(
+        (record for records in results for record in records),
+        key=lambda record: record["score"],
+        reverse=True,
+    )[:k]
+
+    await logger.ainfo(
+        "Searched semantically.", kinds=kinds, project=project, k=k
+    )
+    return records
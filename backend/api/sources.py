@@ -0,0 +1,269 @@
+import asyncio
+import os
+import re
+import tempfile
+import zipfile
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Callable
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+
+from langchain_core.documents import Document
+
+from api.common import logger
+from api.documents import (
+    download_github_project,
+    iter_archive_documents,
+    iter_documents,
+    list_archive_files,
+    list_files,
+    strip_archive_root,
+)
+
+# Directories local sources may be read from, separated by os.pathsep.
+# Local sources are disabled unless set.
+LOCAL_SOURCE_ROOTS = [
+    os.path.realpath(root)
+    for root in os.environ.get("LOADER_LOCAL_ROOTS", "").split(os.pathsep)
+    if root
+]
+GIT_TIMEOUT = float(os.environ.get("LOADER_GIT_TIMEOUT", "600"))
+
+REMOTE_GIT_URL = re.compile(r"^(?:https?|ssh|git)://|^[\w.-]+@[\w.-]+:")
+
+
+@dataclass
+class ProjectFiles:
+    """
+    The files of a project to ingest, and how to read them.
+    """
+
+    names: list[str]
+    # Streams the files as documents, given metadata to add to each
+    read: Callable[..., AsyncIterator[Document]]
+    # The documents' filenames, in the order of `names`, when they differ
+    filenames: list[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        if not self.filenames:
+            self.filenames = list(self.names)
+
+
+def check_local_path(path: str) -> str:
+    """
+    Checks that a local path may be loaded, and resolves it.
+    """
+    resolved = os.path.realpath(path)
+    if not any(
+        os.path.commonpath([resolved, root]) == root
+        for root in LOCAL_SOURCE_ROOTS
+    ):
+        raise ValueError(
+            f"Local path not allowed: {path}. Allowed roots are set with "
+            "LOADER_LOCAL_ROOTS."
+        )
+    return resolved
+
+
+class Source(ABC):
+    """
+    Where a project is loaded from.
+    """
+
+    @property
+    @abstractmethod
+    def project(self) -> str:
+        """
+        Identifies the project in the graph, across loads.
+        """
+
+    @abstractmethod
+    def check(self):
+        """
+        Raises a ValueError if the source can't be loaded.
+        """
+
+    @abstractmethod
+    def open(self) -> AbstractAsyncContextManager[ProjectFiles]:
+        """
+        Fetches the project and gives access to its files, until exited.
+        """
+
+
+class GithubArchiveSource(Source):
+    """
+    A GitHub repository, downloaded as a zip archive of a ref.
+    """
+
+    def __init__(self, url: str, ref: str | None = None):
+        self.url = url
+        self.ref = ref
+
+    @property
+    def project(self) -> str:
+        return self.url
+
+    def check(self):
+        if not self.url.startswith("https://github.com"):
+            raise ValueError(f"Invalid Github URL: {self.url}.")
+
+    @asynccontextmanager
+    async def open(self) -> AsyncIterator[ProjectFiles]:
+        self.check()
+        with tempfile.TemporaryDirectory() as download_directory:
+            archive_path = Path(download_directory) / "repo.zip"
+            await download_github_project(self.url, archive_path, self.ref)
+            with zipfile.ZipFile(archive_path) as archive:
+                names = await list_archive_files(archive)
+                yield ProjectFiles(
+                    names,
+                    partial(
+                        iter_archive_documents,
+                        archive,
+                        names=names,
+                        strip_root=True,
+                    ),
+                    [strip_archive_root(name) for name in names],
+                )
+
+
+class LocalDirectorySource(Source):
+    """
+    A directory on the API's filesystem, read in place.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @property
+    def project(self) -> str:
+        return os.path.realpath(self.path)
+
+    def check(self):
+        resolved = check_local_path(self.path)
+        if not os.path.isdir(resolved):
+            raise ValueError(f"Not a directory: {self.path}.")
+
+    @asynccontextmanager
+    async def open(self) -> AsyncIterator[ProjectFiles]:
+        self.check()
+        paths = await list_files(self.project)
+        yield ProjectFiles(
+            paths, partial(iter_documents, self.project, paths=paths)
+        )
+
+
+class GitSource(Source):
+    """
+    A git repository, cloned shallow at a ref.
+
+    With `sparse_paths`, only those directories are checked out, and the
+    contents of other files are never downloaded.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        ref: str | None = None,
+        sparse_paths: list[str] | None = None,
+    ):
+        self.url = url
+        self.ref = ref
+        self.sparse_paths = sparse_paths or []
+
+    @property
+    def project(self) -> str:
+        return self.url
+
+    def _fetch_url(self) -> str:
+        if REMOTE_GIT_URL.match(self.url):
+            return self.url
+        # Local repositories are fetched over file:// so --depth applies
+        path = self.url.removeprefix("file://")
+        return Path(check_local_path(path)).as_uri()
+
+    def check(self):
+        self._fetch_url()
+        if self.ref is not None and self.ref.startswith("-"):
+            raise ValueError(f"Invalid ref: {self.ref}.")
+        if any(path.startswith("-") for path in self.sparse_paths):
+            raise ValueError("Invalid sparse checkout path.")
+
+    @asynccontextmanager
+    async def open(self) -> AsyncIterator[ProjectFiles]:
+        self.check()
+        with tempfile.TemporaryDirectory() as checkout_directory:
+            await shallow_clone(
+                self._fetch_url(),
+                checkout_directory,
+                self.ref,
+                self.sparse_paths,
+            )
+            paths = await list_files(checkout_directory)
+            yield ProjectFiles(
+                paths, partial(iter_documents, checkout_directory, paths=paths)
+            )
+
+
+async def _git(*args: str, cwd: str | None = None) -> str:
+    process = await asyncio.create_subprocess_exec(
+        "git",
+        *args,
+        cwd=cwd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        # Fail rather than wait for credentials that will never come
+        env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(
+            process.communicate(), GIT_TIMEOUT
+        )
+    except TimeoutError as exc:
+        raise RuntimeError(
+            f"git {args[0]} timed out after {GIT_TIMEOUT}s."
+        ) from exc
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    if process.returncode:
+        raise RuntimeError(
+            f"git {args[0]} failed: {stderr.decode(errors='replace').strip()}"
+        )
+    return stdout.decode(errors="replace")
+
+
+async def shallow_clone(
+    url: str,
+    dest: str,
+    ref: str | None = None,
+    sparse_paths: list[str] | None = None,
+):
+    """
+    Checks out a single commit of a repository, without its history.
+
+    `ref` can be a branch, a tag or a commit, and defaults to the remote's
+    HEAD.
+    """
+    await _git("init", "--quiet", dest)
+    await _git("remote", "add", "origin", url, cwd=dest)
+    fetch_args = ["--depth", "1"]
+    if sparse_paths:
+        await _git("sparse-checkout", "set", "--", *sparse_paths, cwd=dest)
+        # Only the blobs under the sparse paths get fetched, at checkout
+        fetch_args.append("--filter=blob:none")
+    await _git(
+        "fetch", "--quiet", *fetch_args, "origin", ref or "HEAD", cwd=dest
+    )
+    await _git("checkout", "--quiet", "FETCH_HEAD", cwd=dest)
+    commit = await _git("rev-parse", "HEAD", cwd=dest)
+    await logger.ainfo(
+        "Cloned repository.",
+        url=url,
+        ref=ref,
+        commit=commit.strip(),
+        sparse_paths=sparse_paths,
+    )
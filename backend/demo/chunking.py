@@ -0,0 +1,110 @@
+import re
+from typing import Any
+
+# Lines that start a definition, in most of the languages the demo scans
+DEFINITION = re.compile(
+    r"(?:@"
+    r"|(?:export|default|public|private|protected|internal|static|abstract|final|async|pub|override)\s"
+    r"|(?:def|class|function|func|fn|interface|struct|enum|impl|trait|module|type)\b)"
+)
+
+LIST_FIELDS = [
+    "imports",
+    "exports",
+    "functions",
+    "classes",
+    "dependencies",
+    "calls",
+]
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def _blocks(lines: list[str], indent: int) -> list[list[str]]:
+    """Groups lines into blocks, each starting with a definition at `indent`."""
+    blocks: list[list[str]] = [[]]
+    for line in lines:
+        starts_definition = (
+            line.strip()
+            and _indent(line) == indent
+            and DEFINITION.match(line.lstrip())
+        )
+        # Decorators and annotations stay with what they decorate
+        after_decorator = blocks[-1] and blocks[-1][-1].lstrip().startswith("@")
+        if starts_definition and blocks[-1] and not after_decorator:
+            blocks.append([])
+        blocks[-1].append(line)
+    return [block for block in blocks if block]
+
+
+def _pack(pieces: list[str], max_chars: int) -> list[str]:
+    chunks: list[str] = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + len(piece) <= max_chars:
+            chunks[-1] += piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def _split(lines: list[str], indent: int, max_chars: int) -> list[str]:
+    text = "".join(lines)
+    if len(text) <= max_chars:
+        return [text]
+
+    blocks = _blocks(lines, indent)
+    if len(blocks) > 1:
+        pieces = []
+        for block in blocks:
+            pieces.extend(_split(block, indent, max_chars))
+        return _pack(pieces, max_chars)
+
+    # A single definition, so split its body one indentation level down
+    deeper = [
+        _indent(line)
+        for line in lines
+        if line.strip() and _indent(line) > indent
+    ]
+    if deeper:
+        return _split(lines, min(deeper), max_chars)
+
+    # No structure left, fall back to whole lines, and cut any that are too long
+    pieces = []
+    for line in lines:
+        pieces.extend(
+            line[i : i + max_chars] for i in range(0, len(line), max_chars)
+        )
+    return _pack(pieces, max_chars)
+
+
+def chunk_code(content: str, max_chars: int = 1500) -> list[str]:
+    """Splits code into chunks of at most `max_chars`, on definition
+    boundaries where possible.
+
+    Every character of `content` ends up in exactly one chunk, in order.
+    """
+    if len(content) <= max_chars:
+        return [content]
+    return _split(content.splitlines(keepends=True), 0, max_chars)
+
+
+def merge_analyses(analyses: list[dict[str, Any]]) -> dict[str, Any]:
+    """Merges the analyses of a file's chunks into one.
+
+    The first chunk's type and name are kept.
+    """
+    valid = [analysis for analysis in analyses if "error" not in analysis]
+    if not valid:
+        return {"error": "Analysis failed"}
+
+    merged = dict(valid[0])
+    for field in LIST_FIELDS:
+        values = []
+        for analysis in valid:
+            values.extend(
+                v for v in analysis.get(field) or [] if isinstance(v, str)
+            )
+        merged[field] = list(dict.fromkeys(values))
+    return merged
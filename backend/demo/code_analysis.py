@@ -0,0 +1,120 @@
+import ast
+import os
+from pathlib import Path
+from typing import Any
+
+
+def _imported_modules(tree: ast.Module) -> list[str]:
+    modules = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.module:
+                modules.append("." * node.level + node.module)
+            else:
+                modules.extend(
+                    "." * node.level + alias.name for alias in node.names
+                )
+    return list(dict.fromkeys(modules))
+
+
+def _imported_names(tree: ast.Module) -> dict[str, str]:
+    """Local names bound by `from x import y`, mapped to their module."""
+    names = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                names[alias.asname or alias.name] = node.module or ""
+    return names
+
+
+def _called_names(tree: ast.Module) -> list[str]:
+    calls = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        if isinstance(node.func, ast.Name):
+            calls.append(node.func.id)
+        elif isinstance(node.func, ast.Attribute) and isinstance(
+            node.func.value, ast.Name
+        ):
+            calls.append(f"{node.func.value.id}.{node.func.attr}")
+    return list(dict.fromkeys(calls))
+
+
+def analyze_python(
+    content: str, file_path: str, all_files: list[str]
+) -> dict[str, Any] | None:
+    """Analyzes a Python file from its syntax tree, in the same shape as the
+    LLM analysis.
+
+    Returns None if the file doesn't parse, so the caller can fall back to
+    the LLM.
+    """
+    try:
+        tree = ast.parse(content, filename=file_path)
+    except (SyntaxError, ValueError):
+        return None
+
+    functions = [
+        node.name
+        for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+    ]
+    classes = [
+        node.name for node in tree.body if isinstance(node, ast.ClassDef)
+    ]
+    methods = [
+        f"{node.name}.{child.name}"
+        for node in tree.body
+        if isinstance(node, ast.ClassDef)
+        for child in node.body
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+    ]
+
+    exports = [name for name in functions + classes if not name.startswith("_")]
+    for node in tree.body:
+        # An explicit __all__ overrides the public names
+        if (
+            isinstance(node, ast.Assign)
+            and any(
+                isinstance(t, ast.Name) and t.id == "__all__"
+                for t in node.targets
+            )
+            and isinstance(node.value, (ast.List, ast.Tuple))
+        ):
+            exports = [
+                elt.value
+                for elt in node.value.elts
+                if isinstance(elt, ast.Constant) and isinstance(elt.value, str)
+            ]
+
+    imports = _imported_modules(tree)
+    file_stems = {Path(f).stem: f for f in all_files if f != file_path}
+    dependencies = []
+    for module in imports:
+        stem = module.lstrip(".").split(".")[-1]
+        if stem in file_stems:
+            dependencies.append(os.path.basename(file_stems[stem]))
+
+    # Only calls into other files, i.e. to imported names or modules
+    imported_names = _imported_names(tree)
+    imported_roots = {module.lstrip(".").split(".")[0] for module in imports}
+    calls = [
+        name
+        for name in _called_names(tree)
+        if name.split(".")[0] in imported_names
+        or name.split(".")[0] in imported_roots
+    ]
+
+    return {
+        "type": "class" if classes and not functions else "module",
+        "name": Path(file_path).stem,
+        "imports": imports,
+        "exports": exports,
+        "functions": functions + methods,
+        "classes": classes,
+        "dependencies": list(dict.fromkeys(dependencies)),
+        "calls": calls,
+    }
@@ -0,0 +1,136 @@
+import os
+import posixpath
+from collections import defaultdict
+from typing import Any
+
+from scanner import SOURCE_EXTENSIONS
+
+# Files that stand for the package or directory they're in
+PACKAGE_FILES = {"__init__", "index", "mod"}
+
+
+def _strip_extension(path: str) -> str:
+    root, ext = posixpath.splitext(path)
+    return root if ext in SOURCE_EXTENSIONS else path
+
+
+class ModuleIndex:
+    """Resolves import strings to project files by module path.
+
+    Files are indexed under their path without extension and every suffix of
+    it, so `com.example.Foo`, `pkg/util` and `util` all resolve, but two files
+    named `util` in different packages don't collide.
+    """
+
+    def __init__(self, paths: list[str]):
+        # Paths relative to the project root, without extension
+        self.modules: dict[str, str] = {}
+        self.suffixes: dict[str, list[str]] = defaultdict(list)
+        for path in paths:
+            parts = _strip_extension(path).split("/")
+            keys = ["/".join(parts)]
+            if len(parts) > 1 and parts[-1] in PACKAGE_FILES:
+                keys.append("/".join(parts[:-1]))
+            for key in keys:
+                self.modules.setdefault(key, path)
+                key_parts = key.split("/")
+                for i in range(len(key_parts)):
+                    self.suffixes["/".join(key_parts[i:])].append(path)
+
+    def resolve(self, spec: str, importer: str) -> str | None:
+        """Finds the file an import of `spec` in `importer` refers to, if
+        it's in the project.
+        """
+        spec = spec.strip().strip("'\"")
+        if not spec:
+            return None
+        directory = posixpath.dirname(importer)
+
+        # Relative imports are resolved against the importer, and must match
+        # exactly
+        if spec.startswith("./") or spec.startswith("../"):
+            key = posixpath.normpath(
+                posixpath.join(directory, _strip_extension(spec))
+            )
+            return self.modules.get(key)
+        if spec.startswith("."):
+            level = len(spec) - len(spec.lstrip("."))
+            for _ in range(level - 1):
+                directory = posixpath.dirname(directory)
+            rest = spec[level:].replace(".", "/")
+            key = posixpath.join(directory, rest) if rest else directory
+            return self.modules.get(posixpath.normpath(key))
+
+        key = _strip_extension(spec).lstrip("/")
+        if "/" not in key:
+            key = key.replace(".", "/")
+        if key in self.modules:
+            return self.modules[key]
+        candidates = [
+            path for path in self.suffixes.get(key, []) if path != importer
+        ]
+        if len(candidates) <= 1:
+            return candidates[0] if candidates else None
+
+        # Same named modules are told apart by how close they are to the
+        # importer
+        def closeness(path: str) -> int:
+            return len(
+                os.path.commonprefix(
+                    [posixpath.dirname(path).split("/"), directory.split("/")]
+                )
+            )
+
+        ranked = sorted(candidates, key=closeness, reverse=True)
+        if closeness(ranked[0]) > closeness(ranked[1]):
+            return ranked[0]
+        return None
+
+
+class CodeGraph:
+    """The nodes and edges of a codebase, indexed for constant time lookups."""
+
+    def __init__(self):
+        self.nodes: list[dict[str, Any]] = []
+        self.edges: list[dict[str, Any]] = []
+        self.edge_ids: set[str] = set()
+        self.node_paths: dict[str, str] = {}
+        self.path_nodes: dict[str, str] = {}
+        self.outgoing: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        self.incoming: dict[str, list[dict[str, Any]]] = defaultdict(list)
+
+    def add_node(self, node: dict[str, Any], path: str | None = None):
+        self.nodes.append(node)
+        if path is not None:
+            self.node_paths[node["id"]] = path
+            self.path_nodes[path] = node["id"]
+
+    def add_edge(self, edge: dict[str, Any]) -> bool:
+        """Adds an edge unless one with the same id exists.
+
+        Returns whether it was added.
+        """
+        if edge["id"] in self.edge_ids:
+            return False
+        self.edge_ids.add(edge["id"])
+        self.edges.append(edge)
+        self.outgoing[edge["source"]].append(edge)
+        self.incoming[edge["target"]].append(edge)
+        return True
+
+    def neighbors(
+        self, node_id: str, edge_type: str | None = None
+    ) -> dict[str, list[str]]:
+        """Ids of the nodes linked to a node, by direction."""
+
+        def ends(edges: list[dict[str, Any]], end: str) -> list[str]:
+            return [
+                edge[end]
+                for edge in edges
+                if edge_type is None or edge["type"] == edge_type
+            ]
+
+        return {
+            "outgoing": ends(self.outgoing.get(node_id, []), "target"),
+            "incoming": ends(self.incoming.get(node_id, []), "source"),
+        }
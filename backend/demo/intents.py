@@ -0,0 +1,210 @@
+import copy
+import math
+import os
+import re
+import time
+from collections import Counter, OrderedDict
+from typing import Any
+
+# Interpreted commands kept, and for how long, in seconds
+COMMAND_CACHE_SIZE = int(os.getenv("COMMAND_CACHE_SIZE", "1024"))
+COMMAND_CACHE_TTL = float(os.getenv("COMMAND_CACHE_TTL", "3600"))
+# Confidence above which a command is routed locally instead of by the LLM
+INTENT_CONFIDENCE_THRESHOLD = float(
+    os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.5")
+)
+
+# Words people use for each tool, on top of its name and description
+TOOL_KEYWORDS = {
+    "file_reader": "read open show view display contents cat print",
+    "code_analyzer": (
+        "analyze analysis structure patterns complexity review explain inspect"
+    ),
+    "dependency_mapper": (
+        "dependencies depends imports import requires uses dependency map"
+    ),
+    "search_codebase": "search find grep look locate where occurrences",
+    "graph_builder": (
+        "build graph connect link relationship relationships nodes edges "
+        "knowledge"
+    ),
+    "ast_parser": "ast parse parser syntax tree",
+    "symbol_finder": (
+        "symbol symbols definition defined declaration usages usage references"
+    ),
+    "refactor_helper": (
+        "refactor refactoring improve clean simplify rename smell smells"
+    ),
+}
+
+STOPWORDS = {
+    "a",
+    "an",
+    "and",
+    "are",
+    "can",
+    "for",
+    "from",
+    "how",
+    "i",
+    "in",
+    "is",
+    "it",
+    "me",
+    "my",
+    "of",
+    "on",
+    "or",
+    "please",
+    "the",
+    "this",
+    "that",
+    "to",
+    "what",
+    "with",
+    "you",
+    "all",
+}
+
+WORD = re.compile(r"[a-z]+")
+FILE_PATH = re.compile(r"[\w./-]+\.[A-Za-z]\w*")
+QUOTED = re.compile(r"[`'\"]([^`'\"]+)[`'\"]")
+# Words are cut to this many characters, a crude but effective stemmer
+STEM_LENGTH = 5
+
+
+def normalize_command(command: str) -> str:
+    """Lowercases a command and collapses its whitespace.
+
+    Trivially different phrasings of a command share a cache key.
+    """
+    return " ".join(command.lower().split()).strip(" .!?")
+
+
+def _terms(text: str) -> list[str]:
+    return [
+        word[:STEM_LENGTH]
+        for word in WORD.findall(text.lower())
+        if word not in STOPWORDS
+    ]
+
+
+class TTLCache:
+    """A least recently used cache whose entries expire after `ttl` seconds."""
+
+    def __init__(
+        self, maxsize: int = COMMAND_CACHE_SIZE, ttl: float = COMMAND_CACHE_TTL
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class IntentClassifier:
+    """Picks the tool for a command by TF-IDF over the tools' descriptions.
+
+    Each tool is described by its name, description, parameters and
+    keywords.
+
+    A tool's score is the share of the command's weight that its terms
+    explain, and the confidence is how far the best tool is ahead of the
+    runner-up, so ambiguous commands come out with a low confidence.
+    """
+
+    def __init__(self, tools: dict[str, dict[str, Any]]):
+        self.tools = tools
+        documents = {
+            name: set(
+                _terms(
+                    " ".join(
+                        [
+                            name.replace("_", " "),
+                            info["description"],
+                            " ".join(info["params"]).replace("_", " "),
+                            TOOL_KEYWORDS.get(name, ""),
+                        ]
+                    )
+                )
+            )
+            for name, info in tools.items()
+        }
+        document_frequency = Counter(
+            term for terms in documents.values() for term in terms
+        )
+        self.idf = {
+            term: math.log((1 + len(documents)) / (1 + count)) + 1
+            for term, count in document_frequency.items()
+        }
+        # Words no tool knows about still count against every tool
+        self.unknown_weight = max(self.idf.values(), default=1.0)
+        self.documents = documents
+
+    def scores(self, command: str) -> dict[str, float]:
+        command = FILE_PATH.sub(" ", QUOTED.sub(" ", command))
+        terms = Counter(_terms(command))
+        total = sum(
+            count * self.idf.get(term, self.unknown_weight)
+            for term, count in terms.items()
+        )
+        if not total:
+            return {name: 0.0 for name in self.documents}
+        return {
+            name: sum(
+                count * self.idf[term]
+                for term, count in terms.items()
+                if term in document
+            )
+            / total
+            for name, document in self.documents.items()
+        }
+
+    def classify(self, command: str) -> dict[str, Any]:
+        """Returns the best tool, its parameters and the confidence.
+
+        The result has the same shape as the LLM's answer.
+        """
+        ranked = sorted(
+            self.scores(command).items(), key=lambda item: item[1], reverse=True
+        )
+        (tool, best), (_, runner_up) = ranked[0], ranked[1]
+        return {
+            "tool": tool if best > 0 else None,
+            "params": self.extract_params(tool, command),
+            "confidence": round(best - runner_up, 3),
+            "explanation": f"Matched the command to {tool} locally",
+        }
+
+    def extract_params(self, tool: str, command: str) -> dict[str, str]:
+        """Fills a tool's path and name parameters from the command.
+
+        Paths come from file paths in the command, and names from quoted text.
+        """
+        params = {}
+        paths = FILE_PATH.findall(command)
+        quoted = QUOTED.findall(command)
+        for param in self.tools[tool]["params"]:
+            if ("path" in param or "file" in param) and paths:
+                params[param] = paths.pop(0)
+            elif ("name" in param or param == "query") and quoted:
+                params[param] = quoted.pop(0)
+        return params
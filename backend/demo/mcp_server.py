@@ -1,17 +1,41 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import os
-import glob
 import httpx
 from typing import List, Dict, Any, Optional
 import json
 from pathlib import Path
 import re
 import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
 
-app = FastAPI()
+from chunking import chunk_code, merge_analyses
+from code_analysis import analyze_python
+from code_graph import CodeGraph, ModuleIndex
+from intents import INTENT_CONFIDENCE_THRESHOLD, IntentClassifier, TTLCache, normalize_command
+from scanner import read_files, scan_files
+from symbol_index import SymbolIndex, query_words
+from workspaces import DEFAULT_SESSION, Workspace, WorkspaceStore, read_content
+
+# One pooled client for every LLM request, analyses and commands, so connections are reused
+http_client: Optional[httpx.AsyncClient] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client
+    http_client = httpx.AsyncClient(
+        timeout=30.0,
+        # Analyses are bounded by llm_semaphore, commands are not and shouldn't queue behind them
+        limits=httpx.Limits(max_keepalive_connections=ANALYSIS_CONCURRENCY),
+    )
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,6 +47,10 @@ app.add_middleware(
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "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")
 DEMO_BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+# Code sent to the LLM per request. Larger files are split into several chunks
+ANALYSIS_CHUNK_CHARS = int(os.getenv("ANALYSIS_CHUNK_CHARS", "1500"))
+# LLM requests in flight at once, across every file being analyzed
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "8"))
 
 MCP_TOOLS = {
     "file_reader": {
@@ -59,8 +87,11 @@ MCP_TOOLS = {
     }
 }
 
-file_graph = {}
-current_base_path = None
+llm_semaphore = asyncio.Semaphore(ANALYSIS_CONCURRENCY)
+# Each session, picked with the X-Session-Id header, gets its own workspace
+workspaces = WorkspaceStore()
+command_cache = TTLCache()
+intent_classifier = IntentClassifier(MCP_TOOLS)
 
 class InitializeRequest(BaseModel):
     path: str
@@ -76,6 +107,24 @@ class MCPCommand(BaseModel):
 async def analyze_with_llm(content: str, file_path: str, all_files: List[str]) -> Dict[str, Any]:
     file_name = os.path.basename(file_path)
     file_ext = os.path.splitext(file_name)[1]
+
+    # Python files are analyzed locally from their syntax tree, no LLM call needed
+    if file_ext == ".py":
+        analysis = analyze_python(content, file_path, all_files)
+        if analysis is not None:
+            return analysis
+
+    # The whole file is analyzed, a chunk at a time, and the results merged
+    chunks = chunk_code(content, ANALYSIS_CHUNK_CHARS)
+    analyses = await asyncio.gather(*[
+        analyze_chunk_with_llm(chunk, file_path, all_files, part, len(chunks))
+        for part, chunk in enumerate(chunks, start=1)
+    ])
+    return merge_analyses(analyses)
+
+async def analyze_chunk_with_llm(content: str, file_path: str, all_files: List[str], part: int = 1, parts: int = 1) -> Dict[str, Any]:
+    file_ext = os.path.splitext(file_path)[1]
+    code_label = "Code" if parts == 1 else f"Code (part {part} of {parts})"
     
     prompt = f"""Analyze this code file and extract detailed information. Return ONLY valid JSON.
 
@@ -83,8 +132,8 @@ File: {file_path}
 Extension: {file_ext}
 Available files in project: {[os.path.basename(f) for f in all_files]}
 
-Code (first 1500 chars):
-{content[:1500]}
+{code_label}:
+{content}
 
 Return JSON with these fields:
 - type: "module" or "class" or "component"
@@ -97,8 +146,8 @@ Return JSON with these fields:
 - calls: list of functions/methods this file calls from other files
 """
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(
+    async with llm_semaphore:
+        response = await http_client.post(
             "https://openrouter.ai/api/v1/chat/completions",
             headers={
                 "Authorization": f"Bearer {OPENROUTER_API_KEY}",
@@ -141,10 +190,17 @@ Return JSON with these fields:
         return {"error": "Analysis failed"}
 
 @app.post("/api/mcp/initialize")
-async def initialize_codebase(request: InitializeRequest):
-    global file_graph, current_base_path
-    file_graph = {}  # Clear previous graph
-    base_path = request.path
+async def initialize_codebase(request: InitializeRequest, x_session_id: str = Header(DEFAULT_SESSION)):
+    workspace = workspaces.get(x_session_id)
+    # Initializations of the same session run one after the other
+    async with workspace.lock:
+        return await build_workspace(workspace, request.path)
+
+async def build_workspace(workspace: Workspace, request_path: str) -> Dict[str, Any]:
+    """Analyzes a codebase into a workspace, replacing what it had once done."""
+    file_graph = {}
+    symbol_index = SymbolIndex(read_content)
+    base_path = request_path
     
     # Handle relative paths - make them relative to demo folder
     if not os.path.isabs(base_path):
@@ -156,16 +212,12 @@ async def initialize_codebase(request: InitializeRequest):
     
     if not os.path.exists(base_path):
         # Try as absolute path
-        if not os.path.exists(request.path):
+        if not os.path.exists(request_path):
             # Default to demo folder
             base_path = DEMO_BASE_PATH
     
-    current_base_path = base_path
-    
-    nodes = []
-    edges = []
+    code_graph = CodeGraph()
     node_id = 0
-    node_map = {}
     
     root_node = {
         "id": str(node_id),
@@ -176,36 +228,25 @@ async def initialize_codebase(request: InitializeRequest):
             "type": "folder"
         }
     }
-    nodes.append(root_node)
-    node_map["root"] = str(node_id)
+    code_graph.add_node(root_node)
     node_id += 1
     
-    file_patterns = ["**/*.py", "**/*.js", "**/*.jsx", "**/*.ts", "**/*.tsx", "**/*.json", "**/*.java", "**/*.cpp", "**/*.c", "**/*.h", "**/*.hpp", "**/*.cs", "**/*.rb", "**/*.go", "**/*.rs", "**/*.php", "**/*.swift", "**/*.kt", "**/*.scala", "**/*.r", "**/*.m", "**/*.mm", "**/*.xml", "**/*.yaml", "**/*.yml", "**/*.toml", "**/*.ini", "**/*.cfg", "**/*.conf", "**/*.sh", "**/*.bash", "**/*.zsh", "**/*.fish", "**/*.ps1", "**/*.bat", "**/*.cmd"]
-    files_found = []
+    files_found = await asyncio.to_thread(scan_files, base_path)
+    file_contents = await read_files(files_found)
     
-    for pattern in file_patterns:
-        matches = glob.glob(os.path.join(base_path, pattern), recursive=True)
-        # Filter out files that are not under the requested path
-        for match in matches:
-            if os.path.commonpath([match, base_path]) == base_path:
-                files_found.append(match)
+    # Files are analyzed concurrently, llm_semaphore bounding the requests in flight
+    analyzed_files = [file_path for file_path in files_found if file_contents.get(file_path)]
+    all_files = list(file_contents.keys())
+    analyses = await asyncio.gather(
+        *[analyze_with_llm(file_contents[file_path], file_path, all_files) for file_path in analyzed_files],
+        return_exceptions=True,
+    )
     
-    files_found = files_found[:20]
-    
-    file_contents = {}
-    for file_path in files_found:
+    for file_path, analysis in zip(analyzed_files, analyses):
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                file_contents[file_path] = content
-        except:
-            pass
-    
-    for file_path in files_found:
-        try:
-            content = file_contents.get(file_path, "")
-            if not content:
+            if isinstance(analysis, BaseException):
                 continue
+            content = file_contents[file_path]
                 
             rel_path = os.path.relpath(file_path, base_path)
             file_ext = os.path.splitext(file_path)[1]
@@ -235,8 +276,6 @@ async def initialize_codebase(request: InitializeRequest):
             }.get(file_ext, 'text')
             file_name = os.path.basename(file_path)
             
-            analysis = await analyze_with_llm(content, file_path, list(file_contents.keys()))
-            
             node = {
                 "id": str(node_id),
                 "type": "file",
@@ -245,15 +284,12 @@ async def initialize_codebase(request: InitializeRequest):
                     "path": file_path,
                     "type": file_type,
                     "content": content[:500],
-                    "full_content": content,
                     "analysis": analysis
                 }
             }
-            nodes.append(node)
-            node_map[file_name] = str(node_id)
-            node_map[Path(file_path).stem] = str(node_id)
+            code_graph.add_node(node, file_path)
             
-            edges.append({
+            code_graph.add_edge({
                 "id": f"e-0-{node_id}",
                 "source": "0",
                 "target": str(node_id),
@@ -262,56 +298,67 @@ async def initialize_codebase(request: InitializeRequest):
             
             file_graph[file_path] = {
                 "node_id": str(node_id),
-                "analysis": analysis,
-                "content": content
+                "analysis": analysis
             }
+            symbol_index.add(file_path, content)
             
             node_id += 1
             
         except Exception as e:
             continue
     
-    for node in nodes[1:]:
-        if node["data"].get("analysis"):
-            analysis = node["data"]["analysis"]
-            
-            for imp in analysis.get("imports", []):
-                clean_imp = imp.replace("./", "").replace("../", "").replace(".py", "").replace(".js", "")
-                if clean_imp in node_map and node_map[clean_imp] != node["id"]:
-                    edge_id = f"e-{node['id']}-{node_map[clean_imp]}-import"
-                    if not any(e["id"] == edge_id for e in edges):
-                        edges.append({
-                            "id": edge_id,
-                            "source": node["id"],
-                            "target": node_map[clean_imp],
-                            "type": "imports",
-                            "label": "imports"
-                        })
-            
-            for dep in analysis.get("dependencies", []):
-                clean_dep = dep.replace(".py", "").replace(".js", "")
-                if clean_dep in node_map and node_map[clean_dep] != node["id"]:
-                    edge_id = f"e-{node['id']}-{node_map[clean_dep]}-dep"
-                    if not any(e["id"] == edge_id for e in edges):
-                        edges.append({
-                            "id": edge_id,
-                            "source": node["id"],
-                            "target": node_map[clean_dep],
-                            "type": "depends",
-                            "label": "depends on"
-                        })
+    # Imports and dependencies are resolved by module path, relative to the project
+    rel_paths = {path: os.path.relpath(path, base_path).replace(os.sep, "/") for path in code_graph.path_nodes}
+    modules = ModuleIndex(list(rel_paths.values()))
+    abs_paths = {rel_path: path for path, rel_path in rel_paths.items()}
+    for node in code_graph.nodes[1:]:
+        analysis = node["data"].get("analysis")
+        if not analysis:
+            continue
+        rel_path = rel_paths[node["data"]["path"]]
+        
+        for field, edge_type, label, suffix in [
+            ("imports", "imports", "imports", "import"),
+            ("dependencies", "depends", "depends on", "dep"),
+        ]:
+            for spec in analysis.get(field) or []:
+                if not isinstance(spec, str):
+                    continue
+                target_path = modules.resolve(spec, rel_path)
+                if target_path is None or target_path == rel_path:
+                    continue
+                target = code_graph.path_nodes[abs_paths[target_path]]
+                code_graph.add_edge({
+                    "id": f"e-{node['id']}-{target}-{suffix}",
+                    "source": node["id"],
+                    "target": target,
+                    "type": edge_type,
+                    "label": label
+                })
+    
+    workspace.base_path = base_path
+    workspace.file_graph = file_graph
+    workspace.code_graph = code_graph
+    workspace.symbol_index = symbol_index
     
     return {
-        "nodes": nodes,
-        "edges": edges,
+        "nodes": code_graph.nodes,
+        "edges": code_graph.edges,
         "stats": {
             "filesAnalyzed": len(files_found),
-            "nodesCreated": len(nodes),
-            "edgesCreated": len(edges)
+            "nodesCreated": len(code_graph.nodes),
+            "edgesCreated": len(code_graph.edges)
         }
     }
 
 async def interpret_command(command: str) -> Dict[str, Any]:
+    # Tools picked explicitly, e.g. from the tool menu
+    if command.startswith("/"):
+        name, _, args = command[1:].partition(" ")
+        if name in MCP_TOOLS:
+            params = {MCP_TOOLS[name]["params"][0]: args.strip()} if args.strip() else {}
+            return {"tool": name, "params": params, "confidence": 1.0, "explanation": f"Running {name}"}
+    
     # Quick pattern matching for common commands
     command_lower = command.lower()
     
@@ -330,6 +377,17 @@ async def interpret_command(command: str) -> Dict[str, Any]:
             "explanation": f"Searching codebase for: {query}"
         }
     
+    # Phrasings the LLM has already interpreted
+    key = normalize_command(command)
+    cached = command_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    # Commands that clearly match one tool don't need the LLM
+    interpretation = intent_classifier.classify(command)
+    if interpretation["tool"] and interpretation["confidence"] >= INTENT_CONFIDENCE_THRESHOLD:
+        return interpretation
+    
     prompt = f"""Given this natural language command, determine which MCP tool to use and with what parameters.
 
 Command: {command}
@@ -347,35 +405,36 @@ For search commands, extract the actual search term into params.query
 If the command doesn't match any tool well, return tool: null
 """
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "anthropic/claude-3.5-sonnet-20241022",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.1,
-                "max_tokens": 300
-            }
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            try:
-                content_str = result['choices'][0]['message']['content']
-                json_match = re.search(r'\{.*\}', content_str, re.DOTALL)
-                if json_match:
-                    return json.loads(json_match.group())
-            except:
-                pass
+    response = await http_client.post(
+        "https://openrouter.ai/api/v1/chat/completions",
+        headers={
+            "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+            "Content-Type": "application/json"
+        },
+        json={
+            "model": "anthropic/claude-3.5-sonnet-20241022",
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.1,
+            "max_tokens": 300
+        }
+    )
     
+    if response.status_code == 200:
+        result = response.json()
+        try:
+            content_str = result['choices'][0]['message']['content']
+            json_match = re.search(r'\{.*\}', content_str, re.DOTALL)
+            if json_match:
+                interpretation = json.loads(json_match.group())
+                command_cache.set(key, interpretation)
+                return interpretation
+        except:
+            pass
+
     return {"tool": None, "confidence": 0}
 
 @app.post("/api/mcp/execute")
-async def execute_command(request: MCPCommand):
+async def execute_command(request: MCPCommand, x_session_id: str = Header(DEFAULT_SESSION)):
     interpretation = await interpret_command(request.command)
     
     if not interpretation.get("tool"):
@@ -389,7 +448,7 @@ async def execute_command(request: MCPCommand):
     tool_name = interpretation["tool"]
     params = interpretation.get("params", {})
     
-    global file_graph
+    workspace = workspaces.get(x_session_id)
     
     if tool_name == "search_codebase":
         query = params.get("query", "")
@@ -402,83 +461,13 @@ async def execute_command(request: MCPCommand):
             else:
                 query = request.command.replace("/search_codebase", "").strip()
         
-        # Create search variations intelligently
-        search_terms = set([query.lower()])
-        
-        # Split camelCase and PascalCase
-        camel_split = re.sub('([A-Z])', r' \1', query).strip()
-        search_terms.add(camel_split.lower())
-        
-        # Common variations
-        variations = [
-            query.replace(" ", "_"),
-            query.replace(" ", "-"),
-            query.replace(" ", ""),
-            query.replace("_", " "),
-            query.replace("-", " "),
-            query.upper(),
-            query.lower()
-        ]
-        
-        for var in variations:
-            search_terms.add(var.lower())
-        
-        # Special handling for common patterns
-        if "api" in query.lower() and "key" in query.lower():
-            search_terms.update(["api_key", "apikey", "API_KEY", "APIKEY", "ApiKey", "api-key"])
-        
-        # Add word boundary search for more accurate results
-        word_patterns = [re.compile(r'\b' + re.escape(term) + r'\b', re.I) for term in search_terms]
-        
-        results = {}
-        total_matches = 0
-        
-        # Only search files in the current initialized path
-        for path, data in file_graph.items():
-            if current_base_path and not path.startswith(current_base_path):
-                continue
-                
-            content = data["content"]
-            file_matches = []
-            
-            # First try exact matches with word boundaries
-            for pattern in word_patterns:
-                for match in pattern.finditer(content):
-                    line_num = content[:match.start()].count('\n') + 1
-                    line_start = content.rfind('\n', 0, match.start()) + 1
-                    line_end = content.find('\n', match.end())
-                    if line_end == -1:
-                        line_end = len(content)
-                    
-                    line_text = content[line_start:line_end].strip()
-                    
-                    # Highlight the match
-                    match_text = line_text[:100]
-                    if len(line_text) > 100:
-                        match_text += "..."
-                    
-                    file_matches.append({
-                        "line": line_num,
-                        "text": match_text,
-                        "term": match.group(0),
-                        "context": line_text
-                    })
-                    
-                    total_matches += 1
-                    if total_matches > 50:  # Limit total results
-                        break
-            
-            # Deduplicate by line number
-            seen_lines = set()
-            unique_matches = []
-            for match in file_matches:
-                if match["line"] not in seen_lines:
-                    seen_lines.add(match["line"])
-                    unique_matches.append(match)
-            
-            if unique_matches:
-                results[path] = unique_matches[:5]  # Max 5 matches per file
-        
+        # Looked up in the symbol index, so any casing or joining of the words matches
+        results, total_matches = workspace.symbol_index.search(query)
+        if workspace.base_path:
+            # Only search files in the current initialized path
+            results = {path: matches for path, matches in results.items() if path.startswith(workspace.base_path)}
+            total_matches = sum(len(matches) for matches in results.values())
+
         if results:
             output_lines = [f"Found '{query}' in {len(results)} files ({total_matches} total matches):\n"]
             
@@ -486,7 +475,7 @@ async def execute_command(request: MCPCommand):
             sorted_results = sorted(results.items(), key=lambda x: len(x[1]), reverse=True)
             
             for path, matches in sorted_results[:10]:  # Show top 10 files
-                rel_path = os.path.relpath(path, current_base_path) if current_base_path else path
+                rel_path = os.path.relpath(path, workspace.base_path) if workspace.base_path else path
                 output_lines.append(f"\n📄 {rel_path}:")
                 for match in matches[:3]:  # Show top 3 matches per file
                     output_lines.append(f"  Line {match['line']}: {match['text']}")
@@ -499,27 +488,19 @@ async def execute_command(request: MCPCommand):
                 "status": "success",
                 "output": "\n".join(output_lines),
                 "details": {
-                    "filesAnalyzed": len(file_graph),
+                    "filesAnalyzed": len(workspace.file_graph),
                     "matchesFound": total_matches,
                     "filesWithMatches": len(results),
                     "confidence": interpretation.get("confidence", 0.9)
                 }
             }
         else:
-            # Try fuzzy search if no exact matches
-            fuzzy_results = []
-            for path, data in file_graph.items():
-                if current_base_path and not path.startswith(current_base_path):
-                    continue
-                    
-                content_lower = data["content"].lower()
-                query_lower = query.lower()
-                
-                # Simple fuzzy match - all words from query appear somewhere
-                query_words = query_lower.split()
-                if all(word in content_lower for word in query_words):
-                    rel_path = os.path.relpath(path, current_base_path) if current_base_path else path
-                    fuzzy_results.append(rel_path)
+            # Try fuzzy search if no exact matches, every word starting some word in the file
+            fuzzy_results = [
+                os.path.relpath(path, workspace.base_path) if workspace.base_path else path
+                for path in workspace.symbol_index.prefix_search(query)
+                if not workspace.base_path or path.startswith(workspace.base_path)
+            ]
             
             if fuzzy_results:
                 return {
@@ -528,7 +509,7 @@ async def execute_command(request: MCPCommand):
                     "output": f"No exact matches for '{query}', but found potential matches in:\n" + 
                              "\n".join(f"📄 {f}" for f in fuzzy_results[:5]),
                     "details": {
-                        "filesAnalyzed": len(file_graph),
+                        "filesAnalyzed": len(workspace.file_graph),
                         "matchesFound": 0,
                         "fuzzyMatches": len(fuzzy_results)
                     }
@@ -539,24 +520,21 @@ async def execute_command(request: MCPCommand):
                     "status": "warning",
                     "output": f"No matches found for '{query}'",
                     "details": {
-                        "filesAnalyzed": len(file_graph),
+                        "filesAnalyzed": len(workspace.file_graph),
                         "matchesFound": 0,
-                        "searchTerms": list(search_terms)[:5]
+                        "searchTerms": query_words(query)[:5]
                     }
                 }
     
     elif tool_name == "dependency_mapper":
-        edges_created = 0
-        for path, data in file_graph.items():
-            if data["analysis"].get("imports"):
-                edges_created += len(data["analysis"]["imports"])
+        edges_created = sum(1 for edge in workspace.code_graph.edges if edge["type"] in ("imports", "depends"))
         
         return {
             "tool": tool_name,
             "status": "success",
-            "output": f"Mapped dependencies across {len(file_graph)} files",
+            "output": f"Mapped dependencies across {len(workspace.file_graph)} files",
             "details": {
-                "filesAnalyzed": len(file_graph),
+                "filesAnalyzed": len(workspace.file_graph),
                 "edgesCreated": edges_created,
                 "confidence": interpretation.get("confidence", 0.8)
             }
@@ -568,7 +546,7 @@ async def execute_command(request: MCPCommand):
             "status": "success",
             "output": f"Executed {tool_name} with params: {json.dumps(params)}",
             "details": {
-                "filesAnalyzed": len(file_graph),
+                "filesAnalyzed": len(workspace.file_graph),
                 "confidence": interpretation.get("confidence", 0.8)
             }
         }
@@ -588,20 +566,21 @@ async def get_available_tools():
     }
 
 @app.post("/api/mcp/update")
-async def update_graph(file_path: str):
-    global file_graph
+async def update_graph(file_path: str, x_session_id: str = Header(DEFAULT_SESSION)):
+    workspace = workspaces.get(x_session_id)
     
     if os.path.exists(file_path):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        analysis = await analyze_with_llm(content, file_path, list(file_graph.keys()))
+        content = await asyncio.to_thread(read_content, file_path)
         
-        file_graph[file_path] = {
-            "analysis": analysis,
-            "content": content,
-            "last_updated": datetime.now().isoformat()
-        }
+        async with workspace.lock:
+            analysis = await analyze_with_llm(content, file_path, list(workspace.file_graph.keys()))
+            
+            workspace.file_graph[file_path] = {
+                "node_id": workspace.code_graph.path_nodes.get(file_path),
+                "analysis": analysis,
+                "last_updated": datetime.now().isoformat()
+            }
+            workspace.symbol_index.add(file_path, content)
         
         return {
             "status": "success",
@@ -612,16 +591,22 @@ async def update_graph(file_path: str):
     return {"status": "error", "message": "File not found"}
 
 @app.get("/api/mcp/node/{node_id}")
-async def get_node_details(node_id: str):
-    for path, data in file_graph.items():
-        if data.get("node_id") == node_id:
-            return {
-                "id": node_id,
-                "type": "file",
-                "path": path,
-                "content": data.get("content", ""),
-                "analysis": data.get("analysis", {})
-            }
+async def get_node_details(node_id: str, x_session_id: str = Header(DEFAULT_SESSION)):
+    workspace = workspaces.get(x_session_id)
+    code_graph = workspace.code_graph
+    path = code_graph.node_paths.get(node_id)
+    if path in workspace.file_graph:
+        data = workspace.file_graph[path]
+        neighbors = code_graph.neighbors(node_id)
+        return {
+            "id": node_id,
+            "type": "file",
+            "path": path,
+            "content": await asyncio.to_thread(workspace.content, path),
+            "analysis": data.get("analysis", {}),
+            "dependencies": [code_graph.node_paths[n] for n in dict.fromkeys(neighbors["outgoing"]) if n in code_graph.node_paths],
+            "dependents": [code_graph.node_paths[n] for n in dict.fromkeys(neighbors["incoming"]) if n in code_graph.node_paths]
+        }
     
     return {
         "id": node_id,
@@ -0,0 +1,110 @@
+import asyncio
+import os
+
+SOURCE_EXTENSIONS = {
+    ".py",
+    ".js",
+    ".jsx",
+    ".ts",
+    ".tsx",
+    ".json",
+    ".java",
+    ".cpp",
+    ".c",
+    ".h",
+    ".hpp",
+    ".cs",
+    ".rb",
+    ".go",
+    ".rs",
+    ".php",
+    ".swift",
+    ".kt",
+    ".scala",
+    ".r",
+    ".m",
+    ".mm",
+    ".xml",
+    ".yaml",
+    ".yml",
+    ".toml",
+    ".ini",
+    ".cfg",
+    ".conf",
+    ".sh",
+    ".bash",
+    ".zsh",
+    ".fish",
+    ".ps1",
+    ".bat",
+    ".cmd",
+}
+
+# Dependencies, build output and caches, never walked. Hidden directories
+# are skipped too
+IGNORED_DIRS = {
+    "node_modules",
+    "bower_components",
+    "vendor",
+    "venv",
+    "env",
+    "__pycache__",
+    "dist",
+    "build",
+    "target",
+    "out",
+    "coverage",
+    "site-packages",
+}
+
+
+def scan_files(base_path: str) -> list[str]:
+    """Finds the source files under `base_path` in a single walk, sorted by
+    path.
+
+    Ignored and hidden directories are pruned without being entered, and
+    symlinked directories aren't followed, so every file found is under
+    `base_path`.
+    """
+    files = []
+    stack = [base_path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in IGNORED_DIRS:
+                            stack.append(entry.path)
+                    elif (
+                        os.path.splitext(entry.name)[1] in SOURCE_EXTENSIONS
+                        and entry.is_file()
+                    ):
+                        files.append(entry.path)
+        except OSError:
+            continue
+    return sorted(files)
+
+
+def _read_file(path: str) -> str | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+async def read_files(paths: list[str]) -> dict[str, str]:
+    """Reads files on the default thread pool, skipping any that can't be
+    read as UTF-8.
+    """
+    contents = await asyncio.gather(
+        *[asyncio.to_thread(_read_file, path) for path in paths]
+    )
+    return {
+        path: content
+        for path, content in zip(paths, contents, strict=True)
+        if content is not None
+    }
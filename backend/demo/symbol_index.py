@@ -0,0 +1,216 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from collections.abc import Callable
+from functools import lru_cache
+from typing import Any
+
+IDENTIFIER = re.compile(r"[A-Za-z0-9_$]+")
+# Boundaries inside an identifier, e.g. HTTPServer -> HTTP Server and
+# getURL2 -> get URL 2
+WORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+def split_identifier(identifier: str) -> list[str]:
+    """Splits a camelCase, PascalCase, snake_case or kebab-case name into
+    lowercase words.
+    """
+    return [word.lower() for word in WORD.findall(identifier)]
+
+
+@lru_cache(maxsize=65536)
+def _keys(identifier: str) -> tuple[str, ...]:
+    """Keys an identifier is indexed under.
+
+    Identifiers repeat a lot, so they're memoized.
+    """
+    words = split_identifier(identifier)
+    keys = {identifier.lower(), "".join(words), *words}
+    keys.discard("")
+    return tuple(keys)
+
+
+def query_words(query: str) -> list[str]:
+    words = []
+    for identifier in IDENTIFIER.findall(query):
+        words.extend(split_identifier(identifier))
+    return words
+
+
+class SymbolIndex:
+    """Inverted index from identifiers and their words to where they occur.
+
+    Every identifier is indexed under its full lowercase form, its words joined
+    together (so `api_key`, `apiKey` and `APIKEY` share `apikey`), and each of
+    its words. Postings are identifier offsets, and the line of an offset is
+    found by binary search over the file's line start offsets.
+
+    Contents aren't kept, `read` gets a file's content back when a matching
+    line is shown.
+    """
+
+    def __init__(self, read: Callable[[str], str]):
+        self.read = read
+        self.line_starts: dict[str, array[int]] = {}
+        self.lengths: dict[str, int] = {}
+        # key -> path -> offsets of the identifiers with that key, in order
+        self.postings: dict[str, dict[str, list[int]]] = defaultdict(dict)
+        self.file_keys: dict[str, set[str]] = {}
+        self._sorted_keys: list[str] = []
+        self._keys_dirty = False
+
+    def __len__(self) -> int:
+        return len(self.line_starts)
+
+    def add(self, path: str, content: str):
+        """Indexes a file, replacing any previous version of it."""
+        self.remove(path)
+        self.lengths[path] = len(content)
+        self.line_starts[path] = array(
+            "q", [0] + [m.end() for m in re.finditer("\n", content)]
+        )
+
+        file_postings: dict[str, list[int]] = defaultdict(list)
+        for match in IDENTIFIER.finditer(content):
+            for key in _keys(match.group()):
+                file_postings[key].append(match.start())
+
+        for key, offsets in file_postings.items():
+            self.postings[key][path] = offsets
+        self.file_keys[path] = set(file_postings)
+        self._keys_dirty = True
+
+    def remove(self, path: str):
+        for key in self.file_keys.pop(path, ()):
+            files = self.postings.get(key)
+            if files is not None:
+                files.pop(path, None)
+                if not files:
+                    del self.postings[key]
+        self.lengths.pop(path, None)
+        self.line_starts.pop(path, None)
+        self._keys_dirty = True
+
+    def line_number(self, path: str, offset: int) -> int:
+        return bisect_right(self.line_starts[path], offset)
+
+    def line(self, path: str, number: int, content: str) -> str:
+        starts = self.line_starts[path]
+        end = starts[number] - 1 if number < len(starts) else len(content)
+        return content[starts[number - 1] : end]
+
+    def _cooccurring(self, path: str, words: list[str]) -> list[int]:
+        """Offsets of the rarest word, on lines with every one of `words`."""
+        offsets = [
+            self.postings.get(word, {}).get(path)
+            for word in dict.fromkeys(words)
+        ]
+        if not all(offsets):
+            return []
+        offsets.sort(key=len)
+        rarest, others = offsets[0], offsets[1:]
+        starts = self.line_starts[path]
+        found = []
+        for offset in rarest:
+            number = bisect_right(starts, offset)
+            line_start = starts[number - 1]
+            line_end = (
+                starts[number]
+                if number < len(starts)
+                else self.lengths[path] + 1
+            )
+            if all(
+                (i := bisect_left(other, line_start)) < len(other)
+                and other[i] < line_end
+                for other in others
+            ):
+                found.append(offset)
+        return found
+
+    def search(
+        self, query: str, per_file: int = 5
+    ) -> tuple[dict[str, list[dict[str, Any]]], int]:
+        """Finds the lines that mention `query`, however its words are cased
+        and joined.
+
+        A query of several words also matches lines that have all of them as
+        separate identifiers. Returns up to `per_file` matching lines per file,
+        and the total number of matches.
+        """
+        words = query_words(query)
+        if not words:
+            return {}, 0
+
+        joined = self.postings.get("".join(words), {})
+        paths = set(joined)
+        if len(words) > 1:
+            # Files that have every word, e.g. "api key" or API-KEY
+            paths.update(
+                set.intersection(
+                    *(set(self.postings.get(word, {})) for word in words)
+                )
+            )
+
+        results = {}
+        total = 0
+        for path in paths:
+            offsets = joined.get(path, [])
+            if len(words) > 1:
+                offsets = sorted(
+                    set(offsets).union(self._cooccurring(path, words))
+                )
+            if not offsets:
+                continue
+            total += len(offsets)
+
+            content = self.read(path)
+            matches = []
+            for offset in offsets:
+                number = self.line_number(path, offset)
+                if matches and matches[-1]["line"] == number:
+                    continue
+                if len(matches) == per_file:
+                    break
+                line_text = self.line(path, number, content).strip()
+                match_text = line_text[:100] + (
+                    "..." if len(line_text) > 100 else ""
+                )
+                matches.append(
+                    {
+                        "line": number,
+                        "text": match_text,
+                        "term": term.group()
+                        if (term := IDENTIFIER.match(content, offset))
+                        else query,
+                        "context": line_text,
+                    }
+                )
+            results[path] = matches
+        return results, total
+
+    def prefix_search(self, query: str) -> list[str]:
+        """Files where every word of `query` starts some indexed word.
+
+        Used for fuzzy matches.
+        """
+        words = query_words(query)
+        if not words:
+            return []
+        if self._keys_dirty:
+            self._sorted_keys = sorted(self.postings)
+            self._keys_dirty = False
+
+        matching = None
+        for word in words:
+            files: set[str] = set()
+            i = bisect_left(self._sorted_keys, word)
+            while i < len(self._sorted_keys) and self._sorted_keys[
+                i
+            ].startswith(word):
+                files.update(self.postings[self._sorted_keys[i]])
+                i += 1
+            matching = files if matching is None else matching & files
+            if not matching:
+                return []
+        return sorted(matching)
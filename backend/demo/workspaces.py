@@ -0,0 +1,96 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any
+
+from code_graph import CodeGraph
+from symbol_index import SymbolIndex
+
+# Workspaces kept at once, the least recently used being evicted past it
+WORKSPACE_MAX_SESSIONS = int(os.getenv("WORKSPACE_MAX_SESSIONS", "16"))
+# Seconds a workspace can go unused before it's evicted
+WORKSPACE_IDLE_SECONDS = float(os.getenv("WORKSPACE_IDLE_SECONDS", "1800"))
+# File contents kept in memory, across workspaces
+CONTENT_CACHE_FILES = int(os.getenv("CONTENT_CACHE_FILES", "256"))
+
+DEFAULT_SESSION = "default"
+
+
+@lru_cache(maxsize=CONTENT_CACHE_FILES)
+def _read_cached(path: str, mtime_ns: int, size: int) -> str:
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def read_content(path: str) -> str:
+    """Reads a file's content, from a small cache keyed on the file's mtime
+    and size.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ""
+    return _read_cached(path, stat.st_mtime_ns, stat.st_size)
+
+
+class Workspace:
+    """The analyzed codebase of one session.
+
+    File contents aren't kept here, they're read from disk when needed.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.base_path: str | None = None
+        # path -> {"node_id", "analysis"}
+        self.file_graph: dict[str, dict[str, Any]] = {}
+        self.code_graph = CodeGraph()
+        self.symbol_index = SymbolIndex(read_content)
+        # Held while the workspace is being rebuilt or updated
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+    def content(self, path: str) -> str:
+        return read_content(path)
+
+
+class WorkspaceStore:
+    """Workspaces by session id, evicting the least recently used and idle
+    ones.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = WORKSPACE_MAX_SESSIONS,
+        idle_seconds: float = WORKSPACE_IDLE_SECONDS,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._workspaces: OrderedDict[str, Workspace] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._workspaces)
+
+    def get(self, session_id: str) -> Workspace:
+        """Gets a session's workspace, creating an empty one if needed."""
+        workspace = self._workspaces.get(session_id)
+        if workspace is None:
+            workspace = Workspace(session_id)
+            self._workspaces[session_id] = workspace
+        self._workspaces.move_to_end(session_id)
+        workspace.last_used = time.monotonic()
+        self._evict(keep=session_id)
+        return workspace
+
+    def _evict(self, keep: str):
+        now = time.monotonic()
+        # Oldest first, and workspaces being built are never evicted
+        for session_id, workspace in list(self._workspaces.items()):
+            over_capacity = len(self._workspaces) > self.max_sessions
+            idle = now - workspace.last_used > self.idle_seconds
+            if not (over_capacity or idle):
+                break
+            if session_id != keep and not workspace.lock.locked():
+                del self._workspaces[session_id]
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The demo's modules import each other as top-level modules
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "demo")
+)
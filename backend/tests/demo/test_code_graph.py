@@ -0,0 +1,72 @@
+import pytest
+from code_graph import CodeGraph, ModuleIndex
+
+PATHS = [
+    "app/main.py",
+    "app/util.py",
+    "app/models/__init__.py",
+    "lib/util.py",
+    "web/src/api.ts",
+    "web/src/components/index.js",
+    "src/main/java/com/example/Foo.java",
+]
+
+
+@pytest.fixture
+def modules() -> ModuleIndex:
+    return ModuleIndex(PATHS)
+
+
+@pytest.mark.parametrize(
+    ("spec", "importer", "path"),
+    [
+        ("./api", "web/src/app.ts", "web/src/api.ts"),
+        ("./components", "web/src/app.ts", "web/src/components/index.js"),
+        ("../api.ts", "web/src/components/x.ts", "web/src/api.ts"),
+        ("./missing", "web/src/app.ts", None),
+        (".util", "app/main.py", "app/util.py"),
+        ("..util", "app/models/user.py", "app/util.py"),
+        (".models", "app/main.py", "app/models/__init__.py"),
+        ("app.models", "lib/x.py", "app/models/__init__.py"),
+        ("com.example.Foo", "src/main/java/com/example/Bar.java", PATHS[-1]),
+        ("'web/src/api'", "web/src/app.ts", "web/src/api.ts"),
+        ("requests", "app/main.py", None),
+        ("", "app/main.py", None),
+    ],
+)
+def test_resolve(modules: ModuleIndex, spec: str, importer: str, path):
+    assert modules.resolve(spec, importer) == path
+
+
+def test_same_named_modules_resolve_to_the_closest(modules: ModuleIndex):
+    assert modules.resolve("util", "app/main.py") == "app/util.py"
+    assert modules.resolve("util", "lib/cli.py") == "lib/util.py"
+    # Neither is closer
+    assert modules.resolve("util", "scripts/run.py") is None
+
+
+def test_modules_do_not_resolve_to_themselves(modules: ModuleIndex):
+    assert modules.resolve("api", "web/src/api.ts") is None
+
+
+def test_graph_indexes_edges_both_ways():
+    graph = CodeGraph()
+    for node_id in "abc":
+        graph.add_node({"id": node_id}, path=f"{node_id}.py")
+    assert graph.add_edge(
+        {"id": "ab", "source": "a", "target": "b", "type": "imports"}
+    )
+    assert graph.add_edge(
+        {"id": "ac", "source": "a", "target": "c", "type": "calls"}
+    )
+    assert not graph.add_edge(
+        {"id": "ab", "source": "a", "target": "b", "type": "imports"}
+    )
+
+    assert len(graph.edges) == 2
+    assert graph.path_nodes["b.py"] == "b"
+    assert graph.node_paths["c"] == "c.py"
+    assert graph.neighbors("a") == {"outgoing": ["b", "c"], "incoming": []}
+    assert graph.neighbors("a", "calls") == {"outgoing": ["c"], "incoming": []}
+    assert graph.neighbors("b") == {"outgoing": [], "incoming": ["a"]}
+    assert graph.neighbors("missing") == {"outgoing": [], "incoming": []}
@@ -0,0 +1,116 @@
+import time
+
+import pytest
+from intents import IntentClassifier, TTLCache, normalize_command
+
+# The demo's tools, without importing the server
+TOOLS = {
+    "file_reader": {
+        "description": "Read and analyze file contents",
+        "params": ["path"],
+    },
+    "code_analyzer": {
+        "description": "Deep analysis of code structure and patterns",
+        "params": ["file_path", "analysis_type"],
+    },
+    "dependency_mapper": {
+        "description": "Map dependencies and imports between files",
+        "params": ["source_file", "target_files"],
+    },
+    "search_codebase": {
+        "description": "Search for patterns, functions, or text in codebase",
+        "params": ["query", "file_pattern"],
+    },
+    "ast_parser": {
+        "description": "Parse abstract syntax tree of code",
+        "params": ["file_path", "extract_type"],
+    },
+    "symbol_finder": {
+        "description": "Find symbol definitions and usages",
+        "params": ["symbol_name", "scope"],
+    },
+    "refactor_helper": {
+        "description": "Suggest refactoring opportunities",
+        "params": ["file_path", "refactor_type"],
+    },
+}
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    now = [0.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_normalize_command():
+    assert normalize_command("  Show   me\tMAIN.py!? ") == "show me main.py"
+    assert normalize_command("show me main.py") == "show me main.py"
+
+
+def test_cache_entries_expire(clock: list[float]):
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", {"tool": "file_reader"})
+    clock[0] = 59
+    assert cache.get("a") == {"tool": "file_reader"}
+    clock[0] = 61
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_cache_evicts_least_recently_used(clock: list[float]):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_cache_returns_copies(clock: list[float]):
+    cache = TTLCache()
+    value = {"params": {"path": "a.py"}}
+    cache.set("a", value)
+    value["params"]["path"] = "b.py"
+    cache.get("a")["params"]["path"] = "c.py"
+    assert cache.get("a") == {"params": {"path": "a.py"}}
+
+
+@pytest.mark.parametrize(
+    ("command", "tool", "params"),
+    [
+        (
+            "show me the contents of api/main.py",
+            "file_reader",
+            {"path": "api/main.py"},
+        ),
+        (
+            "find 'get_user' in the codebase",
+            "search_codebase",
+            {"query": "get_user"},
+        ),
+        (
+            "what does utils.py depend on",
+            "dependency_mapper",
+            {"source_file": "utils.py"},
+        ),
+        ("parse the syntax tree of x.py", "ast_parser", {"file_path": "x.py"}),
+    ],
+)
+def test_commands_are_classified(command: str, tool: str, params: dict):
+    intent = IntentClassifier(TOOLS).classify(command)
+    assert intent["tool"] == tool
+    assert intent["params"] == params
+    assert intent["confidence"] >= 0.5
+
+
+def test_unknown_commands_have_no_tool():
+    intent = IntentClassifier(TOOLS).classify("hello there")
+    assert intent["tool"] is None
+    assert intent["confidence"] == 0
+
+
+def test_ambiguous_commands_have_low_confidence():
+    intent = IntentClassifier(TOOLS).classify("refactor and search")
+    assert intent["confidence"] < 0.5
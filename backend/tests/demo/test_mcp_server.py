@@ -0,0 +1,75 @@
+import asyncio
+import json
+from pathlib import Path
+
+import httpx
+import mcp_server
+import pytest
+from mcp_server import ANALYSIS_CONCURRENCY, InitializeRequest
+
+FILES = 30
+
+
+@pytest.fixture
+def project(tmp_path: Path) -> Path:
+    for i in range(FILES):
+        (tmp_path / f"module{i}.js").write_text(f"export const x{i} = {i};\n")
+    return tmp_path
+
+
+async def test_every_file_is_analyzed(
+    project: Path, monkeypatch: pytest.MonkeyPatch
+):
+    analyzed = []
+
+    async def analyze(content: str, file_path: str, all_files: list[str]):
+        analyzed.append(file_path)
+        return {"type": "module", "imports": [], "dependencies": []}
+
+    monkeypatch.setattr(mcp_server, "analyze_with_llm", analyze)
+    result = await mcp_server.initialize_codebase(
+        InitializeRequest(path=str(project)), x_session_id="every-file"
+    )
+    assert len(analyzed) == FILES
+    assert result["stats"]["filesAnalyzed"] == FILES
+    # The root folder, and a node per file
+    assert len(result["nodes"]) == FILES + 1
+
+
+class FakeClient:
+    """
+    Answers every LLM request after a moment, counting how many are in
+    flight at once.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+
+    async def post(self, url: str, **_) -> httpx.Response:
+        self.in_flight += 1
+        self.requests += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.in_flight -= 1
+        content = json.dumps({"type": "module", "imports": []})
+        return httpx.Response(
+            200, json={"choices": [{"message": {"content": content}}]}
+        )
+
+
+async def test_llm_requests_are_bounded(
+    project: Path, monkeypatch: pytest.MonkeyPatch
+):
+    client = FakeClient()
+    monkeypatch.setattr(mcp_server, "http_client", client)
+    result = await mcp_server.initialize_codebase(
+        InitializeRequest(path=str(project)), x_session_id="bounded"
+    )
+    assert client.requests == FILES
+    assert client.max_in_flight == min(FILES, ANALYSIS_CONCURRENCY)
+    analyses = [node["data"]["analysis"] for node in result["nodes"][1:]]
+    assert all(analysis["type"] == "module" for analysis in analyses)
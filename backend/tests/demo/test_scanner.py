@@ -0,0 +1,53 @@
+from pathlib import Path
+
+from scanner import read_files, scan_files
+
+
+def write(root: Path, files: dict[str, str]):
+    for path, contents in files.items():
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_text(contents)
+
+
+def test_scan_files_finds_source_files(tmp_path: Path):
+    write(
+        tmp_path,
+        {
+            "main.py": "",
+            "src/app.ts": "",
+            "src/deep/config.yaml": "",
+            "README.md": "",
+            "node_modules/lib/index.js": "",
+            "build/out.js": "",
+            ".git/hooks/pre-commit.sh": "",
+            "src/.hidden.py": "",
+        },
+    )
+    assert scan_files(str(tmp_path)) == [
+        str(tmp_path / "main.py"),
+        str(tmp_path / "src" / "app.ts"),
+        str(tmp_path / "src" / "deep" / "config.yaml"),
+    ]
+
+
+def test_scan_files_does_not_follow_directory_links(tmp_path: Path):
+    write(tmp_path, {"outside/secret.py": "", "project/main.py": ""})
+    (tmp_path / "project" / "linked").symlink_to(tmp_path / "outside")
+    assert scan_files(str(tmp_path / "project")) == [
+        str(tmp_path / "project" / "main.py")
+    ]
+
+
+def test_scan_files_of_a_missing_directory(tmp_path: Path):
+    assert scan_files(str(tmp_path / "missing")) == []
+
+
+async def test_read_files_skips_unreadable_files(tmp_path: Path):
+    write(tmp_path, {"a.py": "a = 1\n", "b.py": "b = 2\n"})
+    (tmp_path / "binary.py").write_bytes(b"\xff\xfe\x00")
+    paths = [str(tmp_path / name) for name in ("a.py", "binary.py", "b.py")]
+    paths.append(str(tmp_path / "missing.py"))
+    assert await read_files(paths) == {
+        paths[0]: "a = 1\n",
+        paths[2]: "b = 2\n",
+    }
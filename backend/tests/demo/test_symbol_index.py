@@ -0,0 +1,92 @@
+import pytest
+from symbol_index import SymbolIndex, query_words, split_identifier
+
+FILES = {
+    "client.py": "API_KEY = load()\n\ndef get_api_key():\n    return apiKey\n",
+    "server.py": "class HTTPServer:\n    key = api.key\n",
+    "notes.md": "The api is documented here.\n",
+}
+
+
+@pytest.fixture
+def files() -> dict[str, str]:
+    return dict(FILES)
+
+
+@pytest.fixture
+def index(files: dict[str, str]) -> SymbolIndex:
+    index = SymbolIndex(files.__getitem__)
+    for path, content in files.items():
+        index.add(path, content)
+    return index
+
+
+@pytest.mark.parametrize(
+    ("identifier", "words"),
+    [
+        ("apiKey", ["api", "key"]),
+        ("API_KEY", ["api", "key"]),
+        ("get-api-key", ["get", "api", "key"]),
+        ("HTTPServer", ["http", "server"]),
+        ("getURL2", ["get", "url", "2"]),
+    ],
+)
+def test_split_identifier(identifier: str, words: list[str]):
+    assert split_identifier(identifier) == words
+
+
+def test_query_words():
+    assert query_words("apiKey, HTTP-server") == [
+        "api",
+        "key",
+        "http",
+        "server",
+    ]
+    assert query_words("...") == []
+
+
+def test_search_matches_any_casing(index: SymbolIndex):
+    results, total = index.search("apiKey")
+    assert sorted(results) == ["client.py", "server.py"]
+    assert [match["line"] for match in results["client.py"]] == [1, 3, 4]
+    assert results["client.py"][0]["term"] == "API_KEY"
+    assert results["client.py"][2]["text"] == "return apiKey"
+    # "api.key" has both words on one line
+    assert [match["line"] for match in results["server.py"]] == [2]
+    assert total == 4
+
+
+def test_search_single_words(index: SymbolIndex):
+    results, _ = index.search("server")
+    assert list(results) == ["server.py"]
+    assert results["server.py"][0]["term"] == "HTTPServer"
+    assert index.search("missing") == ({}, 0)
+    assert index.search("") == ({}, 0)
+
+
+def test_search_limits_lines_per_file(index: SymbolIndex):
+    results, total = index.search("api key", per_file=1)
+    assert len(results["client.py"]) == 1
+    assert total == 4
+
+
+def test_prefix_search(index: SymbolIndex):
+    assert index.prefix_search("ser") == ["server.py"]
+    assert index.prefix_search("ap") == ["client.py", "notes.md", "server.py"]
+    assert index.prefix_search("ap doc") == ["notes.md"]
+    assert index.prefix_search("zzz") == []
+
+
+def test_files_can_be_replaced_and_removed(
+    index: SymbolIndex, files: dict[str, str]
+):
+    files["client.py"] = "token = None\n"
+    index.add("client.py", files["client.py"])
+    assert "client.py" not in index.search("apiKey")[0]
+    assert list(index.search("token")[0]) == ["client.py"]
+
+    index.remove("server.py")
+    assert len(index) == 2
+    assert index.search("apiKey") == ({}, 0)
+    assert index.prefix_search("ser") == []
+    assert "httpserver" not in index.postings
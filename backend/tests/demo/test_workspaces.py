@@ -0,0 +1,70 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+import workspaces
+from workspaces import WorkspaceStore, read_content
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    now = [0.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_store_reuses_workspaces(clock: list[float]):
+    store = WorkspaceStore(max_sessions=2)
+    workspace = store.get("a")
+    assert store.get("a") is workspace
+    assert workspace.session_id == "a"
+    assert len(store) == 1
+
+
+def test_least_recently_used_workspaces_are_evicted(clock: list[float]):
+    store = WorkspaceStore(max_sessions=2)
+    a = store.get("a")
+    store.get("b")
+    # Using "a" makes "b" the least recently used
+    store.get("a")
+    store.get("c")
+    assert len(store) == 2
+    assert store.get("a") is a
+    assert len(store) == 2
+
+
+def test_idle_workspaces_are_evicted(clock: list[float]):
+    store = WorkspaceStore(max_sessions=10, idle_seconds=60)
+    a = store.get("a")
+    clock[0] = 30
+    b = store.get("b")
+    clock[0] = 70
+    store.get("c")
+    assert len(store) == 2
+    assert store.get("b") is b
+    assert store.get("a") is not a
+
+
+async def test_workspaces_being_built_are_kept(clock: list[float]):
+    store = WorkspaceStore(max_sessions=1)
+    a = store.get("a")
+    async with a.lock:
+        store.get("b")
+        assert len(store) == 2
+    store.get("b")
+    assert len(store) == 1
+
+
+def test_read_content_follows_changes(tmp_path: Path):
+    path = tmp_path / "a.py"
+    path.write_text("a = 1\n")
+    assert read_content(str(path)) == "a = 1\n"
+    assert read_content(str(path)) == "a = 1\n"
+    hits = workspaces._read_cached.cache_info().hits
+
+    path.write_text("a = 22\n")
+    os.utime(path, ns=(0, 10**9))
+    assert read_content(str(path)) == "a = 22\n"
+    assert workspaces._read_cached.cache_info().hits == hits
+    assert read_content(str(tmp_path / "missing.py")) == ""
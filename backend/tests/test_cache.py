@@ -0,0 +1,86 @@
+import itertools
+import json
+import time
+from pathlib import Path
+
+import pytest
+from langchain_community.graphs.graph_document import GraphDocument, Node
+from langchain_core.documents import Document
+
+from api.cache import ExtractionCache
+
+SOURCE = Document(page_content="contents", metadata={"filename": "f.py"})
+
+
+def extraction(node_id: str) -> GraphDocument:
+    return GraphDocument(
+        nodes=[Node(id=node_id, type="Concept")],
+        relationships=[],
+        source=SOURCE,
+    )
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch: pytest.MonkeyPatch):
+    # Every access is a tick later, so recency never ties
+    ticks = itertools.count(1)
+    monkeypatch.setattr(time, "time", lambda: float(next(ticks)))
+
+
+@pytest.fixture
+def open_cache(tmp_path: Path):
+    caches: list[ExtractionCache] = []
+
+    def open_cache(**bounds) -> ExtractionCache:
+        caches.append(ExtractionCache(tmp_path / "cache.sqlite3", **bounds))
+        return caches[-1]
+
+    yield open_cache
+    for cache in caches:
+        cache.close()
+
+
+def test_keys_depend_on_model_and_prompt():
+    key = ExtractionCache.key("contents", "model", "1")
+    assert key == ExtractionCache.key("contents", "model", "1")
+    assert key != ExtractionCache.key("contents", "other model", "1")
+    assert key != ExtractionCache.key("contents", "model", "2")
+    assert key != ExtractionCache.key("other contents", "model", "1")
+
+
+def test_hits_reattach_the_source(open_cache):
+    cache = open_cache()
+    cache.put("key", extraction("a"))
+    source = Document(page_content="contents", metadata={"filename": "g.py"})
+    hit = cache.get("key", source)
+    assert hit is not None
+    assert [node.id for node in hit.nodes] == ["a"]
+    assert hit.source is source
+    assert cache.get("missing", source) is None
+
+
+def test_least_recently_used_entries_are_evicted(open_cache):
+    cache = open_cache(max_entries=2)
+    cache.put("a", extraction("a"))
+    cache.put("b", extraction("b"))
+    # Using "a" makes "b" the least recently used
+    assert cache.get("a", SOURCE) is not None
+    cache.put("c", extraction("c"))
+    assert cache.get("b", SOURCE) is None
+    assert cache.get("a", SOURCE) is not None
+    assert cache.get("c", SOURCE) is not None
+
+
+def test_entries_are_evicted_by_size(open_cache):
+    size = len(json.dumps(extraction("a").model_dump(exclude={"source"})))
+    cache = open_cache(max_bytes=size * 2 + 10)
+    for key in "abc":
+        cache.put(key, extraction(key))
+    assert cache.get("a", SOURCE) is None
+    assert cache.get("b", SOURCE) is not None
+    assert cache.get("c", SOURCE) is not None
+
+
+def test_entries_persist_across_opens(open_cache):
+    open_cache().put("a", extraction("a"))
+    assert open_cache().get("a", SOURCE) is not None
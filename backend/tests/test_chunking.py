@@ -0,0 +1,83 @@
+from langchain_community.graphs.graph_document import (
+    GraphDocument,
+    Node,
+    Relationship,
+)
+from langchain_core.documents import Document
+
+from api.chunking import estimate_tokens, merge_chunks, split_document
+
+
+def function(name: str, lines: int) -> str:
+    body = "".join(f"    x{i} = {i}\n" for i in range(lines))
+    return f"def {name}():\n{body}\n\n"
+
+
+def test_small_documents_are_not_split():
+    document = Document(page_content="x = 1\n", metadata={"filename": "a.py"})
+    assert split_document(document, max_tokens=10) == [document]
+
+
+def test_python_splits_on_definitions():
+    contents = "import os\n\n\n" + "".join(
+        function(name, 10) for name in ("first", "second", "third")
+    )
+    document = Document(
+        page_content=contents, metadata={"filename": "a.py", "project": "p"}
+    )
+    chunks = split_document(document, max_tokens=50)
+
+    assert len(chunks) > 1
+    assert "".join(chunk.page_content for chunk in chunks) == contents
+    for index, chunk in enumerate(chunks):
+        assert estimate_tokens(chunk.page_content) <= 50
+        assert chunk.metadata["project"] == "p"
+        assert chunk.metadata["chunk"] == index
+        assert chunk.metadata["chunks"] == len(chunks)
+    # Every definition starts a chunk, on the line it's on
+    lines = contents.splitlines()
+    for chunk in chunks[1:]:
+        first_line = chunk.page_content.lstrip("\n").splitlines()[0]
+        assert first_line.startswith("def ")
+        assert lines[chunk.metadata["start_line"] - 1] == first_line
+
+
+def test_unknown_languages_split_on_lines():
+    contents = "".join(f"line {i}\n" for i in range(100))
+    document = Document(page_content=contents, metadata={"filename": "a.txt"})
+    chunks = split_document(document, max_tokens=40)
+    assert len(chunks) > 1
+    assert "".join(chunk.page_content for chunk in chunks) == contents
+    assert chunks[0].metadata["start_line"] == 1
+
+
+def test_merge_chunks_dedupes_nodes_and_relationships():
+    document = Document(page_content="", metadata={"filename": "a.py"})
+    a = Node(id="a", type="Function", properties={"name": "a", "lines": 1})
+    b = Node(id="b", type="Function")
+    first = GraphDocument(
+        nodes=[a, b],
+        relationships=[Relationship(source=a, target=b, type="CALLS")],
+        source=Document(page_content="first"),
+    )
+    a_again = Node(id="a", type="Function", properties={"lines": 2})
+    second = GraphDocument(
+        nodes=[a_again, Node(id="a", type="Class")],
+        relationships=[
+            Relationship(source=a_again, target=b, type="CALLS"),
+            Relationship(source=b, target=a_again, type="CALLS"),
+        ],
+        source=Document(page_content="second"),
+    )
+
+    merged = merge_chunks(document, [first, second])
+    assert merged.source is document
+    nodes = {(node.id, node.type): node for node in merged.nodes}
+    assert set(nodes) == {("a", "Function"), ("b", "Function"), ("a", "Class")}
+    assert nodes["a", "Function"].properties == {"name": "a", "lines": 2}
+    # The chunks' own nodes are left as they were
+    assert a.properties == {"name": "a", "lines": 1}
+    assert {
+        (rel.source.id, rel.type, rel.target.id) for rel in merged.relationships
+    } == {("a", "CALLS", "b"), ("b", "CALLS", "a")}
+    assert len(merged.relationships) == 2
@@ -0,0 +1,33 @@
+import pytest
+
+from api.common import ProviderRegistry
+
+
+async def test_registry_shares_one_llm_per_model(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test")
+    registry = ProviderRegistry()
+    llm = registry.llm("openrouter", "model")
+    assert registry.llm("openrouter", "model") is llm
+    assert registry.llm("openrouter", "other model") is not llm
+    clients = list(registry._http_clients)
+    assert len(clients) == 2
+
+    await registry.aclose()
+    assert all(client.is_closed for client in clients)
+    assert registry.llm("openrouter", "model") is not llm
+    await registry.aclose()
+
+
+def test_registry_rejects_unknown_providers():
+    with pytest.raises(ValueError, match="Unknown LLM provider"):
+        ProviderRegistry().llm("unknown", "model")
+
+
+def test_registry_requires_api_keys(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    registry = ProviderRegistry()
+    with pytest.raises(ValueError, match="GEMINI_API_KEY"):
+        registry.llm("gemini", "model")
+    assert not registry._llms
@@ -0,0 +1,72 @@
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import pytest
+from langchain_community.graphs.graph_document import GraphDocument
+
+from api.documents import load_project
+from api.extractors import IMPORTS, MODULE, CodeExtractor
+from api.sources import GithubArchiveSource
+
+URL = "https://github.com/example/FastCTX"
+
+FILES = {
+    "backend/api/__init__.py": "",
+    "backend/api/common.py": "logger = None\n",
+    "backend/api/main.py": "from api.common import logger\n",
+}
+
+
+class FakeGraph:
+    async def query(self, query: str, params=None, **_) -> list[Any]:
+        return []
+
+
+class FakeWriter:
+    def __init__(self):
+        self.written: list[GraphDocument] = []
+
+    async def ensure_constraints(self, labels: list[str]):
+        pass
+
+    async def write(self, graph_documents: list[GraphDocument]):
+        self.written.extend(graph_documents)
+
+
+async def test_github_imports_resolve_to_defining_modules(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    async def download(url: str, dest_file: os.PathLike, ref=None):
+        # GitHub puts every file under a <repo>-<ref>/ directory
+        with zipfile.ZipFile(dest_file, "w") as archive:
+            for name, contents in FILES.items():
+                archive.writestr(f"FastCTX-main/{name}", contents)
+
+    monkeypatch.setattr("api.sources.download_github_project", download)
+    writer = FakeWriter()
+    extractor = CodeExtractor(ThreadPoolExecutor(1))
+    try:
+        await load_project(
+            GithubArchiveSource(URL),
+            None,
+            FakeGraph(),
+            None,
+            writer,
+            extractor,
+        )
+    finally:
+        extractor.close()
+
+    filenames = {
+        graph_document.source.metadata["filename"]
+        for graph_document in writer.written
+    }
+    assert filenames == set(FILES)
+    nodes = [node for doc in writer.written for node in doc.nodes]
+    relationships = [rel for doc in writer.written for rel in doc.relationships]
+    modules = {node.id for node in nodes if node.type == MODULE}
+    imported = {rel.target.id for rel in relationships if rel.type == IMPORTS}
+    assert imported == {f"{URL}:backend.api.common"}
+    assert imported <= modules
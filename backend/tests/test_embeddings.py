@@ -0,0 +1,157 @@
+import math
+
+from langchain_community.graphs.graph_document import GraphDocument, Node
+from langchain_core.documents import Document
+
+from api.embeddings import (
+    CHUNKS_QUERY,
+    EmbeddingIndexer,
+    HashingEmbeddings,
+    _features,
+)
+from api.extractors import CLASS, FUNCTION, MODULE
+
+
+def cosine(a: list[float], b: list[float]) -> float:
+    return sum(x * y for x, y in zip(a, b, strict=True))
+
+
+def test_features_split_identifiers():
+    features = _features("def parse_args(self): return parseArgs")
+    assert features["parse"] == 2
+    assert features["args"] == 2
+    assert features["parse_args"] == 1
+    assert features["parseargs"] == 1
+    # Stopwords are left out, and single words aren't counted twice
+    assert "def" not in features
+    assert "self" not in features
+    assert features["#<pa"] > 0
+
+
+def test_embeddings_are_normalized_and_deterministic():
+    embeddings = HashingEmbeddings(dimensions=64)
+    vector = embeddings.embed_query("class ExtractionCache")
+    assert len(vector) == 64
+    assert math.isclose(math.fsum(value * value for value in vector), 1.0)
+    assert (
+        HashingEmbeddings(dimensions=64).embed_query("class ExtractionCache")
+        == vector
+    )
+
+
+def test_empty_text_gets_a_zero_vector():
+    assert not any(HashingEmbeddings(dimensions=16).embed_query("?? 1 + 2"))
+
+
+def test_shared_vocabulary_is_closer():
+    embeddings = HashingEmbeddings()
+    query, related, unrelated = embeddings.embed_documents(
+        [
+            "how is the cursor decoded",
+            "def decode_cursor(cursor): ...",
+            "async def write_batch(batch): ...",
+        ]
+    )
+    assert cosine(query, related) > cosine(query, unrelated)
+    # Trigrams match words by their parts
+    parse, parser, write = embeddings.embed_documents(
+        ["parse", "parser", "write"]
+    )
+    assert cosine(parse, parser) > cosine(parse, write)
+
+
+class FakeWriter:
+    def __init__(self):
+        self.batches: list[tuple[str, list[dict]]] = []
+
+    async def run_batched(self, query: str, rows: list[dict]):
+        self.batches.append((query, rows))
+
+
+SOURCE = '''\
+class Cursor:
+    """Points into a page of results."""
+
+    def decode(self):
+        return 1
+'''
+
+
+def code_document(metadata: dict) -> GraphDocument:
+    return GraphDocument(
+        nodes=[
+            Node(
+                id="proj:mod.Cursor",
+                type=CLASS,
+                properties={
+                    "name": "Cursor",
+                    "docstring": "Points into a page of results.",
+                    "lineno": 1,
+                    "end_lineno": 5,
+                },
+            ),
+            Node(
+                id="proj:mod.Cursor.decode",
+                type=FUNCTION,
+                properties={"name": "decode", "lineno": 4, "end_lineno": 5},
+            ),
+            Node(id="proj:mod", type=MODULE, properties={"name": "mod"}),
+        ],
+        relationships=[],
+        source=Document(page_content=SOURCE, metadata=metadata),
+    )
+
+
+METADATA = {"id": "proj:mod.py", "filename": "mod.py", "project": "proj"}
+
+
+def test_chunk_rows():
+    indexer = EmbeddingIndexer(FakeWriter(), HashingEmbeddings())
+    (row,) = indexer.chunk_rows(code_document(METADATA))
+    assert row["document"] == "proj:mod.py"
+    assert row["id"] == "proj:mod.py#0"
+    assert row["text"] == "mod.py\n" + SOURCE
+    assert row["properties"]["project"] == "proj"
+    assert row["properties"]["start_line"] == 1
+    assert row["properties"]["end_line"] == 5
+    # Documents that weren't written have nothing to hang chunks off
+    assert indexer.chunk_rows(code_document({"filename": "mod.py"})) == []
+
+
+def test_symbol_rows():
+    indexer = EmbeddingIndexer(FakeWriter(), HashingEmbeddings())
+    cursor, decode = indexer.symbol_rows(code_document(METADATA))
+    assert cursor["label"] == CLASS
+    assert cursor["text"].startswith(
+        "class Cursor\nPoints into a page of results.\nclass Cursor:"
+    )
+    assert decode == {
+        "id": "proj:mod.Cursor.decode",
+        "label": FUNCTION,
+        "text": "function decode\n    def decode(self):\n        return 1",
+    }
+
+
+async def test_index_writes_chunks_and_symbols():
+    writer = FakeWriter()
+    indexer = EmbeddingIndexer(writer, HashingEmbeddings(dimensions=16))
+    assert await indexer.index([code_document(METADATA)]) == 3
+    (chunks_query, chunks), *symbols = writer.batches
+    assert chunks_query == CHUNKS_QUERY
+    assert [row["id"] for row in chunks] == ["proj:mod.py#0"]
+    assert len(chunks[0]["embedding"]) == 16
+    assert "text" not in chunks[0]
+    labels = {query.split("`")[1]: rows for query, rows in symbols}
+    assert [row["id"] for row in labels[CLASS]] == ["proj:mod.Cursor"]
+    assert [row["id"] for row in labels[FUNCTION]] == ["proj:mod.Cursor.decode"]
+
+
+async def test_index_failures_are_not_raised():
+    class BrokenEmbeddings(HashingEmbeddings):
+        async def aembed_documents(self, texts: list[str]):
+            raise RuntimeError("Quota exceeded.")
+
+    writer = FakeWriter()
+    indexer = EmbeddingIndexer(writer, BrokenEmbeddings())
+    assert await indexer.index([code_document(METADATA)]) == 0
+    assert writer.batches == []
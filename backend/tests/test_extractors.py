@@ -0,0 +1,176 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+
+from api.extractors import (
+    CALLS,
+    CLASS,
+    DEFINES,
+    FILE,
+    FUNCTION,
+    IMPORTS,
+    MODULE,
+    CodeExtractor,
+    ModuleIndex,
+    extract_python,
+    module_name,
+    resolve_imports,
+)
+
+FILENAMES = [
+    "backend/api/__init__.py",
+    "backend/api/common.py",
+    "backend/api/mod.py",
+    "backend/api/sub/helpers.py",
+    "backend/tests/common.py",
+    "README.md",
+]
+
+SOURCE = '''\
+"""A module."""
+import os
+from api.common import logger
+from . import common
+from .sub.helpers import helper
+from ..tests import common as test_common
+
+
+def top():
+    return helper()
+
+
+class Thing:
+    def method(self):
+        return self.other() + top()
+
+    def other(self):
+        return len([])
+'''
+
+
+def imports(rows) -> set[str]:
+    return {
+        target for _, _, rel_type, target, _ in rows[1] if rel_type == IMPORTS
+    }
+
+
+def test_module_name():
+    assert module_name("backend/api/mod.py") == ("backend.api.mod", False)
+    assert module_name("backend/api/__init__.py") == ("backend.api", True)
+
+
+def test_relative_imports_resolve_against_the_package():
+    rows = extract_python("backend/api/mod.py", SOURCE, "proj")
+    assert imports(rows) == {
+        "proj:os",
+        "proj:api.common",
+        "proj:backend.api.common",
+        "proj:backend.api.sub.helpers",
+        "proj:backend.tests",
+    }
+
+
+def test_relative_imports_from_a_package():
+    rows = extract_python("backend/api/__init__.py", "from . import mod\n")
+    assert imports(rows) == {"backend.api.mod"}
+
+
+def test_calls_resolve_within_the_module():
+    node_rows, relationship_rows = extract_python(
+        "backend/api/mod.py", SOURCE, "proj"
+    )
+    types = {node_id: node_type for node_id, node_type, _ in node_rows}
+    assert types["proj:backend.api.mod.Thing"] == CLASS
+    assert types["proj:backend.api.mod.Thing.method"] == FUNCTION
+    assert types["proj:backend/api/mod.py"] == FILE
+    calls = {
+        (source, target)
+        for source, _, rel_type, target, _ in relationship_rows
+        if rel_type == CALLS
+    }
+    # helper() is imported, and len() a builtin, so neither resolves
+    assert calls == {
+        (
+            "proj:backend.api.mod.Thing.method",
+            "proj:backend.api.mod.Thing.other",
+        ),
+        ("proj:backend.api.mod.Thing.method", "proj:backend.api.mod.top"),
+    }
+    assert (
+        "proj:backend.api.mod.Thing",
+        CLASS,
+        DEFINES,
+        "proj:backend.api.mod.Thing.method",
+        FUNCTION,
+    ) in relationship_rows
+
+
+def test_syntax_errors_are_not_extracted():
+    assert extract_python("broken.py", "def (:\n") is None
+
+
+def test_module_index_resolves_by_suffix():
+    modules = ModuleIndex(FILENAMES)
+    assert modules.resolve("api.common", "backend.api.mod") == (
+        "backend.api.common"
+    )
+    assert modules.resolve("backend.api", "backend.api.mod") == "backend.api"
+    assert modules.resolve("sub.helpers", "backend.api.mod") == (
+        "backend.api.sub.helpers"
+    )
+    assert modules.resolve("os", "backend.api.mod") is None
+    assert modules.resolve("README", "backend.api.mod") is None
+
+
+def test_module_index_prefers_the_nearest_module():
+    modules = ModuleIndex(FILENAMES)
+    assert modules.resolve("common", "backend.api.mod") == "backend.api.common"
+    assert modules.resolve("common", "backend.tests.test_x") == (
+        "backend.tests.common"
+    )
+    # Equally close to both
+    assert modules.resolve("common", "backend.run") is None
+
+
+def test_absolute_imports_resolve_against_the_project():
+    rows = extract_python("backend/api/mod.py", SOURCE, "proj")
+    rows = resolve_imports(
+        rows, "backend/api/mod.py", ModuleIndex(FILENAMES), "proj"
+    )
+    assert imports(rows) == {
+        "proj:os",
+        "proj:backend.api.common",
+        "proj:backend.api.sub.helpers",
+        "proj:backend.tests",
+    }
+    modules = {
+        node_id: properties["name"]
+        for node_id, node_type, properties in rows[0]
+        if node_type == MODULE
+    }
+    assert "proj:api.common" not in modules
+    assert modules["proj:backend.api.common"] == "backend.api.common"
+    # Both imports of backend.api.common became one relationship
+    assert len(rows[1]) == len(set(rows[1]))
+
+
+async def test_code_extractor_resolves_imports():
+    extractor = CodeExtractor(ThreadPoolExecutor(1))
+    document = Document(
+        page_content=SOURCE,
+        metadata={"filename": "backend/api/mod.py", "project": "proj"},
+    )
+    try:
+        graph_document = await extractor.extract(
+            document, ModuleIndex(FILENAMES)
+        )
+    finally:
+        extractor.close()
+    assert graph_document is not None
+    imported = {
+        relationship.target.id
+        for relationship in graph_document.relationships
+        if relationship.type == IMPORTS
+    }
+    assert "proj:backend.api.common" in imported
+    assert "proj:api.common" not in imported
@@ -0,0 +1,171 @@
+import os
+import subprocess
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from api.documents import iter_documents, list_files, load_document
+from api.filters import FileFilter, IgnoreRules, SkipReason
+from api.sources import shallow_clone
+
+
+@pytest.fixture
+def outside(tmp_path: Path) -> Path:
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "secret.txt").write_text("secret\n")
+    return outside
+
+
+@pytest.fixture
+def project(tmp_path: Path, outside: Path) -> Path:
+    project = tmp_path / "project"
+    (project / "pkg").mkdir(parents=True)
+    (project / "pkg" / "mod.py").write_text("x = 1\n")
+    (project / "leak.txt").symlink_to(outside / "secret.txt")
+    (project / "linked").symlink_to(outside, target_is_directory=True)
+    (project / "alias.py").symlink_to(project / "pkg" / "mod.py")
+    return project
+
+
+def test_walk_skips_symlinks(project: Path):
+    file_filter = FileFilter()
+    assert list(file_filter.walk(project)) == ["pkg/mod.py"]
+    assert file_filter.counts[SkipReason.SYMLINK] == 3
+
+
+async def test_load_document_refuses_symlinks(project: Path):
+    assert await load_document(str(project / "leak.txt")) is None
+    document = await load_document(str(project / "pkg" / "mod.py"))
+    assert document is not None
+    assert document.page_content == "x = 1\n"
+
+
+async def test_iter_documents_stays_in_root(project: Path):
+    # Paths given explicitly, as from a stale listing, are checked too
+    paths = ["pkg/mod.py", "linked/secret.txt", "../outside/secret.txt"]
+    documents = [
+        document async for document in iter_documents(project, paths=paths)
+    ]
+    assert [document.metadata["filename"] for document in documents] == [
+        "pkg/mod.py"
+    ]
+
+
+async def test_cloned_symlinks_are_skipped(tmp_path: Path, outside: Path):
+    repository = tmp_path / "repository"
+    repository.mkdir()
+    (repository / "main.py").write_text("print('hi')\n")
+    (repository / "leak.txt").symlink_to(outside / "secret.txt")
+    os.symlink("/etc/passwd", repository / "passwd")
+    git = ["git", "-C", str(repository), "-c", "user.name=test"]
+    git += ["-c", "user.email=test@example.com"]
+    subprocess.run([*git, "init", "--quiet"], check=True)
+    subprocess.run([*git, "add", "."], check=True)
+    subprocess.run([*git, "commit", "--quiet", "-m", "init"], check=True)
+
+    checkout = tmp_path / "checkout"
+    await shallow_clone(repository.as_uri(), str(checkout))
+    assert (checkout / "passwd").is_symlink()
+    assert await list_files(checkout) == ["main.py"]
+
+
+@pytest.mark.parametrize(
+    ("rules", "path", "is_dir", "ignored"),
+    [
+        ("*.log", "debug.log", False, True),
+        ("*.log", "logs/debug.log", False, True),
+        ("/build", "build", True, True),
+        ("/build", "src/build", True, False),
+        ("docs/*.md", "docs/index.md", False, True),
+        ("docs/*.md", "docs/api/index.md", False, False),
+        ("**/fixtures", "a/b/fixtures", True, True),
+        ("out/", "out", True, True),
+        ("out/", "out", False, False),
+        ("*.py[cod]", "mod.pyc", False, True),
+        ("*.log\n!keep.log", "keep.log", False, False),
+        ("!keep.log\n*.log", "keep.log", False, True),
+        ("\\#notes", "#notes", False, True),
+        ("# a comment\n\n", "# a comment", False, False),
+    ],
+)
+def test_ignore_rules(rules: str, path: str, is_dir: bool, ignored: bool):
+    ignore_rules = IgnoreRules()
+    ignore_rules.add(rules)
+    assert ignore_rules.match(path, is_dir) is ignored
+
+
+def test_ignore_rules_in_subdirectories():
+    ignore_rules = IgnoreRules()
+    ignore_rules.add("*.tmp\n/local", base="src")
+    assert ignore_rules.match("src/a.tmp")
+    assert ignore_rules.match("src/deep/a.tmp")
+    assert not ignore_rules.match("a.tmp")
+    assert ignore_rules.match("src/local", is_dir=True)
+    assert not ignore_rules.match("src/deep/local", is_dir=True)
+
+
+def test_ignored_directories_ignore_their_files():
+    ignore_rules = IgnoreRules()
+    ignore_rules.add("node_modules/")
+    assert ignore_rules.ignores("web/node_modules/react/index.js")
+    assert not ignore_rules.ignores("web/src/index.js")
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    files = {
+        ".gitignore": "*.log\nsecrets/\n",
+        "src/.gitignore": "!keep.log\n",
+        "src/main.py": "print('hi')\n",
+        "src/keep.log": "kept\n",
+        "debug.log": "ignored\n",
+        "secrets/key.txt": "ignored\n",
+        "node_modules/lib/index.js": "generated\n",
+        "app.min.js": "generated\n",
+        "bundle.js": "x" * 2000 + "\n",
+        "proto_pb2.py": "# Generated by the protocol buffer compiler.\n",
+        "gen.go": "// Code generated by go generate. DO NOT EDIT.\n",
+        "big.txt": "x\n" * 1000,
+    }
+    for path, contents in files.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(contents)
+    (tmp_path / "image.png").write_bytes(b"\x89PNG\r\n\x1a\n\0\0")
+    return tmp_path
+
+
+def test_walk_filters_files(tree: Path):
+    file_filter = FileFilter(max_bytes=1000)
+    assert sorted(file_filter.walk(tree)) == [
+        ".gitignore",
+        "src/.gitignore",
+        "src/keep.log",
+        "src/main.py",
+    ]
+    assert file_filter.counts == {
+        SkipReason.IGNORED: 5,
+        SkipReason.TOO_LARGE: 2,
+        SkipReason.BINARY: 1,
+        SkipReason.GENERATED: 1,
+    }
+
+
+def test_walk_can_keep_generated_files(tree: Path):
+    paths = set(FileFilter(skip_generated=False).walk(tree))
+    assert {"app.min.js", "proto_pb2.py", "node_modules/lib/index.js"} <= paths
+    assert "debug.log" not in paths
+
+
+def test_walk_archive_matches_walk(
+    tree: Path, tmp_path_factory: pytest.TempPathFactory
+):
+    archive_path = tmp_path_factory.mktemp("archive") / "tree.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        for path in tree.rglob("*"):
+            if path.is_file():
+                archive.write(path, path.relative_to(tree).as_posix())
+    with zipfile.ZipFile(archive_path) as archive:
+        names = sorted(FileFilter(max_bytes=1000).walk_archive(archive))
+    assert names == sorted(FileFilter(max_bytes=1000).walk(tree))
@@ -0,0 +1,155 @@
+from types import SimpleNamespace
+from typing import Any
+
+from langchain_community.graphs.graph_document import (
+    GraphDocument,
+    Node,
+    Relationship,
+)
+from langchain_core.documents import Document
+
+from api.graph_writer import DOCUMENTS_QUERY, GraphWriter
+
+
+class FakeSession:
+    def __init__(self, driver: "FakeDriver"):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        pass
+
+    async def run(self, query: str, **parameters):
+        self.driver.runs.append((query, parameters))
+        return SimpleNamespace(consume=self._consume)
+
+    async def _consume(self):
+        pass
+
+    async def execute_write(self, work, *args):
+        self.driver.transactions += 1
+        return await work(self, *args)
+
+
+class FakeDriver:
+    """
+    Records the statements run in sessions, and counts write transactions.
+    """
+
+    def __init__(self):
+        self.runs: list[tuple[str, dict[str, Any]]] = []
+        self.transactions = 0
+
+    def session(self, **_) -> FakeSession:
+        return FakeSession(self)
+
+    def constraints(self) -> list[str]:
+        return [query for query, _ in self.runs if "CONSTRAINT" in query]
+
+    def rows(self, fragment: str) -> list[dict[str, Any]]:
+        return [
+            row
+            for query, parameters in self.runs
+            if fragment in query
+            for row in parameters.get("rows", [])
+        ]
+
+
+def graph_document(document_id: str | None) -> GraphDocument:
+    alice = Node(id="alice", type="Person", properties={"age": 30})
+    acme = Node(id="acme", type="Company")
+    metadata = {"filename": "a.md"}
+    if document_id is not None:
+        metadata["id"] = document_id
+    return GraphDocument(
+        nodes=[alice, acme, Node(id="untyped", type="")],
+        relationships=[
+            Relationship(source=alice, target=acme, type="works at"),
+            Relationship(source=acme, target=alice, type="EMPLOYS"),
+        ],
+        source=Document(page_content="Alice works at Acme.", metadata=metadata),
+    )
+
+
+async def test_nodes_and_relationships_are_grouped():
+    driver = FakeDriver()
+    await GraphWriter(driver).write([graph_document("proj:a.md")])
+
+    assert driver.rows(DOCUMENTS_QUERY) == [
+        {
+            "id": "proj:a.md",
+            "text": "Alice works at Acme.",
+            "metadata": {"filename": "a.md", "id": "proj:a.md"},
+        }
+    ]
+    assert driver.rows("MERGE (n:`Person`") == [
+        {"id": "alice", "properties": {"age": 30}}
+    ]
+    assert driver.rows("MERGE (n:`Node`") == [
+        {"id": "untyped", "properties": {}}
+    ]
+    works_at = driver.rows("[r:`WORKS_AT`]")
+    assert works_at == [
+        {
+            "source": "alice",
+            "target": "acme",
+            "properties": {},
+            "document_id": "proj:a.md",
+        }
+    ]
+    assert len(driver.rows("[r:`EMPLOYS`]")) == 1
+    assert {row["id"] for row in driver.rows(":MENTIONS")} == {
+        "alice",
+        "acme",
+        "untyped",
+    }
+
+
+async def test_relationships_without_a_document_have_no_document_id():
+    driver = FakeDriver()
+    await GraphWriter(driver).write([graph_document(None)])
+    assert driver.rows(DOCUMENTS_QUERY) == []
+    assert driver.rows(":MENTIONS") == []
+    assert driver.rows("[r:`WORKS_AT`]")[0]["document_id"] is None
+
+
+async def test_rows_are_written_in_batches():
+    driver = FakeDriver()
+    nodes = [Node(id=f"n{i}", type="Concept") for i in range(5)]
+    document = GraphDocument(
+        nodes=nodes, relationships=[], source=Document(page_content="")
+    )
+    await GraphWriter(driver, batch_rows=2).write([document])
+
+    batches = [
+        parameters["rows"]
+        for query, parameters in driver.runs
+        if "MERGE (n:`Concept`" in query
+    ]
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [row["id"] for batch in batches for row in batch] == [
+        f"n{i}" for i in range(5)
+    ]
+    # One transaction per batch
+    assert driver.transactions == 3
+
+
+async def test_constraints_are_created_once_per_label():
+    driver = FakeDriver()
+    writer = GraphWriter(driver)
+    await writer.write([graph_document("proj:a.md")])
+    constraints = driver.constraints()
+    assert len(constraints) == 4
+    for label in ("Document", "Person", "Company", "Node"):
+        assert sum(f"(n:`{label}`)" in query for query in constraints) == 1
+
+    await writer.write([graph_document("proj:b.md")])
+    await writer.ensure_constraints(["Person", "Document"])
+    assert driver.constraints() == constraints
+
+    await writer.ensure_constraints(["Person", "Chunk"])
+    assert driver.constraints()[4:] == [
+        "CREATE CONSTRAINT IF NOT EXISTS FOR (n:`Chunk`) REQUIRE n.id IS UNIQUE"
+    ]
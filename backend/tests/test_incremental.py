@@ -0,0 +1,145 @@
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+from langchain_community.graphs.graph_document import GraphDocument, Node
+from langchain_core.documents import Document
+
+from api.cache import ExtractionCache
+from api.incremental import (
+    REMOVE_DOCUMENTS_QUERY,
+    FileStatus,
+    ProjectSync,
+    remove_documents,
+)
+from api.pipeline import IngestionPipeline
+from api.scheduler import get_in_flight_limiter, get_rate_limiter
+
+INDEXED = {"same.md": "h1", "changed.md": "h2", "gone.md": "h3"}
+
+
+def document(filename: str, content_hash: str) -> Document:
+    return Document(
+        page_content=f"contents of {filename}",
+        metadata={"filename": filename, "content_hash": content_hash},
+    )
+
+
+class FakeGraph:
+    def __init__(self):
+        self.queries: list[tuple[str, dict[str, Any]]] = []
+
+    async def query(self, query: str, params=None, **_) -> list[Any]:
+        self.queries.append((query, params or {}))
+        return []
+
+    def removed(self) -> list[list[str]]:
+        return [
+            params["ids"]
+            for query, params in self.queries
+            if query == REMOVE_DOCUMENTS_QUERY
+        ]
+
+
+class FakeTransformer:
+    async def aprocess_response(self, document: Document) -> GraphDocument:
+        node = Node(id=document.metadata["filename"], type="Concept")
+        return GraphDocument(nodes=[node], relationships=[], source=document)
+
+
+class FakeWriter:
+    def __init__(self, graph: FakeGraph):
+        self.graph = graph
+        self.written: list[str] = []
+        # How many removals had happened when each file was written
+        self.removals_before: dict[str, int] = {}
+
+    async def write(self, graph_documents: list[GraphDocument]):
+        for graph_document in graph_documents:
+            filename = graph_document.source.metadata["filename"]
+            self.written.append(filename)
+            self.removals_before[filename] = len(self.graph.removed())
+
+
+@pytest.fixture(autouse=True)
+def limiters(monkeypatch: pytest.MonkeyPatch):
+    # Fresh limiters for each test's event loop, without a rate to wait on
+    monkeypatch.setenv("LLM_REQUESTS_PER_MINUTE", "600000")
+    get_rate_limiter.cache_clear()
+    get_in_flight_limiter.cache_clear()
+    yield
+    get_rate_limiter.cache_clear()
+    get_in_flight_limiter.cache_clear()
+
+
+def test_files_are_classified_by_hash():
+    sync = ProjectSync(INDEXED)
+    assert sync.classify(document("same.md", "h1")) is FileStatus.UNCHANGED
+    assert sync.classify(document("changed.md", "new")) is FileStatus.MODIFIED
+    assert sync.classify(document("new.md", "h4")) is FileStatus.ADDED
+    assert sync.counts == {
+        FileStatus.ADDED: 1,
+        FileStatus.MODIFIED: 1,
+        FileStatus.UNCHANGED: 1,
+    }
+
+
+def test_unseen_files_are_deleted():
+    sync = ProjectSync(INDEXED)
+    assert sorted(sync.deleted) == sorted(INDEXED)
+    sync.classify(document("same.md", "h1"))
+    sync.classify(document("changed.md", "new"))
+    assert sync.deleted == ["gone.md"]
+
+
+async def test_remove_documents_by_id():
+    graph = FakeGraph()
+    await remove_documents(graph, "proj", [])
+    assert graph.queries == []
+
+    await remove_documents(graph, "proj", ["a.md", "b.md"])
+    assert len(graph.queries) == 3
+    assert all(
+        params == {"ids": ["proj:a.md", "proj:b.md"]}
+        for _, params in graph.queries
+    )
+
+
+async def documents(*files: tuple[str, str]) -> AsyncIterator[Document]:
+    for filename, content_hash in files:
+        yield document(filename, content_hash)
+
+
+async def test_modified_files_are_removed_before_being_rewritten(
+    tmp_path: Path,
+):
+    graph = FakeGraph()
+    writer = FakeWriter(graph)
+    sync = ProjectSync(INDEXED)
+    cache = ExtractionCache(tmp_path / "cache.db")
+    pipeline = IngestionPipeline(
+        FakeTransformer(),
+        graph,
+        cache,
+        writer,
+        project="proj",
+        sync=sync,
+        extract_workers=1,
+        write_batch_size=1,
+    )
+    try:
+        stats = await pipeline.run(
+            documents(("same.md", "h1"), ("changed.md", "new"), ("new.md", "x"))
+        )
+    finally:
+        cache.close()
+
+    assert stats.read == 3
+    assert stats.skipped == 1
+    assert sorted(writer.written) == ["changed.md", "new.md"]
+    # Only the modified file had anything to clear out, and it was cleared
+    # before its new version was written
+    assert graph.removed() == [["proj:changed.md"]]
+    assert writer.removals_before["changed.md"] == 1
+    assert sync.deleted == ["gone.md"]
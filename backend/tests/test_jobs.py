@@ -0,0 +1,84 @@
+import asyncio
+from contextlib import asynccontextmanager
+from functools import partial
+
+from api.jobs import Job, JobManager, JobStatus
+from api.pipeline import PipelineStats
+
+
+async def wait_finished(job: Job, timeout: float = 5.0):
+    async with asyncio.timeout(timeout):
+        while not job.finished:
+            await asyncio.sleep(0.01)
+
+
+@asynccontextmanager
+async def running_manager():
+    manager = JobManager(workers=1)
+    await manager.start()
+    yield manager
+    await manager.stop()
+
+
+async def load(source: str, *, incremental: bool = False, stats: PipelineStats):
+    assert source == "project"
+    assert incremental
+    stats.total = 3
+    stats.written = 3
+
+
+async def test_keyword_bound_partial_succeeds():
+    async with running_manager() as manager:
+        job = manager.submit(partial(load, "project", incremental=True))
+        await wait_finished(job)
+    assert job.status is JobStatus.SUCCEEDED, job.error
+    assert job.stats.written == 3
+    assert job.to_dict()["progress"]["files_written"] == 3
+
+
+async def test_failed_job_records_error():
+    async def fail(*, stats: PipelineStats):
+        raise RuntimeError("boom")
+
+    async with running_manager() as manager:
+        job = manager.submit(fail)
+        await wait_finished(job)
+    assert job.status is JobStatus.FAILED
+    assert job.error == "boom"
+
+
+async def test_cancel_running_job():
+    started = asyncio.Event()
+
+    async def hang(*, stats: PipelineStats):
+        started.set()
+        await asyncio.Event().wait()
+
+    async with running_manager() as manager:
+        job = manager.submit(hang)
+        await started.wait()
+        manager.cancel(job.id)
+        await wait_finished(job)
+    assert job.status is JobStatus.CANCELLED
+
+
+async def test_cancel_queued_job():
+    manager = JobManager(workers=0)
+    job = manager.submit(partial(load, "project", incremental=True))
+    manager.cancel(job.id)
+    assert job.status is JobStatus.CANCELLED
+    assert job.finished_at is not None
+
+
+async def test_progress_reports_failures():
+    async def load_with_failure(*, stats: PipelineStats):
+        stats.record_failure("broken.py", "Invalid response.")
+
+    async with running_manager() as manager:
+        job = manager.submit(load_with_failure)
+        await wait_finished(job)
+    progress = job.to_dict()
+    assert progress["progress"]["files_failed"] == 1
+    assert progress["failures"] == [
+        {"filename": "broken.py", "error": "Invalid response."}
+    ]
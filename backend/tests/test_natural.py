@@ -0,0 +1,210 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi.exceptions import HTTPException
+
+from api.natural import (
+    PlanStore,
+    answer_question,
+    extract_cypher,
+    generate_cypher,
+    parameterize,
+    schema_version,
+)
+from api.query import PageState
+from api.scheduler import get_in_flight_limiter, get_rate_limiter
+
+
+class FakeLLM:
+    def __init__(self, *contents):
+        self.contents = list(contents)
+        self.prompts: list[str] = []
+
+    async def ainvoke(self, prompt: str):
+        self.prompts.append(prompt)
+        content = self.contents[min(len(self.prompts), len(self.contents)) - 1]
+        if isinstance(content, Exception):
+            raise content
+        return SimpleNamespace(content=content)
+
+
+@pytest.fixture(autouse=True)
+def limiters(monkeypatch: pytest.MonkeyPatch):
+    # Fresh limiters for each test's event loop, without a rate to wait on
+    monkeypatch.setenv("LLM_REQUESTS_PER_MINUTE", "600000")
+    get_rate_limiter.cache_clear()
+    get_in_flight_limiter.cache_clear()
+    yield
+    get_rate_limiter.cache_clear()
+    get_in_flight_limiter.cache_clear()
+
+
+@pytest.mark.parametrize(
+    ("question", "template", "parameters"),
+    [
+        (
+            "What calls `load_project`?",
+            "what calls $p0",
+            {"p0": "load_project"},
+        ),
+        (
+            "Which functions are in api/main.py?",
+            "which functions are in $p0",
+            {"p0": "api/main.py"},
+        ),
+        (
+            "Show 5 callers of 'parse' in \"a b.py\"",
+            "show $p0 callers of $p1 in $p2",
+            {"p0": 5, "p1": "parse", "p2": "a b.py"},
+        ),
+        ("  What   is the\tgraph about?! ", "what is the graph about", {}),
+        ("What's in it", "what's in it", {}),
+    ],
+)
+def test_parameterize(question: str, template: str, parameters: dict):
+    assert parameterize(question) == (template, parameters)
+
+
+def test_questions_differing_by_values_share_a_template():
+    first, _ = parameterize("What calls `parse`?")
+    second, _ = parameterize("what calls `load_project`")
+    assert first == second
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "MATCH (n) RETURN n;",
+        "```cypher\nMATCH (n) RETURN n\n```",
+        "Here you go:\n```\nMATCH (n) RETURN n;\n```\nDone.",
+    ],
+)
+def test_extract_cypher(text: str):
+    assert extract_cypher(text) == "MATCH (n) RETURN n"
+
+
+def test_plan_store_evicts_least_recently_used():
+    store = PlanStore(max_entries=2)
+    keys = [store.key(f"question {i}", None, "v1") for i in range(3)]
+    store.put(keys[0], "a")
+    store.put(keys[1], "b")
+    assert store.get(keys[0]) == "a"
+    store.put(keys[2], "c")
+    assert store.get(keys[1]) is None
+    assert store.get(keys[0]) == "a"
+    store.discard(keys[0])
+    assert store.get(keys[0]) is None
+
+
+def test_plan_keys_depend_on_context_and_schema():
+    key = PlanStore.key("what calls $p0", "In the API.", "v1")
+    assert key == PlanStore.key("what calls $p0", "in the  api", "v1")
+    assert key != PlanStore.key("what calls $p0", None, "v1")
+    assert key != PlanStore.key("what calls $p0", "In the API.", "v2")
+    assert schema_version({"schema": "a"}) == schema_version({"schema": "a"})
+    assert schema_version({"schema": "a"}) != schema_version({"schema": "b"})
+
+
+async def test_plans_using_every_parameter_are_reusable():
+    llm = FakeLLM("```cypher\nMATCH (f {name: $p0}) RETURN f\n```")
+    plan = await generate_cypher(llm, "schema", "what is $p0", {"p0": "x"})
+    assert plan.cypher == "MATCH (f {name: $p0}) RETURN f"
+    assert plan.reusable
+    assert '$p0 = "x"' in llm.prompts[0]
+
+    llm = FakeLLM([{"text": "MATCH (f {name: 'x'}) "}, "RETURN f"])
+    plan = await generate_cypher(llm, "schema", "what is $p0", {"p0": "x"})
+    assert plan.cypher == "MATCH (f {name: 'x'}) RETURN f"
+    assert not plan.reusable
+
+
+async def test_retries_include_the_error():
+    llm = FakeLLM("MATCH (n) RETURN n")
+    await generate_cypher(
+        llm, "schema", "q", {}, context="ctx", error="Unknown label."
+    )
+    assert "Context: ctx" in llm.prompts[0]
+    assert "failed with: Unknown label." in llm.prompts[0]
+
+
+async def test_generation_failures_are_bad_gateways():
+    with pytest.raises(HTTPException) as excinfo:
+        await generate_cypher(FakeLLM(RuntimeError("down")), "schema", "q", {})
+    assert excinfo.value.status_code == 502
+
+
+class FakeSchemaCache:
+    async def get_schema(self, graph) -> dict[str, str]:
+        return {"schema": "(:Function)-[:CALLS]->(:Function)"}
+
+
+@pytest.fixture
+def runs(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """
+    Runs queries without a graph: queries mentioning `Missing` fail their
+    checks, and others return their parameters as a row.
+    """
+    runs: list[str] = []
+
+    async def run_plan(graph, cypher, parameters, limit):
+        runs.append(cypher)
+        if "Missing" in cypher:
+            raise HTTPException(status_code=400, detail="Unknown label.")
+        return [parameters], PageState(offset=0, rows=1)
+
+    monkeypatch.setattr("api.natural.run_plan", run_plan)
+    return runs
+
+
+async def ask(question: str, plan_store: PlanStore, llm: FakeLLM):
+    return await answer_question(
+        question, None, None, FakeSchemaCache(), plan_store, llm
+    )
+
+
+async def test_answers_reuse_stored_plans(runs: list[str]):
+    plan_store = PlanStore()
+    llm = FakeLLM("MATCH (f:Function {name: $p0}) RETURN f")
+    answer = await ask("What calls `parse`?", plan_store, llm)
+    assert not answer["cached"]
+    assert answer["results"] == [{"p0": "parse"}]
+
+    answer = await ask("what calls `load`", plan_store, llm)
+    assert answer["cached"]
+    assert answer["cypher"] == "MATCH (f:Function {name: $p0}) RETURN f"
+    assert answer["results"] == [{"p0": "load"}]
+    assert answer["count"] == 1
+    assert len(llm.prompts) == 1
+
+
+async def test_failed_plans_are_regenerated_with_the_error(runs: list[str]):
+    plan_store = PlanStore()
+    llm = FakeLLM("MATCH (m:Missing) RETURN m", "MATCH (f:Function) RETURN f")
+    answer = await ask("List the functions", plan_store, llm)
+    assert answer["cypher"] == "MATCH (f:Function) RETURN f"
+    assert "failed with: Unknown label." in llm.prompts[1]
+    assert len(runs) == 2
+
+
+async def test_plans_failing_twice_are_not_stored(runs: list[str]):
+    plan_store = PlanStore()
+    llm = FakeLLM("MATCH (m:Missing) RETURN m")
+    with pytest.raises(HTTPException) as excinfo:
+        await ask("List the functions", plan_store, llm)
+    assert excinfo.value.status_code == 400
+    assert len(llm.prompts) == 2
+    assert not plan_store._plans
+
+
+async def test_stale_stored_plans_are_replaced(runs: list[str]):
+    plan_store = PlanStore()
+    key = plan_store.key(
+        "list the functions",
+        None,
+        schema_version({"schema": "(:Function)-[:CALLS]->(:Function)"}),
+    )
+    plan_store.put(key, "MATCH (m:Missing) RETURN m")
+    llm = FakeLLM("MATCH (f:Function) RETURN f")
+    answer = await ask("List the functions", plan_store, llm)
+    assert not answer["cached"]
+    assert plan_store.get(key) == "MATCH (f:Function) RETURN f"
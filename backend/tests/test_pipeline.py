@@ -0,0 +1,73 @@
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+from langchain_community.graphs.graph_document import GraphDocument, Node
+from langchain_core.documents import Document
+
+from api.cache import ExtractionCache
+from api.pipeline import DocumentFailure, IngestionPipeline
+from api.scheduler import get_in_flight_limiter, get_rate_limiter
+
+
+class FakeTransformer:
+    async def aprocess_response(self, document: Document) -> GraphDocument:
+        if "broken" in document.page_content:
+            raise ValueError("Invalid response.")
+        node = Node(id=document.metadata["filename"], type="Concept")
+        return GraphDocument(nodes=[node], relationships=[], source=document)
+
+
+class FakeWriter:
+    def __init__(self):
+        self.written: list[GraphDocument] = []
+
+    async def write(self, graph_documents: list[GraphDocument]):
+        self.written.extend(graph_documents)
+
+
+@pytest.fixture(autouse=True)
+def limiters(monkeypatch: pytest.MonkeyPatch):
+    # Fresh limiters for each test's event loop, without a rate to wait on
+    monkeypatch.setenv("LLM_REQUESTS_PER_MINUTE", "600000")
+    get_rate_limiter.cache_clear()
+    get_in_flight_limiter.cache_clear()
+    yield
+    get_rate_limiter.cache_clear()
+    get_in_flight_limiter.cache_clear()
+
+
+async def documents(*contents: str) -> AsyncIterator[Document]:
+    for i, text in enumerate(contents):
+        yield Document(page_content=text, metadata={"filename": f"f{i}.md"})
+
+
+async def test_failures_are_recorded_per_document(tmp_path: Path):
+    writer = FakeWriter()
+    cache = ExtractionCache(tmp_path / "cache.db")
+    pipeline = IngestionPipeline(
+        FakeTransformer(), None, cache, writer, extract_workers=2
+    )
+    try:
+        stats = await pipeline.run(documents("fine", "broken", "also fine"))
+    finally:
+        cache.close()
+
+    assert stats.read == 3
+    assert stats.extracted == stats.written == 2
+    assert stats.failed == 1
+    assert stats.failures == [DocumentFailure("f1.md", "Invalid response.")]
+    assert sorted(
+        graph_document.source.metadata["filename"]
+        for graph_document in writer.written
+    ) == ["f0.md", "f2.md"]
+    assert stats.throughput > 0
+
+
+async def test_recorded_failures_are_capped(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("api.pipeline.MAX_RECORDED_FAILURES", 2)
+    pipeline = IngestionPipeline(FakeTransformer(), None, None, FakeWriter())
+    for i in range(3):
+        pipeline.stats.record_failure(f"f{i}.md", "error")
+    assert pipeline.stats.failed == 3
+    assert len(pipeline.stats.failures) == 2
@@ -0,0 +1,360 @@
+import base64
+import json
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from fastapi.exceptions import HTTPException
+from neo4j import READ_ACCESS, WRITE_ACCESS
+from neo4j.exceptions import ClientError, TransientError
+
+from api.query import (
+    PageState,
+    check_plan,
+    decode_cursor,
+    encode_cursor,
+    frame_json,
+    guard_query,
+    iter_ndjson,
+    iter_page,
+    page_query,
+    serialize_record,
+)
+
+QUERY = "MATCH (n) RETURN n.id AS id"
+
+
+class FailedQuery(ClientError):
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self._failed_code = code
+        self._failed_message = message
+
+    @property
+    def code(self) -> str:
+        return self._failed_code
+
+    @property
+    def message(self) -> str:
+        return self._failed_message
+
+
+class FakeResult:
+    def __init__(self, rows: list[dict[str, Any]], error: Exception | None):
+        self.rows = rows
+        self.error = error
+
+    async def __aiter__(self):
+        for row in self.rows:
+            yield SimpleNamespace(data=lambda row=row: row)
+        if self.error is not None:
+            raise self.error
+
+    async def consume(self):
+        return SimpleNamespace(counters=SimpleNamespace(contains_updates=False))
+
+
+class FakeGraph:
+    """
+    Stands in for the driver, returning `rows` for any query, then raising
+    `error` if given. Queries wrapped by `page_query` get their page of it.
+    """
+
+    database = None
+
+    def __init__(
+        self, rows: list[dict[str, Any]], error: Exception | None = None
+    ):
+        self.rows = rows
+        self.error = error
+        self.runs: list[tuple[str, dict[str, Any]]] = []
+        self.driver = SimpleNamespace(session=lambda **_: self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        pass
+
+    async def run(self, query, parameters):
+        self.runs.append((query.text, parameters))
+        # Pages after the first are skipped and limited by the server
+        offset = parameters.get("_page_offset", 0)
+        limit = parameters.get("_page_limit", len(self.rows))
+        return FakeResult(self.rows[offset : offset + limit], self.error)
+
+
+ROWS = [{"id": f"node-{i}"} for i in range(10)]
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(QUERY, {"limit": 5}, 42)
+    assert decode_cursor(cursor, QUERY, {"limit": 5}) == 42
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    ["not a cursor", "", encode_cursor(QUERY, {}, 1)[:-4] + "AAAA"],
+)
+def test_invalid_cursors_are_rejected(cursor: str):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor, QUERY, {})
+    assert excinfo.value.status_code == 400
+
+
+def test_cursors_are_tied_to_their_query():
+    cursor = encode_cursor(QUERY, {"limit": 5}, 10)
+    for query, parameters in [(QUERY, {"limit": 6}), ("RETURN 1", {})]:
+        with pytest.raises(HTTPException) as excinfo:
+            decode_cursor(cursor, query, parameters)
+        assert (
+            excinfo.value.detail == "Cursor was issued for a different query."
+        )
+
+
+def test_tampered_offsets_are_rejected():
+    cursor = encode_cursor(QUERY, {}, 10)
+    token = json.loads(base64.urlsafe_b64decode(cursor))
+    token["o"] = -1
+    tampered = base64.urlsafe_b64encode(json.dumps(token).encode()).decode()
+    with pytest.raises(HTTPException):
+        decode_cursor(tampered, QUERY, {})
+
+
+def test_check_plan_rejects_cartesian_products():
+    plan = {
+        "operatorType": "ProduceResults@neo4j",
+        "args": {"EstimatedRows": 10.0},
+        "children": [{"operatorType": "CartesianProduct@neo4j", "args": {}}],
+    }
+    with pytest.raises(HTTPException) as excinfo:
+        check_plan(plan)
+    assert "CartesianProduct" in excinfo.value.detail
+
+
+def test_check_plan_rejects_large_estimates():
+    plan = {
+        "operatorType": "ProduceResults@neo4j",
+        "args": {"EstimatedRows": 10.0},
+        "children": [
+            {
+                "operatorType": "AllNodesScan",
+                "arguments": {"EstimatedRows": 5e6},
+            }
+        ],
+    }
+    with pytest.raises(HTTPException) as excinfo:
+        check_plan(plan, max_estimated_rows=1e6)
+    assert "AllNodesScan" in excinfo.value.detail
+    check_plan(plan, max_estimated_rows=1e7)
+
+
+class ExplainGraph:
+    """
+    Answers EXPLAIN with `plan`, or raises `error`, recording the sessions
+    opened and the queries run.
+    """
+
+    database = None
+
+    def __init__(
+        self, plan: dict[str, Any] | None, error: Exception | None = None
+    ):
+        self.plan = plan
+        self.error = error
+        self.sessions: list[dict[str, Any]] = []
+        self.queries: list[str] = []
+        self.driver = SimpleNamespace(session=self.session)
+
+    def session(self, **kwargs):
+        self.sessions.append(kwargs)
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        pass
+
+    async def run(self, query, parameters):
+        self.queries.append(query.text)
+        if self.error is not None:
+            raise self.error
+        return self
+
+    async def consume(self):
+        return SimpleNamespace(plan=self.plan)
+
+
+PLAN = {"operatorType": "ProduceResults@neo4j", "args": {}, "children": []}
+
+
+async def test_guard_query_explains_in_read_access_mode():
+    graph = ExplainGraph(PLAN)
+    await guard_query(graph, QUERY, {})
+    assert graph.queries == [f"EXPLAIN {QUERY}"]
+    assert graph.sessions[0]["default_access_mode"] == READ_ACCESS
+
+
+async def test_guard_query_rejects_writes_unless_allowed(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    graph = ExplainGraph(PLAN)
+    with pytest.raises(HTTPException) as excinfo:
+        await guard_query(graph, "CREATE (n)", {}, read_only=False)
+    assert excinfo.value.status_code == 403
+    # Rejected before the query reaches the server
+    assert graph.sessions == []
+
+    monkeypatch.setattr("api.query.CYPHER_ALLOW_WRITES", True)
+    await guard_query(graph, "CREATE (n)", {}, read_only=False)
+    assert graph.sessions[0]["default_access_mode"] == WRITE_ACCESS
+
+
+async def test_guard_query_checks_the_plan():
+    plan = {**PLAN, "children": [{"operatorType": "CartesianProduct"}]}
+    with pytest.raises(HTTPException) as excinfo:
+        await guard_query(ExplainGraph(plan), QUERY, {})
+    assert excinfo.value.status_code == 400
+
+
+async def test_guard_query_reports_syntax_errors():
+    error = FailedQuery("Neo.ClientError.Statement.SyntaxError", "Bad.")
+    with pytest.raises(HTTPException) as excinfo:
+        await guard_query(ExplainGraph(None, error), "MATCH (", {})
+    assert excinfo.value.status_code == 400
+    assert excinfo.value.detail == "Bad."
+
+
+async def read_page(
+    graph, offset=0, limit=100, max_bytes=10_000, read_only=True
+):
+    state = PageState(offset=offset)
+    lines = [
+        line
+        async for line in iter_page(
+            graph,
+            QUERY,
+            {},
+            offset,
+            limit,
+            state,
+            max_bytes=max_bytes,
+            read_only=read_only,
+        )
+    ]
+    return lines, state
+
+
+async def test_page_stops_at_the_row_limit():
+    lines, state = await read_page(FakeGraph(ROWS), offset=2, limit=3)
+    assert [json.loads(line)["id"] for line in lines] == [
+        "node-2",
+        "node-3",
+        "node-4",
+    ]
+    assert state.truncated == "limit"
+    assert state.offset == 5
+    assert not state.exhausted
+
+
+async def test_later_pages_are_skipped_by_the_server():
+    graph = FakeGraph(ROWS)
+    await read_page(graph, limit=3)
+    lines, state = await read_page(graph, offset=3, limit=3)
+    assert [json.loads(line)["id"] for line in lines] == [
+        "node-3",
+        "node-4",
+        "node-5",
+    ]
+    assert state.truncated == "limit"
+    assert state.offset == 6
+
+    (first_query, first_parameters), (query, parameters) = graph.runs
+    assert (first_query, first_parameters) == (QUERY, {})
+    assert query.startswith("CALL {\n" + QUERY + "\n}")
+    assert query.endswith("SKIP $_page_offset LIMIT $_page_limit")
+    assert parameters == {"_page_offset": 3, "_page_limit": 4}
+
+
+def test_page_query_strips_the_terminator():
+    query, parameters = page_query(QUERY + ";\n", {"name": "a"}, 5, 10)
+    assert query.splitlines()[1] == QUERY
+    assert parameters == {"name": "a", "_page_offset": 5, "_page_limit": 11}
+
+
+async def test_write_queries_are_not_wrapped():
+    graph = FakeGraph(ROWS)
+    lines, state = await read_page(graph, offset=8, read_only=False)
+    assert [json.loads(line)["id"] for line in lines] == ["node-8", "node-9"]
+    assert state.exhausted
+    assert graph.runs == [(QUERY, {})]
+
+
+async def test_page_stops_at_the_byte_limit():
+    line_bytes = len(serialize_record(ROWS[0]))
+    lines, state = await read_page(
+        FakeGraph(ROWS), max_bytes=line_bytes * 2 + 1
+    )
+    assert len(lines) == 2
+    assert state.truncated == "max_bytes"
+    assert state.bytes <= line_bytes * 2 + 1
+
+
+async def test_page_always_returns_one_row():
+    lines, state = await read_page(FakeGraph(ROWS), max_bytes=1)
+    assert len(lines) == 1
+    assert state.truncated == "max_bytes"
+
+
+async def test_last_page_is_exhausted():
+    lines, state = await read_page(FakeGraph(ROWS), offset=8)
+    assert len(lines) == 2
+    assert state.exhausted
+    assert state.truncated is None
+
+
+async def stream(graph: FakeGraph, limit: int = 100) -> list[dict[str, Any]]:
+    state = PageState(offset=0)
+    records = iter_page(graph, QUERY, {}, 0, limit, state)
+    return [
+        json.loads(line)
+        async for line in iter_ndjson(records, QUERY, {}, state)
+    ]
+
+
+async def test_stream_ends_with_a_summary():
+    lines = await stream(FakeGraph(ROWS), limit=4)
+    assert [line["record"]["id"] for line in lines[:-1]] == [
+        "node-0",
+        "node-1",
+        "node-2",
+        "node-3",
+    ]
+    summary = lines[-1]["summary"]
+    assert summary["count"] == 4
+    assert summary["truncated"] == "limit"
+    assert decode_cursor(summary["next_cursor"], QUERY, {}) == 4
+
+
+async def test_stream_ends_with_an_error_when_the_query_fails():
+    timeout = FailedQuery(
+        "Neo.ClientError.Transaction.TransactionTimedOut", "Timed out."
+    )
+    lines = await stream(FakeGraph(ROWS[:2], timeout))
+    assert [line["record"]["id"] for line in lines[:-1]] == [
+        "node-0",
+        "node-1",
+    ]
+    assert lines[-1]["error"]["status_code"] == 504
+    assert lines[-1]["error"]["detail"].startswith("Query timed out")
+
+    lines = await stream(FakeGraph(ROWS[:1], TransientError("Gone.")))
+    assert lines[-1]["error"]["status_code"] == 500
+
+
+def test_frame_json():
+    records = [serialize_record(row) for row in ROWS[:2]]
+    body = json.loads(frame_json({"count": 2, "next_cursor": None}, records))
+    assert body == {"count": 2, "next_cursor": None, "results": ROWS[:2]}
+    assert json.loads(frame_json({}, [])) == {"results": []}
@@ -0,0 +1,85 @@
+import pytest
+
+from api.retrieval import (
+    ITEM_OVERHEAD_TOKENS,
+    fulltext_query,
+    pack_context,
+    reciprocal_rank_fusion,
+)
+
+
+def test_fulltext_query_splits_identifiers():
+    assert fulltext_query("how does decodeCursor handle the page_state?") == (
+        "decodecursor OR decode OR cursor OR handle OR pagestate OR page "
+        "OR state"
+    )
+
+
+def test_fulltext_query_drops_duplicates():
+    assert fulltext_query("parse parse_args parse") == (
+        "parse OR parseargs OR args"
+    )
+
+
+@pytest.mark.parametrize("query", ["", "?? 123", "what is the", "a_1 + 2"])
+def test_fulltext_query_without_terms(query: str):
+    assert fulltext_query(query) is None
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion(
+        {
+            "a": [{"id": "x"}, {"id": "y"}],
+            "b": [{"id": "y", "text": "y"}, {"id": "z"}],
+        },
+        k=60,
+    )
+    assert [(result["id"], result["score"]) for result in fused] == [
+        ("y", round(1 / 62 + 1 / 61, 6)),
+        ("x", round(1 / 61, 6)),
+        ("z", round(1 / 62, 6)),
+    ]
+    assert fused[0]["matched_by"] == ["a", "b"]
+    # The first ranking to find a result supplies its fields
+    assert "text" not in fused[0]
+    assert fused[2]["matched_by"] == ["b"]
+
+
+def test_reciprocal_rank_fusion_of_nothing():
+    assert reciprocal_rank_fusion({"a": [], "b": []}) == []
+
+
+def item(item_id, chars, filename="f.py", start=None, end=None):
+    return {
+        "id": item_id,
+        "filename": filename,
+        "start_line": start,
+        "end_line": end,
+        "text": "x" * chars,
+    }
+
+
+def test_pack_context_fits_the_budget():
+    items = [
+        item("chunk", 400, start=1, end=50),
+        # Inside the chunk, so already sent
+        item("symbol", 40, start=10, end=20),
+        item("big", 40000),
+        item("module", 0),
+    ]
+    packed, tokens, omitted = pack_context(items, token_budget=200)
+    assert [packed_item["id"] for packed_item in packed] == ["chunk", "module"]
+    assert tokens == 100 + 2 * ITEM_OVERHEAD_TOKENS
+    # Only items left out for the budget are counted
+    assert omitted == 1
+
+
+def test_pack_context_keeps_other_files_and_lines():
+    items = [
+        item("chunk", 40, start=1, end=50),
+        item("other file", 40, filename="g.py", start=10, end=20),
+        item("overlapping", 40, start=40, end=60),
+    ]
+    packed, _, omitted = pack_context(items, token_budget=1000)
+    assert len(packed) == 3
+    assert omitted == 0
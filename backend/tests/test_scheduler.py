@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from api.scheduler import TokenBucket, is_retryable
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int, on_response: bool = False):
+        super().__init__(f"HTTP {status_code}")
+        if on_response:
+            self.response = httpx.Response(status_code)
+        else:
+            self.status_code = status_code
+
+
+async def test_token_bucket_allows_a_burst():
+    bucket = TokenBucket(rate=1.0, capacity=3)
+    started = time.monotonic()
+    for _ in range(3):
+        await bucket.acquire()
+    assert time.monotonic() - started < 0.1
+
+
+async def test_token_bucket_waits_for_refills():
+    bucket = TokenBucket(rate=20.0, capacity=1)
+    started = time.monotonic()
+    for _ in range(4):
+        await bucket.acquire()
+    # The first token is there already, the other three take 50ms each
+    assert time.monotonic() - started >= 0.14
+
+
+async def test_token_bucket_serves_waiters_in_turn():
+    bucket = TokenBucket(rate=50.0, capacity=1)
+    order: list[int] = []
+
+    async def take(i: int):
+        await bucket.acquire()
+        order.append(i)
+
+    await asyncio.gather(*(take(i) for i in range(5)))
+    assert order == list(range(5))
+
+
+@pytest.mark.parametrize(
+    "exc",
+    [
+        httpx.ConnectError("Connection refused."),
+        TimeoutError(),
+        StatusError(429),
+        StatusError(503),
+        StatusError(502, on_response=True),
+        RuntimeError("429 RESOURCE_EXHAUSTED"),
+        RuntimeError("The model is overloaded."),
+    ],
+)
+def test_transient_errors_are_retried(exc):
+    assert is_retryable(exc)
+
+
+@pytest.mark.parametrize(
+    "exc",
+    [
+        StatusError(400),
+        StatusError(401),
+        ValueError("Invalid response."),
+    ],
+)
+def test_other_errors_are_not_retried(exc):
+    assert not is_retryable(exc)
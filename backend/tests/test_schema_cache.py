@@ -0,0 +1,129 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from langchain_community.graphs.graph_document import GraphDocument
+from langchain_core.documents import Document
+
+from api.pipeline import IngestionPipeline
+from api.query import PageState, iter_page
+from api.schema_cache import SchemaCache, get_schema_cache
+
+
+class FakeGraph:
+    """
+    Counts schema refreshes, and serves one row to any query, reporting
+    whether the query wrote.
+    """
+
+    database = None
+
+    def __init__(self, writes: bool = False):
+        self.refreshes = 0
+        self.writes = writes
+        self.schema = ""
+        self.structured_schema: dict[str, Any] = {}
+        self.driver = SimpleNamespace(session=lambda **_: self)
+
+    async def refresh_schema(self):
+        self.refreshes += 1
+        # Lets concurrent readers pile up behind the refresh
+        await asyncio.sleep(0)
+        self.schema = f"schema {self.refreshes}"
+
+    async def query(self, query: str, params=None, **_) -> list[Any]:
+        return [
+            {
+                "nodeCount": 3,
+                "relCount": 1,
+                "labels": {"Person": 3, "Unused": 0},
+                "relTypesCount": {"KNOWS": 1},
+            }
+        ]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        pass
+
+    async def run(self, query, parameters):
+        return self
+
+    async def __aiter__(self):
+        yield SimpleNamespace(data=lambda: {"n": 1})
+
+    async def consume(self):
+        counters = SimpleNamespace(contains_updates=self.writes)
+        return SimpleNamespace(counters=counters)
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+async def test_schema_is_cached_until_the_ttl(clock: list[float]):
+    graph = FakeGraph()
+    schema_cache = SchemaCache(ttl=60)
+    assert (await schema_cache.get_schema(graph))["schema"] == "schema 1"
+    clock[0] += 59
+    assert (await schema_cache.get_schema(graph))["schema"] == "schema 1"
+    clock[0] += 2
+    assert (await schema_cache.get_schema(graph))["schema"] == "schema 2"
+
+
+async def test_invalidation_refreshes_both_entries(clock: list[float]):
+    graph = FakeGraph()
+    schema_cache = SchemaCache(ttl=60)
+    await schema_cache.get_schema(graph)
+    stats = await schema_cache.get_stats(graph)
+    assert stats["labels"] == ["Person"]
+
+    schema_cache.invalidate()
+    assert schema_cache.version == 1
+    assert (await schema_cache.get_schema(graph))["schema"] == "schema 2"
+    assert await schema_cache.get_stats(graph) == stats
+
+
+async def test_concurrent_misses_refresh_once(clock: list[float]):
+    graph = FakeGraph()
+    schema_cache = SchemaCache(ttl=60)
+    schemas = await asyncio.gather(
+        *(schema_cache.get_schema(graph) for _ in range(5))
+    )
+    assert graph.refreshes == 1
+    assert all(schema is schemas[0] for schema in schemas)
+
+
+class FakeWriter:
+    async def write(self, graph_documents: list[GraphDocument]):
+        pass
+
+
+async def test_pipeline_writes_invalidate_the_schema():
+    version = get_schema_cache().version
+    pipeline = IngestionPipeline(None, None, None, FakeWriter())
+    document = GraphDocument(
+        nodes=[], relationships=[], source=Document(page_content="")
+    )
+    await pipeline._write_batch([document])
+    assert get_schema_cache().version == version + 1
+
+
+@pytest.mark.parametrize("writes", [False, True])
+async def test_write_queries_invalidate_the_schema(writes: bool):
+    version = get_schema_cache().version
+    state = PageState(offset=0)
+    lines = [
+        line
+        async for line in iter_page(
+            FakeGraph(writes), "MERGE (n {id: 1}) RETURN n", {}, 0, 10, state
+        )
+    ]
+    assert len(lines) == 1
+    assert get_schema_cache().version == version + writes
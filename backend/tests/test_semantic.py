@@ -0,0 +1,73 @@
+from typing import Any
+
+from api.embeddings import EmbeddingIndexer, HashingEmbeddings
+from api.semantic import SEMANTIC_OVERFETCH, semantic_search
+
+SCORES = {
+    "chunk_embeddings": [0.9, 0.5, 0.2],
+    "symbol_embeddings": [0.8, 0.7, 0.1],
+}
+
+
+class FakeGraph:
+    """
+    Returns one result per score of the index searched, and records the
+    parameters of every search.
+    """
+
+    def __init__(self):
+        self.searches: list[tuple[str, dict[str, Any]]] = []
+
+    async def query(self, query: str, params=None, **_) -> list[Any]:
+        if not params:
+            return []
+        self.searches.append((query, params))
+        kind = params["index"].split("_")[0]
+        return [
+            {"kind": kind, "id": f"{kind}-{i}", "score": score}
+            for i, score in enumerate(SCORES[params["index"]])
+        ][: params["k"]]
+
+
+class FakeWriter:
+    async def ensure_constraints(self, labels: list[str]):
+        pass
+
+
+def indexer() -> EmbeddingIndexer:
+    return EmbeddingIndexer(FakeWriter(), HashingEmbeddings(dimensions=32))
+
+
+async def test_results_are_merged_by_score():
+    graph = FakeGraph()
+    records = await semantic_search("decode cursor", graph, indexer(), k=3)
+    assert [record["id"] for record in records] == [
+        "chunk-0",
+        "symbol-0",
+        "symbol-1",
+    ]
+    assert {params["index"] for _, params in graph.searches} == set(SCORES)
+    for _, params in graph.searches:
+        assert params["candidates"] == 3
+        assert params["project"] is None
+        assert len(params["embedding"]) == 32
+
+
+async def test_project_searches_overfetch():
+    graph = FakeGraph()
+    await semantic_search(
+        "decode cursor", graph, indexer(), k=2, kind="symbol", project="proj"
+    )
+    ((query, params),) = graph.searches
+    assert params["index"] == "symbol_embeddings"
+    assert params["project"] == "proj"
+    assert params["k"] == 2
+    assert params["candidates"] == 2 * SEMANTIC_OVERFETCH
+    # Candidates are filtered down to the project before the limit
+    assert query.index("$project") < query.index("LIMIT $k")
+
+
+async def test_queries_without_words_find_nothing():
+    graph = FakeGraph()
+    assert await semantic_search("?? +", graph, indexer()) == []
+    assert graph.searches == []
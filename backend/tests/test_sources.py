@@ -0,0 +1,103 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from api.documents import download_github_project, list_files
+from api.sources import GitSource, shallow_clone
+
+
+def git(repository: Path, *args: str) -> str:
+    command = ["git", "-C", str(repository), "-c", "user.name=test"]
+    command += ["-c", "user.email=test@example.com", *args]
+    return subprocess.run(
+        command, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+@pytest.fixture(scope="module")
+def remote(tmp_path_factory: pytest.TempPathFactory) -> dict[str, str]:
+    """
+    A bare repository with a tagged first commit, and a second one on top.
+    """
+    work = tmp_path_factory.mktemp("work")
+    git(work, "init", "--quiet", "--initial-branch", "trunk")
+    (work / "src").mkdir()
+    (work / "docs").mkdir()
+    (work / "src" / "main.py").write_text("version = 1\n")
+    (work / "docs" / "index.md").write_text("# Docs\n")
+    git(work, "add", ".")
+    git(work, "commit", "--quiet", "-m", "first")
+    git(work, "tag", "v1")
+    first = git(work, "rev-parse", "HEAD")
+    (work / "src" / "main.py").write_text("version = 2\n")
+    git(work, "commit", "--quiet", "-am", "second")
+
+    bare = tmp_path_factory.mktemp("remote") / "repository.git"
+    subprocess.run(
+        ["git", "clone", "--quiet", "--bare", str(work), str(bare)],
+        check=True,
+    )
+    return {"url": bare.as_uri(), "first": first}
+
+
+async def test_clone_defaults_to_the_remote_head(
+    remote: dict[str, str], tmp_path: Path
+):
+    await shallow_clone(remote["url"], str(tmp_path))
+    assert (tmp_path / "src" / "main.py").read_text() == "version = 2\n"
+    # Only the one commit, without history
+    assert git(tmp_path, "rev-list", "--count", "HEAD") == "1"
+
+
+@pytest.mark.parametrize("ref", ["v1", "first"])
+async def test_clone_at_a_tag_or_commit(
+    remote: dict[str, str], tmp_path: Path, ref: str
+):
+    ref = remote.get(ref, ref)
+    await shallow_clone(remote["url"], str(tmp_path), ref)
+    assert (tmp_path / "src" / "main.py").read_text() == "version = 1\n"
+    assert git(tmp_path, "rev-parse", "HEAD") == remote["first"]
+
+
+async def test_sparse_checkout(remote: dict[str, str], tmp_path: Path):
+    await shallow_clone(remote["url"], str(tmp_path), sparse_paths=["docs"])
+    assert await list_files(tmp_path) == ["docs/index.md"]
+    assert not (tmp_path / "src").exists()
+
+
+async def test_git_source_lists_sparse_paths(
+    remote: dict[str, str], monkeypatch: pytest.MonkeyPatch
+):
+    root = str(Path(remote["url"].removeprefix("file://")).parent)
+    monkeypatch.setattr("api.sources.LOCAL_SOURCE_ROOTS", [root])
+    source = GitSource(remote["url"], ref="v1", sparse_paths=["src"])
+    async with source.open() as project_files:
+        assert project_files.names == ["src/main.py"]
+        documents = [document async for document in project_files.read()]
+    assert [document.page_content for document in documents] == [
+        "version = 1\n"
+    ]
+
+
+@pytest.mark.parametrize(
+    ("ref", "archive"),
+    [
+        (None, "HEAD.zip"),
+        ("v1.0", "v1.0.zip"),
+        ("refs/heads/dev", "refs/heads/dev.zip"),
+    ],
+)
+async def test_github_archives_default_to_the_default_branch(
+    monkeypatch: pytest.MonkeyPatch, ref: str | None, archive: str
+):
+    urls = []
+
+    async def download(url: str, out_filename):
+        urls.append(url)
+
+    monkeypatch.setattr("api.documents._download_file", download)
+    await download_github_project(
+        "https://github.com/example/repo", "repo.zip", ref
+    )
+    assert urls == [f"https://github.com/example/repo/archive/{archive}"]